@@ -5,11 +5,17 @@ import asyncio
 from azure.identity import AzureCliCredential,DefaultAzureCredential
 from pydantic import Field
 from agent_framework.azure import AzureOpenAIChatClient
-from typing import Annotated
+from typing import Annotated, Optional
 from azure.core.credentials import AzureKeyCredential
 from openai import AsyncAzureOpenAI
 
 from search_index_manager import SearchIndexManager
+from embedding_cache import EmbeddingCache
+from vector_index import LocalVectorIndex
+from keyword_index import BM25Index
+from answer_cache import CacheProfile, agent_fingerprint
+from financial_advice import financial_advice
+from finance_tools import budget_table, for_current_user, goal_table, spending_table
 
 load_dotenv() # Load environment variables from .env file
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -20,12 +26,23 @@ SEARCH_ENDPOINT = os.getenv("AZURE_AI_SEARCH_ENDPOINT")
 SEARCH_API_KEY = os.getenv("AZURE_SEARCH_API_KEY")
 SEARCH_INDEX_NAME = os.getenv("AZURE_AI_SEARCH_INDEX_NAME")
 AZURE_SEARCH_MODEL = os.getenv("AZURE_SEARCH_MODEL")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+# Set to an embeddings file (.csv or .npy) from build_embeddings_file to search in process instead of Azure AI Search
+LOCAL_VECTOR_INDEX_FILE = os.getenv("LOCAL_VECTOR_INDEX_FILE")
+LOCAL_VECTOR_INDEX_MODE = os.getenv("LOCAL_VECTOR_INDEX_MODE", "exact")
+# vector, keyword or hybrid; keyword and hybrid search a BM25 index over the chunks of KEYWORD_INDEX_FILE
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+KEYWORD_INDEX_FILE = os.getenv("KEYWORD_INDEX_FILE", LOCAL_VECTOR_INDEX_FILE)
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", "5"))
+SEARCH_VECTOR_WEIGHT = float(os.getenv("SEARCH_VECTOR_WEIGHT", "1.0"))
+SEARCH_KEYWORD_WEIGHT = float(os.getenv("SEARCH_KEYWORD_WEIGHT", "1.0"))
+SEARCH_CONTEXT_TOKENS = int(os.getenv("SEARCH_CONTEXT_TOKENS")) if os.getenv("SEARCH_CONTEXT_TOKENS") else None
 
 # Define embedding dimensions
 embed_dimensions = 1536
 
 # Initialize everything at module level (like your working version)
-azure_search_credential = AzureKeyCredential(SEARCH_API_KEY)
+azure_search_credential = AzureKeyCredential(SEARCH_API_KEY) if SEARCH_API_KEY else None
 
 # Create embeddings client that we can reference later
 embeddings_client = AsyncAzureOpenAI(
@@ -41,7 +58,15 @@ search_index_manager = SearchIndexManager(
     api_key=SEARCH_API_KEY,
     index_name=SEARCH_INDEX_NAME,
     dimension=embed_dimensions,  # Use the defined variable
-    embeddings_client=embeddings_client  # Use the defined variable
+    embeddings_client=embeddings_client,  # Use the defined variable
+    embedding_cache=EmbeddingCache(path=EMBEDDING_CACHE_PATH),
+    vector_index=LocalVectorIndex(LOCAL_VECTOR_INDEX_FILE, mode=LOCAL_VECTOR_INDEX_MODE) if LOCAL_VECTOR_INDEX_FILE else None,
+    keyword_index=BM25Index(KEYWORD_INDEX_FILE) if KEYWORD_INDEX_FILE else None,
+    search_mode=SEARCH_MODE,
+    top_k=SEARCH_TOP_K,
+    vector_weight=SEARCH_VECTOR_WEIGHT,
+    keyword_weight=SEARCH_KEYWORD_WEIGHT,
+    context_token_budget=SEARCH_CONTEXT_TOKENS
 )
 
 # define a function (tool) to fetch information from RAG
@@ -62,28 +87,25 @@ def get_financial_advice(
     topic: Annotated[str, Field(description="The financial topic to provide advice on")]
 ) -> str:
     """Provide general financial advice on various topics."""
-    topic = topic.lower()
-    
-    if 'budget' in topic:
-        return "For budgeting: 1) Track all income and expenses, 2) Use the 50/30/20 rule (50% needs, 30% wants, 20% savings), 3) Review monthly and adjust as needed."
-    elif 'saving' in topic or 'save' in topic:
-        return "Saving strategies: 1) Start with an emergency fund (3-6 months expenses), 2) Automate savings transfers, 3) Use high-yield savings accounts, 4) Set specific savings goals."
-    elif 'debt' in topic:
-        return "Debt management: 1) List all debts with balances and rates, 2) Consider debt avalanche (highest interest first) or snowball (smallest balance first), 3) Avoid new debt while paying off existing ones."
-    elif 'investment' in topic:
-        return "Investment basics: 1) Start with emergency fund first, 2) Consider low-cost index funds, 3) Diversify your portfolio, 4) Think long-term. Always consult a financial advisor for personalized advice."
-    else:
-        return f"For {topic}, consider consulting financial resources or speaking with a financial advisor for personalized guidance."
+    return financial_advice(topic)
 
-# initialise a chat agent with azure openai response and a toolset (like your working version)
-agent = AzureOpenAIChatClient(
-         endpoint=AZURE_OPENAI_ENDPOINT,
-         api_key=AZURE_OPENAI_KEY,
-         deployment_name=AZURE_OPENAI_DEPLOYMENT
-).create_agent(
-        model=AZURE_OPENAI_DEPLOYMENT,
-        name="Finance-RAG-Agent",
-        instructions="""You are a helpful financial advisor assistant that provides practical, actionable advice on:
+# read-only tools over the user's own finances, answering with small pre-aggregated tables
+async def get_spending_by_category(
+    period_days: Annotated[int, Field(description="Number of days to look back from today, e.g. 30 for the last month")] = 30,
+    category: Annotated[Optional[str], Field(description="Optional category name, e.g. Dining, to report on its own")] = None
+) -> str:
+    """Get the user's spending per category over a recent period."""
+    return await for_current_user(spending_table, period_days, category)
+
+async def get_budget_status() -> str:
+    """Get the user's active budgets with the amount spent, remaining and whether each is on track."""
+    return await for_current_user(budget_table)
+
+async def get_goal_progress() -> str:
+    """Get the user's savings goals with their progress and the monthly saving needed to hit each deadline."""
+    return await for_current_user(goal_table)
+
+AGENT_INSTRUCTIONS = """You are a helpful financial advisor assistant that provides practical, actionable advice on:
         - Budgeting and expense management
         - Saving strategies and emergency funds
         - Basic investment principles
@@ -91,12 +113,30 @@ agent = AzureOpenAIChatClient(
         - Financial goal setting
         
         Use the available tools to search for specific information or provide general financial advice.
+        For questions about the user's own spending, budgets or savings goals, use their finance tools
+        and base your answer on the figures they return.
         Keep your responses helpful, concise, and focused on practical financial advice. 
         Always remind users to consult with licensed financial advisors for personalized investment advice.
-        Format your responses in a clear, easy-to-read way with bullet points when appropriate.""",
-        tools=[get_info, get_financial_advice] 
+        Format your responses in a clear, easy-to-read way with bullet points when appropriate."""
+agent_tools = [get_info, get_financial_advice, get_spending_by_category, get_budget_status, get_goal_progress]
+# Names of tools that read the asking user's own data; answers using them are never shared between users
+PERSONAL_TOOLS = frozenset({'get_spending_by_category', 'get_budget_status', 'get_goal_progress'})
+
+# initialise a chat agent with azure openai response and a toolset (like your working version)
+agent = AzureOpenAIChatClient(
+         endpoint=AZURE_OPENAI_ENDPOINT,
+         api_key=AZURE_OPENAI_KEY,
+         deployment_name=AZURE_OPENAI_DEPLOYMENT
+).create_agent(
+        model=AZURE_OPENAI_DEPLOYMENT,
+        name="Finance-RAG-Agent",
+        instructions=AGENT_INSTRUCTIONS,
+        tools=agent_tools
 )
 
+# Cached answers are only reused while the prompt, tools and model stay the same
+answer_cache_profile = CacheProfile(agent_fingerprint(AGENT_INSTRUCTIONS, agent_tools, AZURE_OPENAI_DEPLOYMENT), PERSONAL_TOOLS)
+
 async def main():
     """Main function for standalone usage"""
     try:
@@ -0,0 +1,381 @@
+import asyncio
+import atexit
+import os
+import threading
+from contextvars import ContextVar
+
+from dotenv import load_dotenv
+
+from answer_cache import ANSWER_CACHE_ENABLED, SHARED_SCOPE, SemanticAnswerCache, user_scope
+
+load_dotenv() # Load environment variables from .env file
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "16"))
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", "60"))
+STREAM_QUEUE_SIZE = 64
+
+# magentic_event_type values set by agent_framework on workflow updates
+MAGENTIC_EVENT_TYPE_AGENT_DELTA = "agent_delta"
+MAGENTIC_EVENT_TYPE_ORCHESTRATOR = "orchestrator"
+
+_STREAM_DONE = object()
+
+# The user a run answers, read by the agent's personal finance tools
+current_user_id = ContextVar('current_user_id', default=None)
+
+
+def load_rag_agent():
+    """
+    Import the RAG agent and prepare its search index.
+
+    Runs on the runner's event loop, so the AsyncAzureOpenAI clients and the
+    SearchIndexManager created by the agent module live on that loop for the
+    whole process and keep their connection pools between requests.
+
+    :return: The agent, the search index manager, the embedding dimensions, a
+             coroutine function that closes the clients and the answer cache profile.
+    """
+    from agent import agent, answer_cache_profile, embed_dimensions, embeddings_client, search_index_manager
+
+    if agent is None:
+        raise ImportError("Agent not initialized")
+
+    async def close():
+        await search_index_manager.close()
+        await embeddings_client.close()
+
+    return agent, search_index_manager, embed_dimensions, close, answer_cache_profile
+
+
+def response_text(response):
+    """
+    Extract the answer text from an agent response object.
+
+    :param response: The AgentRunResponse, or a CachedAnswer.
+    :return: The text.
+    """
+    for attribute in ('content', 'text', 'message', 'result', 'output'):
+        if hasattr(response, attribute):
+            return getattr(response, attribute)
+    # Try to convert to string as fallback
+    return str(response)
+
+
+def called_tools(response):
+    """
+    Get the names of the tools the agent called while producing a response.
+
+    :param response: The AgentRunResponse.
+    :return: A set of tool names, or None if the response does not expose its messages.
+    """
+    messages = getattr(response, 'messages', None)
+    if messages is None:
+        return None
+    return {content.name for message in messages for content in getattr(message, 'contents', None) or []
+            if getattr(content, 'type', None) == 'function_call'}
+
+
+class CachedAnswer:
+    """An answer served from the semantic answer cache instead of an agent run."""
+
+    cached = True
+
+    def __init__(self, text: str) -> None:
+        """Initialize CachedAnswer class."""
+        self.text = text
+
+
+def translate_update(update):
+    """
+    Turn an agent or workflow streaming update into a client event.
+
+    Plain agents yield AgentRunResponseUpdate objects carrying a text delta. Magentic
+    workflows yield AgentRunUpdateEvent objects whose additional properties tell
+    orchestrator progress apart from a participant agent's token deltas.
+
+    :param update: The streaming update.
+    :return: A dict with a type of 'delta' or 'progress', or None if it carries no text.
+    """
+    data = getattr(update, 'data', None) if hasattr(update, 'executor_id') else update
+    text = getattr(data, 'text', None) if data is not None else None
+    if not text:
+        return None
+
+    props = getattr(data, 'additional_properties', None) or {}
+    event_type = props.get('magentic_event_type')
+    if event_type == MAGENTIC_EVENT_TYPE_ORCHESTRATOR:
+        return {'type': 'progress', 'kind': props.get('orchestrator_message_kind', ''), 'text': text}
+
+    agent = props.get('agent_id') or getattr(update, 'executor_id', None) or getattr(data, 'author_name', None)
+    return {'type': 'delta', 'agent': agent, 'text': text}
+
+
+class AgentRunner:
+    """
+    Runs the chat agent on one long-lived event loop in a background thread.
+
+    Flask request threads submit messages to the loop instead of creating a new
+    loop per request. At most max_concurrency agent runs are in flight at a time;
+    further requests wait for a slot, and a request that has not finished (waiting
+    included) within timeout seconds is cancelled.
+
+    :param max_concurrency: The number of agent runs allowed in flight at once.
+    :param timeout: Seconds a request may take, including time waiting for a slot.
+    :param loader: Called on the loop to build the agent; returns the agent, the search
+                   index manager (or None), the embedding dimensions, a close coroutine
+                   and the answer cache profile (or None).
+    :param answer_cache: Optional SemanticAnswerCache consulted before running the agent.
+    :param data_version: Optional callable returning the version of a user's data, read in
+                         the caller's thread; personal answers are cached under it, so a
+                         write to the user's data stops the older answers being served.
+    """
+
+    def __init__(self, max_concurrency: int = CHAT_MAX_CONCURRENCY, timeout: float = CHAT_TIMEOUT_SECONDS, loader=load_rag_agent,
+                 answer_cache: SemanticAnswerCache = None, data_version=None) -> None:
+        """Initialize AgentRunner class."""
+        self._max_concurrency = max_concurrency
+        self._timeout = timeout
+        self._loader = loader
+        self._answer_cache = answer_cache
+        self._data_version = data_version
+        self._cache_profile = None
+        self._embed = None
+        self._loop = None
+        self._thread = None
+        self._agent = None
+        self._close = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+        self._pid = None
+
+    @property
+    def loop(self):
+        """The event loop owning the agent, started on first use."""
+        self._ensure_started()
+        return self._loop
+
+    @property
+    def agent(self):
+        """The agent owned by the runner's loop, loaded on first use."""
+        self._ensure_started()
+        return self._agent
+
+    @property
+    def answer_cache(self):
+        """The semantic answer cache, or None if answers are not cached."""
+        return self._answer_cache
+
+    @property
+    def timeout(self):
+        """Seconds a submitted coroutine may take."""
+        return self._timeout
+
+    def _ensure_started(self):
+        """Start the loop thread and load the agent once per process."""
+        # gunicorn forks workers after import, so a loop started in the parent is not usable
+        if self._loop is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._loop is not None and self._pid == os.getpid():
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="agent-runner", daemon=True)
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._startup(), loop).result()
+            except BaseException:
+                loop.call_soon_threadsafe(loop.stop)
+                raise
+            self._loop, self._thread, self._pid = loop, thread, os.getpid()
+            atexit.register(self.close)
+            print(f"✅ Agent runner started (max {self._max_concurrency} concurrent chats, {self._timeout:g}s timeout)")
+
+    async def _startup(self):
+        """Create the loop-bound resources."""
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._agent, search_index_manager, dimensions, self._close, self._cache_profile = self._loader()
+        if search_index_manager is not None:
+            self._embed = search_index_manager.embed_query
+        if search_index_manager is not None:
+            try:
+                await search_index_manager.ensure_index_created(vector_index_dimensions=dimensions)
+            except Exception as e:
+                print(f"⚠️ Search index not available, RAG lookups will fail: {e}")
+
+    def embed(self, texts):
+        """
+        Embed texts on the runner's loop, through the search index manager's embedding cache.
+
+        :param texts: The texts to embed.
+        :return: The embedding vectors, or None if the agent has no search index manager.
+        :raises: TimeoutError if embedding did not finish within the timeout.
+        """
+        loop = self.loop
+        if self._embed is None:
+            return None
+
+        async def embed_all():
+            return await asyncio.gather(*(self._embed(text) for text in texts))
+
+        return asyncio.run_coroutine_threadsafe(asyncio.wait_for(embed_all(), timeout=self._timeout), loop).result()
+
+    def _caching(self):
+        return self._answer_cache is not None and self._cache_profile is not None and self._embed is not None
+
+    def _personal_scope(self, user_id):
+        """
+        The answer cache scope of a user at the current version of their data.
+
+        :return: The scope, or None for an anonymous message.
+        """
+        if user_id is None:
+            return None
+        if self._data_version is None or not self._caching():
+            return user_scope(user_id)
+        try:
+            return user_scope(user_id, self._data_version(user_id))
+        except Exception as e:
+            print(f"⚠️ Could not read data version of user {user_id}: {e}")
+            return None
+
+    async def _cached_answer(self, message, scope):
+        """
+        Look a message up in the answer cache.
+
+        :param scope: The asker's personal scope, or None to only look in the shared scope.
+        :return: The cached answer or None, and the message embedding to store the
+                 answer under (None when the answer cache is not usable).
+        """
+        if not self._caching():
+            return None, None
+        try:
+            vector = await self._embed(message)
+        except Exception as e:
+            print(f"⚠️ Answer cache skipped, could not embed message: {e}")
+            return None, None
+        scopes = [SHARED_SCOPE] if scope is None else [scope, SHARED_SCOPE]
+        return self._answer_cache.lookup(self._cache_profile.fingerprint, scopes, message, vector), vector
+
+    def _remember(self, message, scope, vector, answer, tools):
+        """
+        Store an answer in the answer cache.
+
+        An answer is shared only if the agent called none of its personal tools; when the
+        tools called are unknown and the agent has personal tools, it is kept per user.
+
+        :param scope: The asker's personal scope, or None for an anonymous message.
+        :param tools: The names of the tools called, or None if unknown.
+        """
+        personal_tools = self._cache_profile.personal_tools
+        personal = bool(personal_tools) and (tools is None or bool(tools & personal_tools))
+        if personal and scope is None:
+            return
+        self._answer_cache.store(self._cache_profile.fingerprint, scope if personal else SHARED_SCOPE,
+                                 message, vector, answer)
+
+    async def _answer(self, message, user_id, scope):
+        """Serve a message from the answer cache, or run the agent and cache its answer."""
+        current_user_id.set(user_id)
+        cached, vector = await self._cached_answer(message, scope)
+        if cached is not None:
+            return CachedAnswer(cached)
+        async with self._semaphore:
+            response = await self._agent.run(message)
+        if vector is not None:
+            self._remember(message, scope, vector, response_text(response), called_tools(response))
+        return response
+
+    def run(self, message: str, user_id=None):
+        """
+        Answer a message, from the answer cache or by running the agent, and wait for the response.
+
+        Cache hits do not wait for a concurrency slot.
+
+        :param message: The user's message.
+        :param user_id: The asking user, so answers personalized to them are only served to them.
+        :return: The agent response object, or a CachedAnswer.
+        :raises: TimeoutError if the run did not finish within the timeout.
+        """
+        loop = self.loop
+        scope = self._personal_scope(user_id)
+        guarded = asyncio.wait_for(self._answer(message, user_id, scope), timeout=self._timeout)
+        return asyncio.run_coroutine_threadsafe(guarded, loop).result()
+
+    def stream(self, message: str, user_id=None, queue_size: int = STREAM_QUEUE_SIZE):
+        """
+        Stream the agent's response to a message as it is generated.
+
+        The agent runs on the runner's loop and hands events to the caller through a
+        bounded queue, so a slow consumer pauses generation instead of buffering it.
+        Closing the returned generator (for example when the client disconnects)
+        cancels the agent run. A cached answer is sent as a single delta event.
+
+        :param message: The user's message.
+        :param user_id: The asking user, so answers personalized to them are only served to them.
+        :param queue_size: The number of events buffered ahead of the consumer.
+        :return: A generator of events as produced by translate_update.
+        :raises: TimeoutError if no event arrives within the timeout.
+        """
+        agent = self.agent
+        loop = self.loop
+        queue = asyncio.Queue(maxsize=queue_size)
+        scope = self._personal_scope(user_id)
+
+        async def produce():
+            current_user_id.set(user_id)
+            try:
+                cached, vector = await self._cached_answer(message, scope)
+                if cached is not None:
+                    await queue.put({'type': 'delta', 'agent': None, 'text': cached, 'cached': True})
+                    await queue.put(_STREAM_DONE)
+                    return
+                parts = []
+                async with self._semaphore:
+                    async for update in agent.run_stream(message):
+                        event = translate_update(update)
+                        if event is not None:
+                            if event['type'] == 'delta':
+                                parts.append(event['text'])
+                            await queue.put(event)
+            except Exception as e:
+                await queue.put(e)
+                return
+            if vector is not None:
+                # Streaming updates do not say which tools ran, so personal answers stay per user
+                self._remember(message, scope, vector, ''.join(parts), None)
+            await queue.put(_STREAM_DONE)
+
+        producer = asyncio.run_coroutine_threadsafe(produce(), loop)
+        try:
+            while True:
+                item = asyncio.run_coroutine_threadsafe(
+                    asyncio.wait_for(queue.get(), timeout=self._timeout), loop).result()
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
+
+    def close(self):
+        """Close the agent's clients and stop the loop."""
+        loop = self._loop
+        if loop is None or self._pid != os.getpid() or not loop.is_running():
+            return
+        if self._close is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout=5)
+            except Exception as e:
+                print(f"⚠️ Error closing agent resources: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop = None
+
+
+def result_cache_version(user_id):
+    """The user's result cache version, imported lazily so the runner does not need the database."""
+    from result_cache import result_cache
+    return result_cache.version(user_id)
+
+
+agent_runner = AgentRunner(answer_cache=SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None,
+                           data_version=result_cache_version)
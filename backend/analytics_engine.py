@@ -0,0 +1,389 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, select, union_all
+from sqlalchemy.orm import aliased
+
+from config import db
+from models import Budget, Category, DailyUserTotal, Goal, Transaction
+
+TOP_CATEGORY_LIMIT = 5
+RECENT_PER_CATEGORY = 3
+
+
+def get_period_start(period):
+    """
+    Get the start of the analytics window.
+
+    Periods cover whole days so they line up with the daily rollup.
+
+    :param period: The number of days to look back from today.
+    :return: The midnight the period starts at.
+    """
+    start = datetime.now() - timedelta(days=int(period))
+    return start.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def daily_groups_query(user_id, start_date):
+    """
+    Build the single scan behind the analytics page.
+
+    Every figure on the analytics page can be derived from the per
+    (day, transaction type, category) sums and counts, which the
+    daily_user_totals rollup already holds, so the cost of this query
+    grows with the days in the period rather than the transactions.
+
+    :param user_id: The user to aggregate transactions for.
+    :param start_date: Only days on or after this date are included.
+    :return: The query, not yet executed.
+    """
+    return db.session.query(
+        DailyUserTotal.date,
+        DailyUserTotal.transaction_type,
+        DailyUserTotal.category_id,
+        Category.name.label('category_name'),
+        Category.type.label('category_type'),
+        DailyUserTotal.total,
+        DailyUserTotal.count
+    ).join(
+        Category, DailyUserTotal.category_id == Category.id
+    ).filter(
+        DailyUserTotal.user_id == user_id,
+        DailyUserTotal.date >= start_date.date()
+    ).order_by(
+        DailyUserTotal.date
+    )
+
+
+def fetch_daily_groups(user_id, start_date):
+    """
+    Get the user's daily totals per transaction type and category.
+
+    :param user_id: The user to aggregate transactions for.
+    :param start_date: Only transactions on or after this datetime are included.
+    :return: Rows with date, transaction_type, category_id, category_name,
+             category_type, total and count columns.
+    """
+    return daily_groups_query(user_id, start_date).all()
+
+
+def _format_date(value):
+    """Dates come back as date objects on PostgreSQL and as strings on SQLite."""
+    return value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else str(value)
+
+
+def build_analytics(groups, period):
+    """
+    Build the /analytics response from pre-aggregated daily groups.
+
+    :param groups: Rows as returned by fetch_daily_groups, ordered by date.
+    :param period: The number of days the groups cover.
+    :return: The analytics response body.
+    """
+    total_expenses = Decimal(0)
+    total_income = Decimal(0)
+    total_amount = Decimal(0)
+    transaction_count = 0
+    expense_count = 0
+    by_category = {}
+    top_categories = {}
+    trend_data = {}
+
+    for group in groups:
+        total = Decimal(group.total or 0)
+        total_amount += total
+        transaction_count += group.count
+
+        if group.transaction_type == 'expense':
+            total_expenses += total
+            expense_count += group.count
+            top_categories[group.category_name] = top_categories.get(group.category_name, 0) + total
+        elif group.transaction_type == 'income':
+            total_income += total
+
+        key = (group.category_name, group.category_type)
+        by_category[key] = by_category.get(key, 0) + total
+
+        date_str = _format_date(group.date)
+        if date_str not in trend_data:
+            trend_data[date_str] = {'date': date_str, 'income': 0, 'expense': 0}
+        trend_key = 'income' if group.transaction_type == 'income' else 'expense'
+        trend_data[date_str][trend_key] += float(total)
+
+    avg_transaction = total_amount / transaction_count if transaction_count else 0
+
+    category_data = [
+        {'category': name, 'type': category_type, 'amount': float(total)}
+        for (name, category_type), total in by_category.items()
+    ]
+
+    top_categories_data = [
+        {'category': name, 'amount': float(total)}
+        for name, total in sorted(top_categories.items(), key=lambda item: item[1], reverse=True)[:TOP_CATEGORY_LIMIT]
+    ]
+
+    return {
+        'summary': {
+            'total_expenses': float(total_expenses),
+            'total_income': float(total_income),
+            'net_savings': float(total_income - total_expenses) if (total_income and total_expenses) else 0,
+            'transaction_count': transaction_count,
+            'expense_count': expense_count,
+            'avg_transaction': float(avg_transaction),
+            'period_days': int(period)
+        },
+        'spending_by_category': category_data,
+        'daily_trend': list(trend_data.values()),
+        'top_categories': top_categories_data
+    }
+
+
+def compute_analytics(user_id, period):
+    """
+    Compute the full analytics payload for a user with one database round-trip.
+
+    :param user_id: The user to compute analytics for.
+    :param period: The number of days to look back from now.
+    :return: The analytics response body.
+    """
+    groups = fetch_daily_groups(user_id, get_period_start(period))
+    return build_analytics(groups, period)
+
+
+def fetch_category_totals(user_id, start_date):
+    """
+    Get every category of the user with its spending in the period, read from the daily rollup.
+
+    :param user_id: The user whose categories are returned.
+    :param start_date: Only days on or after this date are counted.
+    :return: Rows with id, name, type, description, total_spent, transaction_count
+             and avg_transaction columns.
+    """
+    total_spent = func.sum(DailyUserTotal.total)
+    transaction_count = func.sum(DailyUserTotal.count)
+    return db.session.query(
+        Category.id,
+        Category.name,
+        Category.type,
+        Category.description,
+        func.coalesce(total_spent, 0).label('total_spent'),
+        func.coalesce(transaction_count, 0).label('transaction_count'),
+        func.coalesce(total_spent / func.nullif(transaction_count, 0), 0).label('avg_transaction')
+    ).outerjoin(
+        DailyUserTotal,
+        (DailyUserTotal.category_id == Category.id) &
+        (DailyUserTotal.user_id == user_id) &
+        (DailyUserTotal.date >= start_date.date())
+    ).filter(
+        Category.user_id == user_id
+    ).group_by(
+        Category.id, Category.name, Category.type, Category.description
+    ).all()
+
+
+def recent_by_category_query(user_id, category_ids, start_date, per_category=RECENT_PER_CATEGORY):
+    """
+    Build the query for the most recent transactions of every category.
+
+    Each category gets its own ORDER BY ... LIMIT branch, combined with UNION ALL into
+    one statement. A branch reads ix_transactions_user_category_date backwards and stops
+    after per_category rows, so the cost grows with the number of categories rather
+    than with the number of transactions in the period.
+
+    :param user_id: The user whose transactions are returned.
+    :param category_ids: The categories to return transactions for.
+    :param start_date: Only transactions on or after this datetime are included.
+    :param per_category: The number of transactions to keep per category.
+    :return: The query, not yet executed.
+    """
+    branches = [
+        select(Transaction).where(
+            Transaction.user_id == user_id,
+            Transaction.category_id == category_id,
+            Transaction.transaction_date >= start_date
+        ).order_by(
+            Transaction.transaction_date.desc(), Transaction.id.desc()
+        ).limit(per_category).subquery().select()
+        for category_id in category_ids
+    ]
+    recent = aliased(Transaction, union_all(*branches).subquery())
+
+    return db.session.query(recent).order_by(
+        recent.category_id, recent.transaction_date.desc(), recent.id.desc()
+    )
+
+
+def fetch_recent_by_category(user_id, category_ids, start_date, per_category=RECENT_PER_CATEGORY):
+    """
+    Get the most recent transactions of every category in one query.
+
+    :param user_id: The user whose transactions are returned.
+    :param category_ids: The categories to return transactions for.
+    :param start_date: Only transactions on or after this datetime are included.
+    :param per_category: The number of transactions to keep per category.
+    :return: A dict of category id to a list of serialized transactions, newest first.
+    """
+    recent_transactions = {}
+    if not category_ids:
+        return recent_transactions
+    for transaction in recent_by_category_query(user_id, category_ids, start_date, per_category):
+        recent_transactions.setdefault(transaction.category_id, []).append(transaction.to_json())
+    return recent_transactions
+
+
+def compute_category_stats(user_id, period):
+    """
+    Compute the /categories/stats payload with two queries regardless of category count.
+
+    Totals come from the daily rollup; only the recent transactions read raw rows, at
+    most RECENT_PER_CATEGORY per category.
+
+    :param user_id: The user to compute category statistics for.
+    :param period: The number of days to look back from now.
+    :return: The category stats response body.
+    """
+    start_date = get_period_start(period)
+    category_stats = fetch_category_totals(user_id, start_date)
+    recent_transactions = fetch_recent_by_category(user_id, [stat.id for stat in category_stats], start_date)
+
+    categories_data = []
+    for stat in category_stats:
+        categories_data.append({
+            'id': stat.id,
+            'name': stat.name,
+            'type': stat.type,
+            'description': stat.description,
+            'total_spent': float(stat.total_spent) if stat.total_spent else 0,
+            'transaction_count': stat.transaction_count,
+            'avg_transaction': float(stat.avg_transaction) if stat.avg_transaction else 0,
+            'recent_transactions': recent_transactions.get(stat.id, [])
+        })
+
+    return {
+        'categories': categories_data,
+        'period_days': int(period)
+    }
+
+
+def fetch_budget_status(user_id, as_of=None):
+    """
+    Get the user's budgets with their spend so far in one query.
+
+    Spend is maintained on the budget rows as transactions are written, so the cost
+    of this query depends on the number of budgets, not on the transaction history.
+
+    :param user_id: The user whose budgets are returned.
+    :param as_of: Only budgets whose window contains this datetime are returned, or all when None.
+    :return: Rows with id, category_id, category_name, amount, period, start_date, end_date,
+             alert_threshold, spent and alert_level columns.
+    """
+    query = db.session.query(
+        Budget.id,
+        Budget.category_id,
+        Category.name.label('category_name'),
+        Budget.amount,
+        Budget.period,
+        Budget.start_date,
+        Budget.end_date,
+        Budget.alert_threshold,
+        Budget.spent,
+        Budget.alert_level
+    ).join(
+        Category, Budget.category_id == Category.id
+    ).filter(
+        Budget.user_id == user_id
+    )
+    if as_of is not None:
+        query = query.filter(Budget.start_date <= as_of, Budget.end_date >= as_of)
+    return query.order_by(Category.name, Budget.start_date).all()
+
+
+def compute_budget_status(user_id, active_only=True):
+    """
+    Compute the spending against each of the user's budgets with one query.
+
+    :param user_id: The user to compute budget status for.
+    :param active_only: Only include budgets whose window contains today.
+    :return: The budget status body.
+    """
+    budgets_data = []
+    for budget in fetch_budget_status(user_id, datetime.now() if active_only else None):
+        amount = float(budget.amount)
+        spent = float(budget.spent or 0)
+        percent_used = spent / amount * 100 if amount else 0
+        budgets_data.append({
+            'id': budget.id,
+            'category_id': budget.category_id,
+            'category': budget.category_name,
+            'period': budget.period,
+            'start_date': _format_date(budget.start_date),
+            'end_date': _format_date(budget.end_date),
+            'amount': amount,
+            'spent': spent,
+            'remaining': amount - spent,
+            'percent_used': round(percent_used, 1),
+            'alert_threshold': float(budget.alert_threshold) if budget.alert_threshold is not None else None,
+            'status': budget.alert_level
+        })
+
+    return {'budgets': budgets_data}
+
+
+def goal_progress(goal, today):
+    """
+    Derive the progress figures of a savings goal.
+
+    The projection assumes saving continues at the average rate since the goal was created,
+    and is None when that rate would not reach the target before the end of the calendar.
+
+    :param goal: A Goal, or a row with the same columns.
+    :param today: The datetime to measure the time left from.
+    :return: The goal with JSON-ready values plus percent_complete, remaining,
+             months_left, required_monthly and projected_completion.
+    """
+    target = float(goal.target_amount)
+    current = float(goal.current_amount or 0)
+    remaining = max(target - current, 0)
+    deadline = goal.deadline
+    months_left = max((deadline - today).days / 30.44, 0) if deadline else None
+
+    projected_completion = None
+    if remaining == 0:
+        projected_completion = _format_date(today)
+    elif goal.created_at and current > 0:
+        months_saving = max((today - goal.created_at).days / 30.44, 1)
+        monthly_rate = current / months_saving
+        days_to_target = remaining / monthly_rate * 30.44
+        if days_to_target < (datetime.max - today).days:
+            projected_completion = _format_date(today + timedelta(days=days_to_target))
+
+    return {
+        'id': goal.id,
+        'user_id': goal.user_id,
+        'name': goal.name,
+        'description': goal.description,
+        'target_amount': target,
+        'current_amount': current,
+        'deadline': _format_date(deadline) if deadline else None,
+        'priority': goal.priority,
+        'status': goal.status,
+        'created_at': _format_date(goal.created_at) if goal.created_at else None,
+        'remaining': remaining,
+        'percent_complete': round(current / target * 100, 1) if target else 0,
+        'months_left': round(months_left, 1) if months_left is not None else None,
+        'required_monthly': (remaining / months_left if months_left else remaining) if remaining else 0,
+        'projected_completion': projected_completion
+    }
+
+
+def compute_goal_progress(user_id):
+    """
+    Compute the progress of each of the user's savings goals.
+
+    :param user_id: The user to compute goal progress for.
+    :return: The goal progress body.
+    """
+    today = datetime.now()
+    # Read in the order of ix_goals_user_priority_deadline
+    goals = Goal.query.filter_by(user_id=user_id).order_by(Goal.priority.asc().nulls_last(), Goal.deadline, Goal.id).all()
+    return {'goals': [goal_progress(goal, today) for goal in goals]}
@@ -0,0 +1,189 @@
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Iterable, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv() # Load environment variables from .env file
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+# Bump to drop every cached answer, for example after a knowledge base rebuild
+ANSWER_CACHE_VERSION = 1
+SHARED_SCOPE = "shared"
+
+# The agent an answer came from: its fingerprint, and the names of its tools that read a user's own data
+CacheProfile = namedtuple('CacheProfile', ['fingerprint', 'personal_tools'])
+CachedEntry = namedtuple('CachedEntry', ['key', 'question', 'vector', 'answer', 'expires_at'])
+
+
+def agent_fingerprint(instructions: str, tools: Iterable, model: str) -> str:
+    """
+    Fingerprint what an agent's answers depend on besides the question.
+
+    Any change to the system prompt, a tool's name, signature or description, or the
+    model deployment gives a new fingerprint, so answers from the old agent are not served.
+
+    :param instructions: The agent's instructions.
+    :param tools: The agent's tool functions.
+    :param model: The chat model deployment.
+    :return: A hex digest.
+    """
+    described = [[tool.__name__, str(inspect.signature(tool)), inspect.getdoc(tool) or ""] for tool in tools]
+    payload = json.dumps([ANSWER_CACHE_VERSION, instructions, described, model])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def user_scope(user_id, version=0) -> str:
+    """
+    The cache scope of answers personalized to one user.
+
+    :param version: The version of the user's data the answers were given from.
+    """
+    return f"user:{user_id}:v{version}"
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, whitespace and trailing punctuation, the only differences a personal answer is reused across."""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+class SemanticAnswerCache:
+    """
+    Cache of agent answers looked up by the meaning of the question.
+
+    A question is served from the cache when the cosine similarity of its embedding to a
+    cached question is at least the threshold and the cached answer came from an agent
+    with the same fingerprint. Answers are stored in a scope: answers that used a user's
+    own data go in that user's scope and are only ever served to them, everything else
+    goes in the shared scope. Personal answers are only served for the same question up
+    to case, spacing and punctuation, since questions differing in just a period or a
+    category embed almost identically but need different figures. Entries expire after ttl seconds, and the least recently
+    used entry is evicted once max_entries are cached.
+
+    :param threshold: The minimum cosine similarity for a hit.
+    :param ttl: Seconds an answer stays valid.
+    :param max_entries: The maximum number of answers kept.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: int = ANSWER_CACHE_TTL_SECONDS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES) -> None:
+        """Initialize SemanticAnswerCache class."""
+        self._threshold = threshold
+        self._ttl = ttl
+        self._max_entries = max_entries
+        # entry id -> CachedEntry, least recently used first
+        self._entries = OrderedDict()
+        # (fingerprint, scope) -> ids of its entries, so a lookup only compares against its own bucket
+        self._buckets = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expirations': 0,
+        }
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets[entry.key]
+        bucket.remove(entry_id)
+        if not bucket:
+            del self._buckets[entry.key]
+
+    def lookup(self, fingerprint: str, scopes: Iterable[str], question: str, vector) -> Optional[str]:
+        """
+        Find a cached answer to a question.
+
+        :param fingerprint: The fingerprint of the agent that would answer.
+        :param scopes: The scopes the asker may read, for example their user scope and the shared scope.
+        :param question: The question, matched exactly in personal scopes.
+        :param vector: The question embedding, matched by similarity in the shared scope.
+        :return: The cached answer, or None on a miss.
+        """
+        query = self._normalize(vector)
+        normalized = normalize_question(question)
+        now = time.time()
+        best_id, best_similarity = None, self._threshold
+        with self._lock:
+            for scope in scopes:
+                ids = self._buckets.get((fingerprint, scope))
+                if not ids:
+                    continue
+                for entry_id in [i for i in ids if self._entries[i].expires_at <= now]:
+                    self._remove(entry_id)
+                    self._stats['expirations'] += 1
+                ids = list(self._buckets.get((fingerprint, scope), ()))
+                if scope != SHARED_SCOPE:
+                    exact = [i for i in ids if normalize_question(self._entries[i].question) == normalized]
+                    if exact:
+                        best_id, best_similarity = exact[-1], 1.0
+                    continue
+                if not ids:
+                    continue
+                similarities = np.stack([self._entries[i].vector for i in ids]) @ query
+                candidate = int(np.argmax(similarities))
+                if similarities[candidate] >= best_similarity:
+                    best_id, best_similarity = ids[candidate], float(similarities[candidate])
+            if best_id is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self._stats['hits'] += 1
+            return self._entries[best_id].answer
+
+    def store(self, fingerprint: str, scope: str, question: str, vector, answer: str) -> None:
+        """
+        Cache an answer.
+
+        :param fingerprint: The fingerprint of the agent that answered.
+        :param scope: SHARED_SCOPE, or the user_scope of the user the answer is personalized to.
+        :param question: The question, kept for debugging.
+        :param vector: The question embedding.
+        :param answer: The answer text.
+        """
+        if not answer or self._max_entries <= 0:
+            return
+        key = (fingerprint, scope)
+        entry = CachedEntry(key, question, self._normalize(vector), answer, time.time() + self._ttl)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._buckets.setdefault(key, set()).add(entry_id)
+            self._stats['stores'] += 1
+            while len(self._entries) > self._max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        """Get hit and miss counters and the hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['threshold'] = self._threshold
+        return stats
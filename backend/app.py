@@ -1,8 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from config import app, db
-from models import User, Category, Transaction, Budget, Goal
-from datetime import datetime
-import asyncio
+from models import User, Category, Transaction, Budget, BudgetEvent, Goal
+from analytics_engine import compute_analytics, compute_budget_status, compute_category_stats, goal_progress
+import daily_rollup
+import budget_tracker
+from bulk_import import import_transactions, iter_csv_rows, iter_jsonl_rows
+from result_cache import result_cache
+from intent_router import INTENT_ROUTER_ENABLED, ROUTE_AGENT, IntentRouter
+from datetime import datetime, timedelta
+import base64
+import click
+import json
+import time
 from dotenv import load_dotenv
 # Routes to register and login users
 
@@ -20,68 +29,14 @@ def get_categories():
 def get_category_stats():
     """Get category statistics with spending information"""
     try:
-        from sqlalchemy import func
-        from datetime import timedelta
-        
         # Get query parameters
         period = request.args.get('period', '30')  # Default last 30 days
         user_id = request.args.get('user_id', 1)  # Default user_id 1
-        
-        # Calculate date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=int(period))
-        
-        # Get all categories with their spending stats
-        category_stats = db.session.query(
-            Category.id,
-            Category.name,
-            Category.type,
-            Category.description,
-            func.coalesce(func.sum(Transaction.amount), 0).label('total_spent'),
-            func.count(Transaction.id).label('transaction_count'),
-            func.coalesce(func.avg(Transaction.amount), 0).label('avg_transaction')
-        ).outerjoin(
-            Transaction,
-            (Transaction.category_id == Category.id) & 
-            (Transaction.user_id == user_id) &
-            (Transaction.transaction_date >= start_date)
-        ).filter(
-            Category.user_id == user_id
-        ).group_by(
-            Category.id, Category.name, Category.type, Category.description
-        ).all()
-        
-        # Get recent transactions per category
-        recent_transactions = {}
-        for stat in category_stats:
-            recent = Transaction.query.filter(
-                Transaction.category_id == stat.id,
-                Transaction.user_id == user_id,
-                Transaction.transaction_date >= start_date
-            ).order_by(
-                Transaction.transaction_date.desc()
-            ).limit(3).all()
-            
-            recent_transactions[stat.id] = [t.to_json() for t in recent]
-        
-        # Format response
-        categories_data = []
-        for stat in category_stats:
-            categories_data.append({
-                'id': stat.id,
-                'name': stat.name,
-                'type': stat.type,
-                'description': stat.description,
-                'total_spent': float(stat.total_spent) if stat.total_spent else 0,
-                'transaction_count': stat.transaction_count,
-                'avg_transaction': float(stat.avg_transaction) if stat.avg_transaction else 0,
-                'recent_transactions': recent_transactions.get(stat.id, [])
-            })
-        
-        return jsonify({
-            'categories': categories_data,
-            'period_days': int(period)
-        }), 200
+
+        # Aggregates plus the top-3 recent transactions per category in two queries
+        stats = result_cache.get_or_compute(
+            'categories_stats', user_id, period, lambda: compute_category_stats(user_id, period))
+        return jsonify(stats), 200
         
     except Exception as e:
         print(f"❌ Error in category stats endpoint: {e}")
@@ -148,6 +103,7 @@ def seed_categories():
                 created_count += 1
         
         db.session.commit()
+        result_cache.invalidate_user(user_id)
         
         return jsonify({
             'message': f'Successfully created {created_count} categories',
@@ -195,6 +151,7 @@ def create_category():
         
         db.session.add(new_category)
         db.session.commit()
+        result_cache.invalidate_user(user_id)
         
         return jsonify({
             'message': 'Category created successfully',
@@ -220,9 +177,17 @@ def delete_category(category_id):
             return jsonify({
                 'error': f'Cannot delete category with {transaction_count} existing transactions. Please reassign or delete those transactions first.'
             }), 400
-        
+
+        # Check if category has budgets
+        budget_count = Budget.query.filter_by(category_id=category_id).count()
+        if budget_count > 0:
+            return jsonify({
+                'error': f'Cannot delete category with {budget_count} existing budgets. Please move or delete those budgets first.'
+            }), 400
+
         db.session.delete(category)
         db.session.commit()
+        result_cache.invalidate_user(category.user_id)
         
         return jsonify({'message': 'Category deleted successfully'}), 200
         
@@ -235,11 +200,132 @@ def delete_category(category_id):
 
 # routes to create, read, update, delete transactions
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+def encode_cursor(transaction):
+    """Encode the (transaction_date, id) keyset of the last row into an opaque cursor"""
+    raw = f"{transaction.transaction_date.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor back into (transaction_date, id)"""
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    date_part, id_part = raw.rsplit('|', 1)
+    return datetime.fromisoformat(date_part), int(id_part)
+
+def build_transaction_query(args):
+    """Build the filtered, keyset-ordered transaction query from request args"""
+    from sqlalchemy import select, and_, or_
+
+    query = select(Transaction)
+
+    user_id = args.get('user_id', type=int)
+    if user_id is not None:
+        query = query.where(Transaction.user_id == user_id)
+
+    category_id = args.get('category_id', type=int)
+    if category_id is not None:
+        query = query.where(Transaction.category_id == category_id)
+
+    transaction_type = args.get('transaction_type')
+    if transaction_type:
+        query = query.where(Transaction.transaction_type == transaction_type)
+
+    start_date = args.get('start_date')
+    if start_date:
+        query = query.where(Transaction.transaction_date >= datetime.strptime(start_date, '%Y-%m-%d'))
+
+    end_date = args.get('end_date')
+    if end_date:
+        # end_date is inclusive of the whole day
+        query = query.where(Transaction.transaction_date < datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
+
+    cursor = args.get('cursor')
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        # Newest first, so the next page holds everything strictly "before" the cursor row
+        query = query.where(or_(
+            Transaction.transaction_date < cursor_date,
+            and_(Transaction.transaction_date == cursor_date, Transaction.id < cursor_id)
+        ))
+
+    return query.order_by(Transaction.transaction_date.desc(), Transaction.id.desc())
+
 @app.route('/transactions', methods=['GET'])
 def get_transactions():
-    transactions = Transaction.query.all()
-    json_transactions = map(lambda x: x.to_json(), transactions)
-    return jsonify({"transactions": list(json_transactions)}), 200
+    """
+    List transactions newest first using keyset pagination on (transaction_date, id).
+
+    Query parameters: user_id, category_id, transaction_type, start_date, end_date
+    (YYYY-MM-DD), limit and cursor. Pass stream=true to receive every matching row
+    as NDJSON read from a server-side cursor instead of a single page.
+    """
+    try:
+        query = build_transaction_query(request.args)
+    except ValueError as ve:
+        return jsonify({'error': f'Invalid query parameter: {str(ve)}'}), 400
+
+    if request.args.get('stream', 'false').lower() == 'true':
+        def generate():
+            # yield_per keeps a server-side cursor open and only buffers one batch of rows
+            result = db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+            for transaction in result.scalars():
+                yield json.dumps(transaction.to_json()) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    # Fetch one extra row to know whether there is a next page
+    transactions = db.session.execute(query.limit(limit + 1)).scalars().all()
+    has_more = len(transactions) > limit
+    transactions = transactions[:limit]
+
+    return jsonify({
+        "transactions": [t.to_json() for t in transactions],
+        "next_cursor": encode_cursor(transactions[-1]) if has_more else None,
+        "has_more": has_more
+    }), 200
+
+@app.route('/transactions/bulk', methods=['POST'])
+def bulk_import_transactions():
+    """
+    Import many transactions from a CSV or JSON-lines upload.
+
+    The body is read as a stream, either raw with a text/csv or application/x-ndjson
+    content type, or as a multipart upload in a 'file' field named *.csv or *.jsonl.
+    Rows are validated against the user's categories and inserted in batches; invalid
+    rows are reported in the response without stopping the import.
+    """
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+
+        upload = request.files.get('file')
+        if upload is not None:
+            stream = upload.stream
+            upload_format = 'csv' if upload.filename.lower().endswith('.csv') else 'jsonl'
+        else:
+            stream = request.stream
+            if request.mimetype in ('text/csv', 'application/csv'):
+                upload_format = 'csv'
+            elif request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+                upload_format = 'jsonl'
+            else:
+                return jsonify({'error': 'Upload must be text/csv or application/x-ndjson'}), 415
+
+        rows = iter_csv_rows(stream) if upload_format == 'csv' else iter_jsonl_rows(stream)
+        summary = import_transactions(rows, user_id)
+        result_cache.invalidate_user(user_id)
+        print(f"✅ Imported {summary['imported']} transactions ({summary['failed']} failed) at {summary['rows_per_second']} rows/s")
+        return jsonify(summary), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error importing transactions: {e}")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/create_transaction', methods=['POST'])
 def create_transaction():
@@ -285,7 +371,7 @@ def create_transaction():
             category_id = 1
 
         new_transaction = Transaction(
-            user_id=1,  # For now, hardcode user_id as 1
+            user_id=request.json.get('user_id', 1),  # Default user_id 1
             category_id=category_id,
             description=description or 'No description',
             amount=amount,
@@ -295,7 +381,11 @@ def create_transaction():
         
         print("Created transaction object:", new_transaction.__dict__)
         db.session.add(new_transaction)
+        # keep the daily rollup and budget spend in the same database transaction
+        daily_rollup.add_transaction(new_transaction)
+        budget_tracker.add_transaction(new_transaction)
         db.session.commit()
+        result_cache.invalidate_user(new_transaction.user_id)
         print("Transaction saved successfully")
         return jsonify({'message': 'Transaction created successfully', 'transaction': new_transaction.to_json()}), 201
     except ValueError as ve:
@@ -325,12 +415,19 @@ def update_transaction(transaction_id):
     if not amount or not transaction_type:
         return jsonify({'error': 'Missing required fields'}), 400
 
+    # remember where the transaction was counted before changing it
+    old_rollup_key = daily_rollup.rollup_key(transaction)
+    old_amount = transaction.amount
+
     transaction.description = description
     transaction.amount = amount
     transaction.transaction_type = transaction_type
 
     try:
+        daily_rollup.move_transaction(old_rollup_key, old_amount, transaction)
+        budget_tracker.move_transaction(old_rollup_key, old_amount, transaction)
         db.session.commit()
+        result_cache.invalidate_user(transaction.user_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
@@ -344,8 +441,11 @@ def delete_transaction(transaction_id):
         return jsonify({'error': 'Transaction not found'}), 404
 
     try:
+        daily_rollup.remove_transaction(transaction)
+        budget_tracker.remove_transaction(transaction)
         db.session.delete(transaction)
         db.session.commit()
+        result_cache.invalidate_user(transaction.user_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
@@ -354,11 +454,90 @@ def delete_transaction(transaction_id):
 
 # routes to create savings goals and track progress
 
+GOAL_PAGE_SIZE = 50
+MAX_GOAL_PAGE_SIZE = 200
+GOAL_SORTS = ('priority', 'deadline')
+
+def encode_goal_cursor(goal, sort):
+    """Encode the sort keyset of the last goal of a page into an opaque cursor"""
+    priority = '' if goal.priority is None else goal.priority
+    raw = f"{sort}|{priority}|{goal.deadline.isoformat()}|{goal.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_goal_cursor(cursor):
+    """Decode a cursor produced by encode_goal_cursor back into (sort, priority, deadline, id)"""
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    sort, priority, deadline, goal_id = raw.split('|')
+    return sort, int(priority) if priority else None, datetime.fromisoformat(deadline), int(goal_id)
+
+def build_goal_query(user_id, sort, cursor=None):
+    """
+    Build the user's goal query in sort order, resuming after the cursor.
+
+    Sorting by priority reads ix_goals_user_priority_deadline (goals without a
+    priority come last) and sorting by deadline reads ix_goals_user_deadline.
+    """
+    from sqlalchemy import select, and_, or_
+
+    query = select(Goal).where(Goal.user_id == user_id)
+    after_deadline = None
+    if cursor:
+        cursor_sort, cursor_priority, cursor_deadline, cursor_id = decode_goal_cursor(cursor)
+        if cursor_sort != sort:
+            raise ValueError('cursor belongs to a different sort')
+        after_deadline = or_(
+            Goal.deadline > cursor_deadline,
+            and_(Goal.deadline == cursor_deadline, Goal.id > cursor_id)
+        )
+
+    if sort == 'deadline':
+        if after_deadline is not None:
+            query = query.where(after_deadline)
+        return query.order_by(Goal.deadline, Goal.id)
+
+    if after_deadline is not None:
+        if cursor_priority is None:
+            query = query.where(Goal.priority.is_(None), after_deadline)
+        else:
+            query = query.where(or_(
+                Goal.priority > cursor_priority,
+                Goal.priority.is_(None),
+                and_(Goal.priority == cursor_priority, after_deadline)
+            ))
+    return query.order_by(Goal.priority.asc().nulls_last(), Goal.deadline, Goal.id)
+
 @app.route('/goals', methods=['GET'])
 def get_goals():
-    goals = Goal.query.all()
-    json_goals = map(lambda x: x.to_json(), goals)
-    return jsonify({"goals": list(json_goals)}), 200
+    """
+    List a user's goals with their progress, paginated with a keyset cursor.
+
+    Query parameters: user_id, sort (priority or deadline), limit and cursor. Each goal
+    carries percent_complete, remaining, months_left, required_monthly and
+    projected_completion, derived in one pass over the page.
+    """
+    user_id = request.args.get('user_id', 1, type=int)
+    sort = request.args.get('sort', 'priority')
+    if sort not in GOAL_SORTS:
+        return jsonify({'error': f"Invalid sort, use one of: {', '.join(GOAL_SORTS)}"}), 400
+    limit = request.args.get('limit', GOAL_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_GOAL_PAGE_SIZE))
+
+    try:
+        query = build_goal_query(user_id, sort, request.args.get('cursor'))
+    except ValueError as ve:
+        return jsonify({'error': f'Invalid query parameter: {str(ve)}'}), 400
+
+    # Fetch one extra row to know whether there is a next page
+    goals = db.session.execute(query.limit(limit + 1)).scalars().all()
+    has_more = len(goals) > limit
+    goals = goals[:limit]
+
+    today = datetime.now()
+    return jsonify({
+        "goals": [goal_progress(goal, today) for goal in goals],
+        "next_cursor": encode_goal_cursor(goals[-1], sort) if has_more else None,
+        "has_more": has_more
+    }), 200
 
 @app.route('/create_goal', methods=['POST'])
 def create_goal():
@@ -401,7 +580,7 @@ def create_goal():
         new_goal = Goal(
             #user_id=request.json.get('user_id'),
             #category_id=request.json.get('category_id'),
-            user_id=1,  # For now, hardcode user_id as 1
+            user_id=request.json.get('user_id', 1),  # Default user_id 1
             name=name or 'no Name',  # Default name if not provided
             description=description or 'No description',
             target_amount=target_amount,
@@ -416,6 +595,7 @@ def create_goal():
         print("Created goal object:", new_goal.__dict__)
         db.session.add(new_goal)
         db.session.commit()
+        result_cache.invalidate_user(new_goal.user_id)
         print("Goal saved successfully")
         return jsonify({'message': 'Goal created successfully', 'goal': new_goal.to_json()}), 201
     except Exception as e:
@@ -457,6 +637,7 @@ def update_goal(goal_id):
 
     try:
         db.session.commit()
+        result_cache.invalidate_user(goal.user_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
@@ -472,6 +653,7 @@ def delete_goal(goal_id):
     try:
         db.session.delete(goal)
         db.session.commit()
+        result_cache.invalidate_user(goal.user_id)
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
@@ -483,130 +665,14 @@ def delete_goal(goal_id):
 def get_analytics():
     """Get spending analytics and insights"""
     try:
-        from sqlalchemy import func, extract
-        from datetime import timedelta
-        
         # Get query parameters for filtering
         period = request.args.get('period', '30')  # Default last 30 days
         user_id = request.args.get('user_id', 1)  # Default user_id 1
-        
-        # Calculate date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=int(period))
-        
-        # 1. Total spending and income
-        total_expenses = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.transaction_type == 'expense',
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= start_date
-        ).scalar() or 0
-        
-        total_income = db.session.query(
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.transaction_type == 'income',
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= start_date
-        ).scalar() or 0
-        
-        # 2. Spending by category
-        spending_by_category = db.session.query(
-            Category.name,
-            Category.type,
-            func.sum(Transaction.amount).label('total')
-        ).join(
-            Transaction, Transaction.category_id == Category.id
-        ).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= start_date
-        ).group_by(
-            Category.name, Category.type
-        ).all()
-        
-        category_data = [
-            {
-                'category': cat.name,
-                'type': cat.type,
-                'amount': float(cat.total) if cat.total else 0
-            }
-            for cat in spending_by_category
-        ]
-        
-        # 3. Daily spending trend (last 30 days)
-        daily_spending = db.session.query(
-            func.date(Transaction.transaction_date).label('date'),
-            Transaction.transaction_type,
-            func.sum(Transaction.amount).label('total')
-        ).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= start_date
-        ).group_by(
-            func.date(Transaction.transaction_date),
-            Transaction.transaction_type
-        ).order_by(
-            func.date(Transaction.transaction_date)
-        ).all()
-        
-        trend_data = {}
-        for record in daily_spending:
-            date_str = record.date.strftime('%Y-%m-%d')
-            if date_str not in trend_data:
-                trend_data[date_str] = {'date': date_str, 'income': 0, 'expense': 0}
-            
-            if record.transaction_type == 'income':
-                trend_data[date_str]['income'] = float(record.total) if record.total else 0
-            else:
-                trend_data[date_str]['expense'] = float(record.total) if record.total else 0
-        
-        # 4. Transaction statistics
-        transaction_count = Transaction.query.filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= start_date
-        ).count()
-        
-        avg_transaction = db.session.query(
-            func.avg(Transaction.amount)
-        ).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_date >= start_date
-        ).scalar() or 0
-        
-        # 5. Top spending categories (top 5)
-        top_categories = db.session.query(
-            Category.name,
-            func.sum(Transaction.amount).label('total')
-        ).join(
-            Transaction, Transaction.category_id == Category.id
-        ).filter(
-            Transaction.user_id == user_id,
-            Transaction.transaction_type == 'expense',
-            Transaction.transaction_date >= start_date
-        ).group_by(
-            Category.name
-        ).order_by(
-            func.sum(Transaction.amount).desc()
-        ).limit(5).all()
-        
-        top_categories_data = [
-            {'category': cat.name, 'amount': float(cat.total) if cat.total else 0}
-            for cat in top_categories
-        ]
-        
-        return jsonify({
-            'summary': {
-                'total_expenses': float(total_expenses) if total_expenses else 0,
-                'total_income': float(total_income) if total_income else 0,
-                'net_savings': float(total_income - total_expenses) if (total_income and total_expenses) else 0,
-                'transaction_count': transaction_count,
-                'avg_transaction': float(avg_transaction) if avg_transaction else 0,
-                'period_days': int(period)
-            },
-            'spending_by_category': category_data,
-            'daily_trend': list(trend_data.values()),
-            'top_categories': top_categories_data
-        }), 200
+
+        # All figures are derived from one grouped scan of the period
+        analytics = result_cache.get_or_compute(
+            'analytics', user_id, period, lambda: compute_analytics(user_id, period))
+        return jsonify(analytics), 200
         
     except Exception as e:
         print(f"❌ Error in analytics endpoint: {e}")
@@ -616,8 +682,193 @@ def get_analytics():
 
 # routes to get budgeting features
 
+def parse_budget_dates(period, start_date, end_date):
+    """Parse YYYY-MM-DD budget dates, deriving the end from the period when it is not given"""
+    start = datetime.strptime(start_date, '%Y-%m-%d') if isinstance(start_date, str) else start_date
+    if end_date:
+        # end_date is inclusive of the whole day
+        end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1, seconds=-1) if isinstance(end_date, str) else end_date
+    else:
+        end = budget_tracker.period_end(period, start)
+    if end < start:
+        raise ValueError('end_date must not be before start_date')
+    return start, end
+
+@app.route('/budgets', methods=['GET'])
+def get_budgets():
+    """List the user's budgets"""
+    user_id = request.args.get('user_id', 1, type=int)
+    budgets = Budget.query.filter_by(user_id=user_id).order_by(Budget.start_date.desc()).all()
+    return jsonify({"budgets": [budget.to_json() for budget in budgets]}), 200
+
+@app.route('/budgets/status', methods=['GET'])
+def get_budget_status():
+    """
+    Spend against each of the user's budgets, read from the spend kept on the budget rows.
+
+    Query parameters: user_id and active (true by default, false to include budgets
+    whose window is not current).
+    """
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        active_only = request.args.get('active', 'true').lower() == 'true'
+        return jsonify(compute_budget_status(user_id, active_only)), 200
+    except Exception as e:
+        print(f"❌ Error in budget status endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/budgets/events', methods=['GET'])
+def get_budget_events():
+    """Threshold crossings of the user's budgets, newest first; pass since (ISO datetime) to poll for new ones"""
+    try:
+        user_id = request.args.get('user_id', 1, type=int)
+        limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        query = BudgetEvent.query.filter_by(user_id=user_id)
+        since = request.args.get('since')
+        if since:
+            query = query.filter(BudgetEvent.created_at > datetime.fromisoformat(since))
+        events = query.order_by(BudgetEvent.created_at.desc(), BudgetEvent.id.desc()).limit(limit).all()
+    except ValueError as ve:
+        return jsonify({'error': f'Invalid query parameter: {str(ve)}'}), 400
+    return jsonify({"events": [event.to_json() for event in events]}), 200
+
+@app.route('/create_budget', methods=['POST'])
+def create_budget():
+    if not request.json:
+        return jsonify({'error': 'Request must contain JSON data'}), 400
+
+    category_id = request.json.get('category_id')
+    amount = request.json.get('amount')
+    period = request.json.get('period', 'monthly')
+    start_date = request.json.get('start_date')
+    end_date = request.json.get('end_date')
+    alert_threshold = request.json.get('alert_threshold', 80)
+
+    if not category_id or not amount or not start_date:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    if period not in budget_tracker.PERIODS:
+        return jsonify({'error': f"Period must be one of: {', '.join(budget_tracker.PERIODS)}"}), 400
+
+    try:
+        user_id = int(request.json.get('user_id', 1))  # Default user_id 1
+    except (TypeError, ValueError):
+        return jsonify({'error': 'user_id must be an integer'}), 400
+
+    category = Category.query.get(category_id)
+    if not category or category.user_id != user_id:
+        return jsonify({'error': f'Category with id {category_id} does not exist'}), 400
+
+    try:
+        start, end = parse_budget_dates(period, start_date, end_date)
+        new_budget = Budget(
+            user_id=user_id,
+            category_id=category_id,
+            amount=amount,
+            period=period,
+            start_date=start,
+            end_date=end,
+            alert_threshold=alert_threshold
+        )
+        db.session.add(new_budget)
+        db.session.flush()
+        # spend already in the window comes from the daily rollup, from then on it is kept up to date on write
+        budget_tracker.recompute_budget(new_budget)
+        db.session.commit()
+        result_cache.invalidate_user(new_budget.user_id)
+        return jsonify({'message': 'Budget created successfully', 'budget': new_budget.to_json()}), 201
+    except ValueError as ve:
+        db.session.rollback()
+        return jsonify({'error': f'Invalid data format: {str(ve)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error creating budget: {e}")
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/update_budget/<int:budget_id>', methods=['PATCH'])
+def update_budget(budget_id):
+    budget = Budget.query.get(budget_id)
+    if not budget:
+        return jsonify({'error': 'Budget not found'}), 404
+
+    category_id = request.json.get('category_id', budget.category_id)
+    amount = request.json.get('amount', budget.amount)
+    period = request.json.get('period', budget.period)
+    alert_threshold = request.json.get('alert_threshold', budget.alert_threshold)
+
+    if not category_id or not amount:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    if period not in budget_tracker.PERIODS:
+        return jsonify({'error': f"Period must be one of: {', '.join(budget_tracker.PERIODS)}"}), 400
+
+    if category_id != budget.category_id:
+        category = Category.query.get(category_id)
+        if not category or category.user_id != budget.user_id:
+            return jsonify({'error': f'Category with id {category_id} does not exist'}), 400
+
+    try:
+        if 'start_date' in request.json or 'end_date' in request.json or 'period' in request.json:
+            start, end = parse_budget_dates(
+                period, request.json.get('start_date', budget.start_date), request.json.get('end_date'))
+        else:
+            start, end = budget.start_date, budget.end_date
+
+        budget.category_id = category_id
+        budget.amount = amount
+        budget.period = period
+        budget.start_date = start
+        budget.end_date = end
+        budget.alert_threshold = alert_threshold
+        db.session.flush()
+        budget_tracker.recompute_budget(budget)
+        db.session.commit()
+        result_cache.invalidate_user(budget.user_id)
+    except ValueError as ve:
+        db.session.rollback()
+        return jsonify({'error': f'Invalid data format: {str(ve)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({"Budget updated": budget.to_json()}), 200
+
+@app.route('/delete_budget/<int:budget_id>', methods=['DELETE'])
+def delete_budget(budget_id):
+    budget = Budget.query.get(budget_id)
+    if not budget:
+        return jsonify({'error': 'Budget not found'}), 404
+
+    try:
+        BudgetEvent.query.filter_by(budget_id=budget_id).delete()
+        db.session.delete(budget)
+        db.session.commit()
+        result_cache.invalidate_user(budget.user_id)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({'message': 'Budget deleted successfully'}), 200
+
 # routes for chatbot
 
+def embed_for_router(texts):
+    """Embed texts for the intent classifier on the agent runner's loop"""
+    from agent_runner import agent_runner
+    return agent_runner.embed(texts)
+
+intent_router = IntentRouter(embed=embed_for_router) if INTENT_ROUTER_ENABLED else None
+
+def route_message(user_message, user_id):
+    """Answer canned and data intents without the agent, or return None to escalate"""
+    if intent_router is None:
+        return None
+    try:
+        return intent_router.route(user_message, user_id)
+    except Exception as e:
+        print(f"⚠️ Intent routing failed, escalating to the agent: {e}")
+        return None
+
 @app.route('/chat', methods=['POST'])
 def chat_with_rag():
     """Handle chat requests and integrate with RAG agent"""
@@ -629,47 +880,43 @@ def chat_with_rag():
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
 
+        user_id = request.json.get('user_id', 1)
+
         print(f"🔄 Received chat message: {user_message}")
+
+        started = time.perf_counter()
+        routed = route_message(user_message, user_id)
+        if routed is not None:
+            intent_router.record(routed.route, time.perf_counter() - started, routed.intent)
+            print(f"⚡ Answered {routed.intent} intent without the agent ({routed.method})")
+            return jsonify({
+                'response': routed.text,
+                'source': 'router',
+                'intent': routed.intent
+            }), 200
         
-        # Import the RAG agent function
+        # Run the RAG agent on the shared background event loop
         try:
-            from agent import agent
-            
-            if agent is None:
-                print("⚠️ RAG agent is None, falling back to simple responses")
-                raise ImportError("Agent not initialized")
-            
-            print("✅ RAG agent imported successfully, processing...")
-            
-            # Run the RAG agent asynchronously
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            agent_response = loop.run_until_complete(agent.run(user_message))
-            loop.close()
+            from agent_runner import agent_runner, response_text as extract_response_text
+
+            print("✅ Submitting message to RAG agent runner...")
+            agent_response = agent_runner.run(user_message, user_id=user_id)
             
             print(f"🔍 Agent response type: {type(agent_response)}")
             print(f"🔍 Agent response object: {agent_response}")
             
             # Extract the actual text from the AgentRunResponse object
-            if hasattr(agent_response, 'content'):
-                response_text = agent_response.content
-            elif hasattr(agent_response, 'text'):
-                response_text = agent_response.text
-            elif hasattr(agent_response, 'message'):
-                response_text = agent_response.message
-            elif hasattr(agent_response, 'result'):
-                response_text = agent_response.result
-            elif hasattr(agent_response, 'output'):
-                response_text = agent_response.output
-            else:
-                # Try to convert to string as fallback
-                response_text = str(agent_response)
+            response_text = extract_response_text(agent_response)
+            cached = getattr(agent_response, 'cached', False)
+            if intent_router is not None:
+                intent_router.record(ROUTE_AGENT, time.perf_counter() - started)
             
-            print(f"✅ Extracted response text: {response_text[:100]}...")
+            print(f"✅ Extracted response text{' (cached)' if cached else ''}: {response_text[:100]}...")
             
             return jsonify({
                 'response': response_text,
-                'source': 'rag_agent'
+                'source': 'rag_agent',
+                'cached': cached
             }), 200
             
         except ImportError as e:
@@ -697,6 +944,66 @@ def chat_with_rag():
         traceback.print_exc()
         return jsonify({'error': 'Internal server error'}), 500
 
+def format_sse(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the RAG agent's answer to the browser as server-sent events"""
+    if not request.json:
+        return jsonify({'error': 'Request must contain JSON data'}), 400
+
+    user_message = request.json.get('message')
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+
+    user_id = request.json.get('user_id', 1)
+
+    print(f"🔄 Received streaming chat message: {user_message}")
+
+    started = time.perf_counter()
+    routed = route_message(user_message, user_id)
+    if routed is not None:
+        intent_router.record(routed.route, time.perf_counter() - started, routed.intent)
+        print(f"⚡ Answered {routed.intent} intent without the agent ({routed.method})")
+
+    def generate():
+        if routed is not None:
+            yield format_sse('delta', {'type': 'delta', 'agent': None, 'text': routed.text})
+            yield format_sse('done', {'source': 'router', 'intent': routed.intent})
+            return
+        source = 'rag_agent'
+        sent_text = False
+        events = None
+        try:
+            from agent_runner import agent_runner
+
+            events = agent_runner.stream(user_message, user_id=user_id)
+            for event in events:
+                sent_text = sent_text or event['type'] == 'delta'
+                yield format_sse(event['type'], event)
+            if intent_router is not None:
+                intent_router.record(ROUTE_AGENT, time.perf_counter() - started)
+        except Exception as e:
+            print(f"❌ RAG agent streaming failed: {e}")
+            if sent_text:
+                yield format_sse('error', {'error': 'The response was interrupted, please try again'})
+            else:
+                # Nothing reached the client yet, answer with the simple response instead
+                source = 'fallback'
+                yield format_sse('delta', {'type': 'delta', 'agent': None, 'text': generate_simple_response(user_message)})
+        finally:
+            # Runs on client disconnect too, cancelling the agent run
+            if events is not None:
+                events.close()
+        yield format_sse('done', {'source': source})
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # stop nginx buffering the stream
+    })
+
 def generate_simple_response(message):
     """Fallback function for simple responses when RAG is not available"""
     message = message.lower()
@@ -733,11 +1040,88 @@ def health_check():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit and miss counters of the analytics and category stats result cache"""
+    return jsonify(result_cache.stats()), 200
+
+@app.route('/chat/cache/stats', methods=['GET'])
+def chat_cache_stats():
+    """Hit and miss counters of the semantic answer cache in front of the chat agent"""
+    from agent_runner import agent_runner
+
+    if agent_runner.answer_cache is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **agent_runner.answer_cache.stats()}), 200
+
+@app.route('/chat/router/stats', methods=['GET'])
+def chat_router_stats():
+    """Per-route latency and escalation rate of the intent router in front of the chat agent"""
+    if intent_router is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **intent_router.stats()}), 200
+
+@app.route('/chat/tools/<tool>', methods=['GET'])
+def chat_tool(tool):
+    """The personal finance agent tools as compact tables, for agents running outside this process"""
+    from finance_tools import budget_table, goal_table, spending_table
+
+    user_id = request.args.get('user_id', 1)
+    try:
+        if tool == 'spending':
+            table = spending_table(user_id, request.args.get('period', '30'), request.args.get('category'))
+        elif tool == 'budgets':
+            table = budget_table(user_id)
+        elif tool == 'goals':
+            table = goal_table(user_id)
+        else:
+            return jsonify({'error': f'Unknown tool: {tool}'}), 404
+        return jsonify({'table': table}), 200
+    except Exception as e:
+        print(f"❌ Error in chat tool endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# database migrations
+
+# revision matching the schema db.create_all() produced before migrations were introduced
+BASELINE_REVISION = '69c8b99d7138'
+
+def upgrade_database():
+    """Apply pending migrations, stamping databases created by db.create_all() as the baseline first"""
+    from flask_migrate import upgrade, stamp
+    from sqlalchemy import inspect
+
+    tables = inspect(db.engine).get_table_names()
+    if 'transactions' in tables and 'alembic_version' not in tables:
+        print(f"ℹ️  Existing schema found without migration history, stamping {BASELINE_REVISION}")
+        stamp(revision=BASELINE_REVISION)
+    upgrade()
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Bring the database schema up to date"""
+    upgrade_database()
+    print("✅ Database schema is up to date")
+
+@app.cli.command('rebuild-rollup')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user')
+def rebuild_rollup_command(user_id):
+    """Backfill the daily_user_totals rollup from existing transactions"""
+    rows = daily_rollup.rebuild_daily_totals(user_id)
+    print(f"✅ Rebuilt {rows} daily total rows")
+
+@app.cli.command('rebuild-budgets')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user')
+def rebuild_budgets_command(user_id):
+    """Recompute budget spend from the daily_user_totals rollup"""
+    budgets = budget_tracker.rebuild_budget_spend(user_id)
+    print(f"✅ Rebuilt spend of {budgets} budgets")
+
 # run flask app
 if __name__ == '__main__':
     # initiate db
     with app.app_context():
-        # create all tables in the database
-        db.create_all()
+        # create or migrate all tables in the database
+        upgrade_database()
     app.run(debug=True)
 
@@ -0,0 +1,234 @@
+"""
+Benchmark the single-pass analytics engine against the previous six-query /analytics implementation.
+
+Seeds a benchmark user with N transactions (default 1,000,000) into the configured DATABASE_URL,
+then reports database round-trips and wall-clock time for the previous implementation against the
+daily rollup. Also checks that /categories/stats stays at a fixed number of queries however many
+categories the user has, and that EXPLAIN shows the rollup and the recent transactions lookups
+served by their indexes.
+
+Usage: python benchmark_analytics.py [rows] [period_days]
+
+The backend CI workflow runs it on SQLite before building the image, so a failed check fails the build.
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, insert, text
+
+from config import app, db
+from models import User, Category, Transaction
+from analytics_engine import (
+    compute_analytics, compute_category_stats, daily_groups_query, get_period_start, recent_by_category_query)
+from daily_rollup import rebuild_daily_totals
+
+BENCH_USER_ID = 999
+BENCH_CATEGORIES = [
+    ('Groceries', 'expense'), ('Transport', 'expense'), ('Utilities', 'expense'),
+    ('Dining Out', 'expense'), ('Entertainment', 'expense'), ('Shopping', 'expense'),
+    ('Healthcare', 'expense'), ('Travel', 'expense'), ('Salary', 'income'), ('Freelance', 'income'),
+]
+INSERT_BATCH_SIZE = 10000
+CATEGORY_STATS_QUERIES = 2
+
+
+def seed(rows):
+    """Create the benchmark user, categories and `rows` transactions spread over two years."""
+    if not User.query.get(BENCH_USER_ID):
+        db.session.add(User(
+            id=BENCH_USER_ID,
+            email='bench@financetracker.com',
+            password='bench',
+            username='bench',
+            first_name='Bench',
+            last_name='User'
+        ))
+        db.session.commit()
+
+    categories = []
+    for name, category_type in BENCH_CATEGORIES:
+        category = Category.query.filter_by(user_id=BENCH_USER_ID, name=name).first()
+        if not category:
+            category = Category(user_id=BENCH_USER_ID, name=name, type=category_type)
+            db.session.add(category)
+        categories.append(category)
+    db.session.commit()
+
+    existing = Transaction.query.filter_by(user_id=BENCH_USER_ID).count()
+    if existing >= rows:
+        print(f"ℹ️  Benchmark user already has {existing} transactions")
+        rebuild_daily_totals(BENCH_USER_ID)
+        return
+
+    now = datetime.now()
+    batch = []
+    for i in range(rows - existing):
+        category = random.choice(categories)
+        batch.append({
+            'user_id': BENCH_USER_ID,
+            'category_id': category.id,
+            'description': f'Bench transaction {i}',
+            'amount': round(random.uniform(1, 500), 2),
+            'transaction_type': category.type,
+            'transaction_date': now - timedelta(minutes=random.randint(0, 2 * 365 * 24 * 60)),
+        })
+        if len(batch) == INSERT_BATCH_SIZE:
+            db.session.execute(insert(Transaction), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Transaction), batch)
+    db.session.commit()
+    print(f"✅ Seeded {rows - existing} transactions")
+
+    # bulk inserts bypass the write path, so backfill the rollup for the benchmark user
+    print(f"✅ Rebuilt {rebuild_daily_totals(BENCH_USER_ID)} daily total rows")
+
+
+def legacy_analytics(user_id, period):
+    """The previous /analytics implementation: six separate aggregate queries over the same slice."""
+    start_date = get_period_start(period)
+
+    total_expenses = db.session.query(func.sum(Transaction.amount)).filter(
+        Transaction.transaction_type == 'expense',
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start_date
+    ).scalar() or 0
+
+    total_income = db.session.query(func.sum(Transaction.amount)).filter(
+        Transaction.transaction_type == 'income',
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start_date
+    ).scalar() or 0
+
+    spending_by_category = db.session.query(
+        Category.name, Category.type, func.sum(Transaction.amount).label('total')
+    ).join(Transaction, Transaction.category_id == Category.id).filter(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start_date
+    ).group_by(Category.name, Category.type).all()
+
+    daily_spending = db.session.query(
+        func.date(Transaction.transaction_date).label('date'),
+        Transaction.transaction_type,
+        func.sum(Transaction.amount).label('total')
+    ).filter(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start_date
+    ).group_by(func.date(Transaction.transaction_date), Transaction.transaction_type).all()
+
+    transaction_count = Transaction.query.filter(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start_date
+    ).count()
+
+    avg_transaction = db.session.query(func.avg(Transaction.amount)).filter(
+        Transaction.user_id == user_id,
+        Transaction.transaction_date >= start_date
+    ).scalar() or 0
+
+    top_categories = db.session.query(
+        Category.name, func.sum(Transaction.amount).label('total')
+    ).join(Transaction, Transaction.category_id == Category.id).filter(
+        Transaction.user_id == user_id,
+        Transaction.transaction_type == 'expense',
+        Transaction.transaction_date >= start_date
+    ).group_by(Category.name).order_by(func.sum(Transaction.amount).desc()).limit(5).all()
+
+    return {
+        'total_expenses': float(total_expenses),
+        'total_income': float(total_income),
+        'transaction_count': transaction_count,
+        'avg_transaction': float(avg_transaction),
+        'categories': len(spending_by_category),
+        'days': len({str(d.date) for d in daily_spending}),
+        'top_categories': [c.name for c in top_categories],
+    }
+
+
+def measure(label, fn, repeats=5):
+    """
+    Run fn `repeats` times and report the mean latency and statements sent per call.
+
+    :return: The last result of fn and the number of statements sent per call.
+    """
+    statements = []
+
+    def count_statement(*args, **kwargs):
+        statements.append(1)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            result = fn()
+        elapsed = (time.perf_counter() - start) / repeats
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+    queries = len(statements) / repeats
+    print(f"{label:<14} {elapsed * 1000:>10.1f} ms/request {queries:>6.0f} queries/request")
+    return result, queries
+
+
+def explain(query):
+    """Return the database's plan for a query as text."""
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN' if dialect.name == 'sqlite' else 'EXPLAIN'
+    rows = db.session.execute(text(f"{prefix} {sql}")).all()
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def check_index_usage(period_days=30):
+    """Assert that the queries behind a typical dashboard period are served by indexes."""
+    start_date = get_period_start(period_days)
+
+    plan = explain(daily_groups_query(BENCH_USER_ID, start_date))
+    print(plan)
+    # the rollup is keyed by (user_id, date, ...) so its primary key serves the range scan
+    rollup_lines = [line for line in plan.splitlines() if 'daily_user_totals' in line]
+    assert any(key in line for line in rollup_lines for key in ('pkey', 'autoindex', 'PRIMARY KEY')), \
+        "rollup scan does not use its primary key"
+    print("✅ Analytics scan uses the daily_user_totals primary key")
+
+    category_ids = [category.id for category in Category.query.filter_by(user_id=BENCH_USER_ID)]
+    plan = explain(recent_by_category_query(BENCH_USER_ID, category_ids, start_date))
+    print(plan)
+    # every per-category branch must be a bounded range scan of the category index, not a ranking of the period
+    assert 'ix_transactions_user_category_date' in plan, "recent transactions lookup does not use ix_transactions_user_category_date"
+    assert 'row_number' not in plan.lower(), "recent transactions lookup still ranks the whole period"
+    print("✅ Recent transactions lookup uses ix_transactions_user_category_date")
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    period = int(sys.argv[2]) if len(sys.argv) > 2 else 365
+
+    with app.app_context():
+        db.create_all()
+        seed(rows)
+
+        print(f"\n📊 /analytics over {period} days for user {BENCH_USER_ID}")
+        legacy, _ = measure('legacy', lambda: legacy_analytics(BENCH_USER_ID, period))
+        single, _ = measure('rollup', lambda: compute_analytics(BENCH_USER_ID, period))
+
+        summary = single['summary']
+        assert legacy['transaction_count'] == summary['transaction_count']
+        assert abs(legacy['total_expenses'] - summary['total_expenses']) < 0.01
+        assert abs(legacy['total_income'] - summary['total_income']) < 0.01
+        assert legacy['days'] == len(single['daily_trend'])
+        assert legacy['top_categories'] == [c['category'] for c in single['top_categories']]
+        print("✅ Both implementations agree")
+
+        print(f"\n📊 /categories/stats over {period} days for user {BENCH_USER_ID}")
+        stats, queries = measure('category stats', lambda: compute_category_stats(BENCH_USER_ID, period))
+        # A per-category loop for recent transactions would add one query per category
+        assert queries == CATEGORY_STATS_QUERIES, f"expected {CATEGORY_STATS_QUERIES} queries, got {queries:.0f}"
+        assert all(len(c['recent_transactions']) <= 3 for c in stats['categories'])
+        print(f"✅ {len(stats['categories'])} categories served in {CATEGORY_STATS_QUERIES} queries")
+
+        print("\n📊 EXPLAIN for a 30-day dashboard period")
+        check_index_usage(30)
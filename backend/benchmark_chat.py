@@ -0,0 +1,80 @@
+"""
+Benchmark /chat agent execution with a fresh event loop per request against the shared AgentRunner loop.
+
+Uses a simulated agent so it runs without Azure credentials: each call spends GENERATION_SECONDS
+waiting on the "LLM", and the first call on an event loop pays HANDSHAKE_SECONDS to open a pooled
+connection, the way AsyncAzureOpenAI's HTTP pool does. A new loop per request pays that every time.
+
+Usage: python benchmark_chat.py [concurrent_chats] [total_chats]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from agent_runner import AgentRunner
+
+HANDSHAKE_SECONDS = 0.3
+GENERATION_SECONDS = 1.0
+
+
+class SimulatedAgent:
+    """Stands in for the chat agent, keeping one warm connection pool per event loop."""
+
+    def __init__(self):
+        self._warm_loops = set()
+
+    async def run(self, message):
+        loop = asyncio.get_running_loop()
+        if loop not in self._warm_loops:
+            await asyncio.sleep(HANDSHAKE_SECONDS)
+            self._warm_loops.add(loop)
+        await asyncio.sleep(GENERATION_SECONDS)
+        return f"answer to {message}"
+
+
+def per_request_loop(agent, message):
+    """The previous /chat behaviour: create, use and close an event loop per message."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(agent.run(message))
+    finally:
+        loop.close()
+
+
+def measure(label, handler, concurrency, total):
+    """Send `total` chats from `concurrency` request threads and report throughput and latency."""
+    latencies = []
+
+    def one_chat(i):
+        start = time.perf_counter()
+        handler(f"question {i}")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_chat, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<22} {total / elapsed:>7.1f} chats/s  p50 {statistics.median(latencies):.2f}s  p95 {p95:.2f}s")
+
+
+if __name__ == '__main__':
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"💬 {total} chats from {concurrency} concurrent request threads "
+          f"(simulated {GENERATION_SECONDS}s generation, {HANDSHAKE_SECONDS}s connection setup)")
+
+    legacy_agent = SimulatedAgent()
+    measure('loop per request', lambda message: per_request_loop(legacy_agent, message), concurrency, total)
+
+    runner = AgentRunner(max_concurrency=concurrency, timeout=30,
+                         loader=lambda: (SimulatedAgent(), None, None, None, None))
+    runner.run('warm up')
+    measure('shared agent runner', runner.run, concurrency, total)
+    runner.close()
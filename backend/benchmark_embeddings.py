@@ -0,0 +1,142 @@
+"""
+Replay a chat query log through SearchIndexManager's query embedding path, with and without the EmbeddingCache.
+
+Uses a simulated embeddings client so it runs without Azure credentials: every call takes
+EMBEDDING_LATENCY_SECONDS and is billed at PRICE_PER_MILLION_TOKENS, with tokens estimated at
+CHARS_PER_TOKEN characters each. Queries are replayed in bursts of CONCURRENCY at a time, the way
+simultaneous chats arrive, so identical in-flight questions exercise request coalescing.
+
+The log is a text file with one question per line. Without one, a synthetic log is generated
+with a skewed mix of common questions and casing/whitespace variants.
+
+Usage: python benchmark_embeddings.py [query_log.txt] [queries]
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from embedding_cache import EmbeddingCache
+
+EMBEDDING_LATENCY_SECONDS = 0.08
+PRICE_PER_MILLION_TOKENS = 0.02
+CHARS_PER_TOKEN = 4
+DIMENSIONS = 1536
+CONCURRENCY = 8
+MODEL = 'text-embedding-3-small'
+
+COMMON_QUESTIONS = [
+    "How can I create a budget?",
+    "How do I save more money?",
+    "Help me track my expenses",
+    "What are good financial goals?",
+    "How should I start investing?",
+    "How can I manage my debt?",
+    "What is the 50/30/20 rule?",
+    "How big should my emergency fund be?",
+    "Should I pay off debt or invest first?",
+    "What is an index fund?",
+]
+
+
+class SimulatedEmbeddingsClient:
+    """Stands in for the embeddings endpoint, counting calls and billed tokens."""
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    async def embed(self, text):
+        self.calls += 1
+        self.tokens += max(1, len(text) // CHARS_PER_TOKEN)
+        await asyncio.sleep(EMBEDDING_LATENCY_SECONDS)
+        rng = random.Random(text)
+        return [rng.uniform(-1, 1) for _ in range(DIMENSIONS)]
+
+
+def synthetic_log(total):
+    """Build a query log where a few questions dominate and many arrive with trivial variations."""
+    rng = random.Random(42)
+    weights = [1 / (rank + 1) for rank in range(len(COMMON_QUESTIONS))]
+    queries = []
+    for i in range(total):
+        if rng.random() < 0.2:
+            queries.append(f"Question number {i} about my spending on category {rng.randint(1, 500)}")
+            continue
+        question = rng.choices(COMMON_QUESTIONS, weights)[0]
+        variant = rng.random()
+        if variant < 0.2:
+            question = question.lower()
+        elif variant < 0.3:
+            question = f"  {question}  "
+        queries.append(question)
+    return queries
+
+
+async def replay(queries, cache=None):
+    """Embed every query, CONCURRENCY at a time, and return the client and per-query latencies."""
+    client = SimulatedEmbeddingsClient()
+    latencies = []
+
+    async def one(query):
+        start = time.perf_counter()
+        if cache is not None:
+            await cache.get_or_create(MODEL, query, client.embed)
+        else:
+            await client.embed(query)
+        latencies.append(time.perf_counter() - start)
+
+    for i in range(0, len(queries), CONCURRENCY):
+        await asyncio.gather(*(one(query) for query in queries[i:i + CONCURRENCY]))
+    return client, latencies
+
+
+def report(label, client, latencies, elapsed):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    cost = client.tokens / 1_000_000 * PRICE_PER_MILLION_TOKENS
+    print(f"{label:<22} {client.calls:>6} calls  {client.tokens:>8} tokens  ${cost:.6f}  "
+          f"total {elapsed:.2f}s  p50 {statistics.median(latencies) * 1000:.1f}ms  p95 {p95 * 1000:.1f}ms")
+
+
+async def main():
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as fp:
+            queries = [line.strip() for line in fp if line.strip()][:total]
+    else:
+        queries = synthetic_log(total)
+
+    print(f"🔁 Replaying {len(queries)} queries, {CONCURRENCY} at a time "
+          f"(simulated {EMBEDDING_LATENCY_SECONDS * 1000:.0f}ms per embeddings call)")
+
+    start = time.perf_counter()
+    client, latencies = await replay(queries)
+    report('no cache', client, latencies, time.perf_counter() - start)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'embedding_cache.sqlite3')
+
+        cache = EmbeddingCache(path=path)
+        start = time.perf_counter()
+        client, latencies = await replay(queries, cache)
+        report('cold cache', client, latencies, time.perf_counter() - start)
+        print(f"   {cache.stats()}")
+        cache.close()
+
+        # A restarted process starts with an empty LRU but the on-disk store
+        cache = EmbeddingCache(path=path)
+        start = time.perf_counter()
+        client, latencies = await replay(queries, cache)
+        report('after restart', client, latencies, time.perf_counter() - start)
+        print(f"   {cache.stats()}")
+        print(f"   on-disk store {os.path.getsize(path) / 1024:.0f} KiB "
+              f"({DIMENSIONS * 4} bytes per vector as float32)")
+        cache.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
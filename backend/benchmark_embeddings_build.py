@@ -0,0 +1,114 @@
+"""
+Benchmark SearchIndexManager.build_embeddings_file against a simulated embeddings endpoint.
+
+Every request takes REQUEST_SECONDS plus a little per chunk, and RATE_LIMIT_PROBABILITY of
+requests are rejected with a 429 carrying a short Retry-After, so the retry path is exercised.
+Builds a synthetic markdown corpus, then reports wall-clock time for each concurrency setting
+and the peak Python memory for growing corpus sizes.
+
+Needs nltk and its punkt data, like build_embeddings_file itself.
+
+Usage: python benchmark_embeddings_build.py [paragraphs]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import httpx
+from openai import RateLimitError
+
+from search_index_manager import SearchIndexManager
+
+REQUEST_SECONDS = 0.2
+SECONDS_PER_CHUNK = 0.0005
+RATE_LIMIT_PROBABILITY = 0.05
+# Small vectors, so JSON encoding the csv rows does not hide the request concurrency on one core
+DIMENSIONS = 256
+BATCH_SIZE = 256
+CONCURRENCY_LEVELS = [1, 2, 4, 8]
+
+
+class SimulatedEmbeddings:
+    """Stands in for embeddings_client.embeddings, counting requests and 429s."""
+
+    def __init__(self):
+        self.requests = 0
+        self.rate_limited = 0
+        self._rng = random.Random(3)
+
+    async def create(self, input, model):
+        self.requests += 1
+        await asyncio.sleep(REQUEST_SECONDS + SECONDS_PER_CHUNK * len(input))
+        if self._rng.random() < RATE_LIMIT_PROBABILITY:
+            self.rate_limited += 1
+            response = httpx.Response(429, headers={'retry-after': '0.1'},
+                                      request=httpx.Request('POST', 'https://example.invalid/embeddings'))
+            raise RateLimitError('Rate limit exceeded', response=response, body=None)
+        data = [type('Embedding', (), {'embedding': [0.001] * DIMENSIONS}) for _ in input]
+        return type('Response', (), {'data': data})
+
+
+class SimulatedClient:
+    def __init__(self):
+        self.embeddings = SimulatedEmbeddings()
+
+
+def write_corpus(directory, paragraphs):
+    """Write markdown files of generated finance-flavoured sentences."""
+    rng = random.Random(11)
+    words = ['budget', 'savings', 'interest', 'expense', 'income', 'investment', 'debt', 'goal',
+             'account', 'credit', 'monthly', 'emergency', 'fund', 'retirement', 'portfolio']
+    for file_number in range(max(1, paragraphs // 500)):
+        with open(os.path.join(directory, f"doc_{file_number}.md"), 'w') as fp:
+            for _ in range(min(500, paragraphs)):
+                sentences = [' '.join(rng.choice(words) for _ in range(12)).capitalize() + '.' for _ in range(6)]
+                fp.write(' '.join(sentences) + '\n\n')
+
+
+async def build(corpus_directory, output_file, concurrency):
+    client = SimulatedClient()
+    manager = SearchIndexManager(endpoint=None, credentials=None, model='text-embedding-3-small', api_key=None,
+                                 index_name=None, dimension=DIMENSIONS, embeddings_client=client)
+    start = time.perf_counter()
+    stats = await manager.build_embeddings_file(corpus_directory, output_file, max_concurrency=concurrency,
+                                                max_batch_size=BATCH_SIZE)
+    return stats['rows'], time.perf_counter() - start, client.embeddings
+
+
+async def main():
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = os.path.join(directory, 'corpus')
+        os.makedirs(corpus)
+        write_corpus(corpus, paragraphs)
+
+        print(f"🧱 {paragraphs} paragraphs, batches of {BATCH_SIZE}, "
+              f"simulated {REQUEST_SECONDS * 1000:.0f}ms per request, {RATE_LIMIT_PROBABILITY:.0%} rate limited")
+        for concurrency in CONCURRENCY_LEVELS:
+            # A fresh output file each time, so the incremental build does not reuse the last run
+            output_file = os.path.join(directory, f"embeddings_{concurrency}.csv")
+            rows, elapsed, embeddings = await build(corpus, output_file, concurrency)
+            print(f"concurrency {concurrency:<3} {rows} rows  {embeddings.requests} requests "
+                  f"({embeddings.rate_limited} rate limited)  {elapsed:.2f}s")
+
+        print("\n📈 Peak Python memory by corpus size (concurrency 4)")
+        for size in (paragraphs // 4, paragraphs, paragraphs * 4):
+            sized_corpus = os.path.join(directory, f"corpus_{size}")
+            os.makedirs(sized_corpus)
+            write_corpus(sized_corpus, size)
+            output_file = os.path.join(directory, f"embeddings_size_{size}.csv")
+            tracemalloc.start()
+            rows, elapsed, _ = await build(sized_corpus, output_file, 4)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{size:>7} paragraphs  {rows} rows  peak {peak / 2**20:.1f} MiB  "
+                  f"csv {os.path.getsize(output_file) / 2**20:.0f} MiB  {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+Compare the JSON-in-csv and binary .npy embeddings formats: file size, load time and peak RSS.
+
+Writes a synthetic corpus in both formats through EmbeddingsWriter, then loads each in a fresh
+process so peak RSS is not shared between measurements:
+  - matrix: load every vector into one float32 matrix, as LocalVectorIndex does
+  - scan:   decode every row's vector in turn, as upload_documents does
+
+Usage: python benchmark_embeddings_format.py [chunks] [dimensions]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from embeddings_file import EmbeddingsWriter, iter_rows, load_matrix, to_vector, tokens_path
+
+
+def write_corpus(embeddings_file, chunks, dimensions):
+    rng = np.random.default_rng(5)
+    start = time.perf_counter()
+    with EmbeddingsWriter(embeddings_file) as writer:
+        for i in range(chunks):
+            # Rounded like the embeddings API returns them, so the csv is realistically sized
+            vector = np.round(rng.standard_normal(dimensions) * 0.03, 9)
+            writer.write(f"chunk-{i}", f"Chunk {i} of the finance knowledge base about budgets and savings.", vector)
+    return time.perf_counter() - start
+
+
+def measure(embeddings_file, mode):
+    """Run one load in a child process and return its elapsed seconds and peak RSS in MiB."""
+    output = subprocess.run([sys.executable, __file__, '--load', embeddings_file, mode],
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), float(output[1])
+
+
+def load(embeddings_file, mode):
+    start = time.perf_counter()
+    if mode == 'matrix':
+        tokens, matrix = load_matrix(embeddings_file)
+        # Touch every page, so a memory-mapped matrix is really read
+        float(np.asarray(matrix).sum())
+    else:
+        for row in iter_rows(embeddings_file):
+            to_vector(row['embedding'])
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(elapsed, peak)
+
+
+def main():
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dimensions = int(sys.argv[2]) if len(sys.argv) > 2 else 1536
+    print(f"📦 {chunks} chunks x {dimensions} dims")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('embeddings.csv', 'embeddings.npy'):
+            embeddings_file = os.path.join(directory, name)
+            written = write_corpus(embeddings_file, chunks, dimensions)
+            size = os.path.getsize(embeddings_file)
+            if name.endswith('.npy'):
+                size += os.path.getsize(tokens_path(embeddings_file))
+            matrix_seconds, matrix_rss = measure(embeddings_file, 'matrix')
+            scan_seconds, scan_rss = measure(embeddings_file, 'scan')
+            print(f"{name:<16} {size / 2**20:8.0f} MiB  write {written:6.1f}s  "
+                  f"matrix load {matrix_seconds:6.2f}s / {matrix_rss:5.0f} MiB RSS  "
+                  f"row scan {scan_seconds:6.2f}s / {scan_rss:5.0f} MiB RSS")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--load':
+        load(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,113 @@
+"""
+Benchmark SearchIndexManager.upload_documents against a simulated Azure AI Search client.
+
+Each index request takes REQUEST_SECONDS plus a little per document, and FAILURE_PROBABILITY of
+documents come back with a retryable 503, so per-key retries are exercised. Reports docs per
+second for each concurrency setting, then interrupts an upload halfway and resumes it from the
+checkpoint file.
+
+Usage: python benchmark_upload.py [chunks] [dimensions]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from embeddings_file import EmbeddingsWriter
+from search_index_manager import SearchIndexManager, write_manifest
+
+REQUEST_SECONDS = 0.15
+SECONDS_PER_DOCUMENT = 0.0004
+FAILURE_PROBABILITY = 0.01
+CONCURRENCY_LEVELS = [1, 2, 4, 8]
+
+
+class SimulatedCrash(Exception):
+    """Stands in for the process dying mid-upload."""
+
+
+class IndexingResult:
+    def __init__(self, key, succeeded, status_code):
+        self.key = key
+        self.succeeded = succeeded
+        self.status_code = status_code
+
+
+class SimulatedSearchClient:
+    """Stands in for the async SearchClient, keeping the uploaded keys."""
+
+    def __init__(self, fail_after=None):
+        self.keys = set()
+        self.requests = 0
+        self._fail_after = fail_after
+        self._rng = random.Random(9)
+
+    async def upload_documents(self, documents):
+        self.requests += 1
+        if self._fail_after is not None and self.requests > self._fail_after:
+            raise SimulatedCrash("simulated crash")
+        await asyncio.sleep(REQUEST_SECONDS + SECONDS_PER_DOCUMENT * len(documents))
+        results = []
+        for document in documents:
+            succeeded = self._rng.random() >= FAILURE_PROBABILITY
+            if succeeded:
+                self.keys.add(document['embedId'])
+            results.append(IndexingResult(document['embedId'], succeeded, 200 if succeeded else 503))
+        return results
+
+    async def delete_documents(self, documents):
+        return [IndexingResult(document['embedId'], True, 200) for document in documents]
+
+    async def close(self):
+        pass
+
+
+def manager_for(client):
+    manager = SearchIndexManager(endpoint=None, credentials=None, model='text-embedding-3-small', api_key=None,
+                                 index_name='bench', dimension=None, embeddings_client=None)
+    manager._index = 'bench'
+    manager._client = client
+    return manager
+
+
+async def main():
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dimensions = int(sys.argv[2]) if len(sys.argv) > 2 else 1536
+    SearchIndexManager.UPLOAD_MAX_RETRIES = 3
+    SearchIndexManager.EMBEDDING_BACKOFF_SECONDS = 0.05
+
+    with tempfile.TemporaryDirectory() as directory:
+        embeddings_file = os.path.join(directory, 'embeddings.npy')
+        rng = np.random.default_rng(1)
+        with EmbeddingsWriter(embeddings_file) as writer:
+            for i in range(chunks):
+                writer.write(f"chunk-{i}", f"Chunk {i} about budgeting.", rng.standard_normal(dimensions).astype(np.float32))
+        print(f"📤 {chunks} documents x {dimensions} dims, batches of {SearchIndexManager.UPLOAD_BATCH_SIZE}, "
+              f"simulated {REQUEST_SECONDS * 1000:.0f}ms per request, {FAILURE_PROBABILITY:.0%} documents failing once")
+
+        for concurrency in CONCURRENCY_LEVELS:
+            client = SimulatedSearchClient()
+            start = time.perf_counter()
+            stats = await manager_for(client).upload_documents(embeddings_file, max_concurrency=concurrency)
+            print(f"concurrency {concurrency:<3} {stats['docs_per_second']:8.0f} docs/s  {client.requests} requests  "
+                  f"{len(client.keys)} in index  {stats['failed']} failed  {time.perf_counter() - start:.1f}s")
+
+        # An upload that crashes partway, then resumes from its checkpoint
+        write_manifest(embeddings_file, {'version': 1, 'files': {}, 'pending_upload': [f"chunk-{i}" for i in range(chunks)],
+                                         'pending_delete': []})
+        crashing = SimulatedSearchClient(fail_after=chunks // SearchIndexManager.UPLOAD_BATCH_SIZE // 2)
+        try:
+            await manager_for(crashing).upload_documents(embeddings_file, max_concurrency=4)
+        except SimulatedCrash:
+            print(f"💥 interrupted after {len(crashing.keys)} documents")
+        resumed = SimulatedSearchClient()
+        stats = await manager_for(resumed).upload_documents(embeddings_file, max_concurrency=4)
+        print(f"resumed: skipped {stats['resumed']}, uploaded {stats['uploaded']} in {resumed.requests} requests")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
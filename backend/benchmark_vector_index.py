@@ -0,0 +1,90 @@
+"""
+Benchmark LocalVectorIndex: latency of exact and ivf search, and ivf recall against brute force.
+
+Generates clustered synthetic embeddings (documents about a topic sit near each other, as real
+chunk embeddings do), writes them as a sidecar so no CSV round-trip is needed, and queries with
+perturbed copies of random rows.
+
+Usage: python benchmark_vector_index.py [rows] [dimensions] [queries]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from vector_index import EXACT_MODE, IVF_MODE, LocalVectorIndex, write_sidecar
+
+TOP_K = 5
+TOPICS = 200
+NPROBES = [1, 4, 8, 16, 32]
+
+
+def synthetic_embeddings(rows, dimensions, rng):
+    """Random unit vectors grouped around TOPICS topic centres."""
+    centres = rng.standard_normal((TOPICS, dimensions), dtype=np.float32)
+    topics = rng.integers(0, TOPICS, size=rows)
+    matrix = centres[topics] + 1.5 * rng.standard_normal((rows, dimensions), dtype=np.float32)
+    return matrix
+
+
+def brute_force(matrix, queries):
+    """Reference top-k by scoring every row in pure NumPy, one query at a time."""
+    matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.vstack([np.argsort(-(matrix @ query))[:TOP_K] for query in queries])
+
+
+def recall(found, expected):
+    hits = sum(len(set(row) & set(truth)) for row, truth in zip(found, expected))
+    return hits / expected.size
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    dimensions = int(sys.argv[2]) if len(sys.argv) > 2 else 1536
+    total_queries = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+
+    rng = np.random.default_rng(7)
+    matrix = synthetic_embeddings(rows, dimensions, rng)
+    queries = matrix[rng.integers(0, rows, size=total_queries)] + 1.0 * rng.standard_normal(
+        (total_queries, dimensions), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    print(f"📐 {rows} vectors x {dimensions} dims ({matrix.nbytes / 2**20:.0f} MiB float32), "
+          f"{total_queries} queries, top {TOP_K}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        embeddings_file = os.path.join(directory, 'embeddings.csv')
+        write_sidecar(embeddings_file, [str(i) for i in range(rows)], matrix)
+        # the sidecar is newer than the (absent) CSV, so load maps it directly
+        open(embeddings_file, 'w').close()
+        os.utime(embeddings_file, (0, 0))
+
+        expected, elapsed = timed(brute_force, matrix, queries)
+        print(f"{'brute force':<22} recall 1.000  {elapsed / total_queries * 1000:7.2f} ms/query")
+
+        exact = LocalVectorIndex(embeddings_file, mode=EXACT_MODE)
+        _, elapsed = timed(exact.load_sync)
+        print(f"{'exact load':<22} {elapsed * 1000:.0f} ms (memory-mapped)")
+        found, elapsed = timed(lambda: np.vstack([exact.search_ids(query, TOP_K) for query in queries]))
+        print(f"{'exact, one by one':<22} recall {recall(found, expected):.3f}  {elapsed / total_queries * 1000:7.2f} ms/query")
+        found, elapsed = timed(exact.search_ids, queries, TOP_K)
+        print(f"{'exact, batched':<22} recall {recall(found, expected):.3f}  {elapsed / total_queries * 1000:7.2f} ms/query")
+
+        ivf = LocalVectorIndex(embeddings_file, mode=IVF_MODE)
+        _, elapsed = timed(ivf.load_sync)
+        print(f"{'ivf build':<22} {elapsed * 1000:.0f} ms ({ivf._centroids.shape[0]} clusters)")
+        for nprobe in NPROBES:
+            ivf._nprobe = nprobe
+            found, elapsed = timed(ivf.search_ids, queries, TOP_K)
+            print(f"{'ivf nprobe=' + str(nprobe):<22} recall {recall(found, expected):.3f}  {elapsed / total_queries * 1000:7.2f} ms/query")
+
+
+if __name__ == '__main__':
+    main()
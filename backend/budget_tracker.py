@@ -0,0 +1,212 @@
+import calendar
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import bindparam, func, select, update
+
+from config import db
+from models import Budget, BudgetEvent, DailyUserTotal
+import daily_rollup
+
+# How far a budget has got, in increasing severity
+LEVELS = ('ok', 'warning', 'over')
+PERIODS = ('weekly', 'monthly', 'yearly')
+
+
+def budget_level(spent, amount, alert_threshold):
+    """
+    Classify spending against a budget.
+
+    :param spent: The amount spent so far.
+    :param amount: The budget amount.
+    :param alert_threshold: The percentage of the budget that raises a warning, 80 when unset.
+    :return: 'ok', 'warning' once spending reaches the alert threshold, or 'over' past the budget.
+    """
+    percent_used = float(spent) / float(amount) * 100 if amount else 0
+    if percent_used >= 100:
+        return 'over'
+    if percent_used >= float(alert_threshold if alert_threshold is not None else 80):
+        return 'warning'
+    return 'ok'
+
+
+def _add_months(day, months):
+    """Move a datetime by whole months, clamping to the last day of shorter months."""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def period_end(period, start_date):
+    """
+    Get the end of a budget window that starts on start_date.
+
+    :param period: 'weekly', 'monthly' or 'yearly'.
+    :param start_date: The midnight the window starts at.
+    :return: The last second of the window's last day.
+    """
+    if period == 'weekly':
+        next_start = start_date + timedelta(days=7)
+    elif period == 'monthly':
+        next_start = _add_months(start_date, 1)
+    elif period == 'yearly':
+        next_start = _add_months(start_date, 12)
+    else:
+        raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+    return next_start - timedelta(seconds=1)
+
+
+def _window(budget):
+    """The first and last calendar day a budget counts transactions on."""
+    return budget.start_date.date(), budget.end_date.date()
+
+
+def apply_deltas(deltas):
+    """
+    Add expense deltas to the spend of every budget they fall in, then check the thresholds.
+
+    Takes the same (user, day, category, type) deltas as the daily rollup, so a bulk
+    import updates each affected budget with one statement per batch instead of
+    rescanning its transactions. Runs inside the current session transaction.
+
+    :param deltas: A dict of rollup key to a [amount, count] pair.
+    """
+    expenses = {}
+    for (user_id, day, category_id, transaction_type), (amount, count) in deltas.items():
+        if transaction_type == 'expense' and amount:
+            key = (user_id, category_id, day)
+            expenses[key] = expenses.get(key, Decimal(0)) + Decimal(str(amount))
+    if not expenses:
+        return
+
+    earliest = min(day for _, _, day in expenses)
+    budgets = db.session.execute(
+        select(Budget.id, Budget.user_id, Budget.category_id, Budget.start_date, Budget.end_date).where(
+            Budget.user_id.in_({user_id for user_id, _, _ in expenses}),
+            Budget.category_id.in_({category_id for _, category_id, _ in expenses}),
+            Budget.end_date >= datetime.combine(earliest, time.min)
+        )
+    ).all()
+
+    spend = {}
+    for budget in budgets:
+        first_day, last_day = _window(budget)
+        for (user_id, category_id, day), amount in expenses.items():
+            if user_id == budget.user_id and category_id == budget.category_id and first_day <= day <= last_day:
+                spend[budget.id] = spend.get(budget.id, Decimal(0)) + amount
+    if not spend:
+        return
+
+    # Adding in SQL keeps concurrent writers to the same budget from losing updates
+    budgets_table = Budget.__table__
+    db.session.execute(
+        update(budgets_table)
+        .where(budgets_table.c.id == bindparam('budget_id'))
+        .values(spent=budgets_table.c.spent + bindparam('delta')),
+        [{'budget_id': budget_id, 'delta': delta} for budget_id, delta in spend.items()]
+    )
+    check_thresholds(spend.keys())
+
+
+def check_thresholds(budget_ids):
+    """
+    Record a BudgetEvent for every budget whose spending crossed into a more severe level.
+
+    A budget that drops back below a level (a deleted or reduced expense) is reset
+    without an event, so crossing it again is reported again.
+
+    :param budget_ids: The budgets whose spend or amount changed.
+    :return: The new events, added to the current session.
+    """
+    rows = db.session.execute(
+        select(Budget.id, Budget.user_id, Budget.amount, Budget.spent, Budget.alert_threshold, Budget.alert_level)
+        .where(Budget.id.in_(list(budget_ids)))
+    ).all()
+
+    events = []
+    for row in rows:
+        level = budget_level(row.spent, row.amount, row.alert_threshold)
+        if level == row.alert_level:
+            continue
+        db.session.execute(update(Budget.__table__).where(Budget.__table__.c.id == row.id).values(alert_level=level))
+        if LEVELS.index(level) > LEVELS.index(row.alert_level):
+            percent_used = Decimal(str(row.spent)) / Decimal(str(row.amount)) * 100 if row.amount else Decimal(0)
+            event = BudgetEvent(budget_id=row.id, user_id=row.user_id, level=level, spent=row.spent,
+                                amount=row.amount, percent_used=round(percent_used, 2))
+            db.session.add(event)
+            events.append(event)
+            print(f"🔔 Budget {row.id} of user {row.user_id} is {level}: {percent_used:.0f}% used")
+    return events
+
+
+def add_transaction(transaction):
+    """Count a newly written transaction in its budgets."""
+    apply_deltas({daily_rollup.rollup_key(transaction): [transaction.amount, 1]})
+
+
+def remove_transaction(transaction):
+    """Remove a deleted transaction from its budgets."""
+    apply_deltas({daily_rollup.rollup_key(transaction): [-Decimal(str(transaction.amount)), -1]})
+
+
+def move_transaction(old_key, old_amount, transaction):
+    """
+    Move a transaction from its previous budgets and amount to its current ones.
+
+    :param old_key: The daily_rollup.rollup_key of the transaction before it was changed.
+    :param old_amount: The amount of the transaction before it was changed.
+    :param transaction: The transaction with its new values.
+    """
+    new_key = daily_rollup.rollup_key(transaction)
+    deltas = {old_key: [-Decimal(str(old_amount)), -1]}
+    new_delta = deltas.setdefault(new_key, [Decimal(0), 0])
+    new_delta[0] += Decimal(str(transaction.amount))
+    new_delta[1] += 1
+    apply_deltas(deltas)
+
+
+def spend_in_window(user_id, category_id, start_date, end_date):
+    """
+    Sum a category's expenses over a budget window from the daily rollup.
+
+    :return: The amount spent.
+    """
+    return db.session.execute(
+        select(func.coalesce(func.sum(DailyUserTotal.total), 0)).where(
+            DailyUserTotal.user_id == user_id,
+            DailyUserTotal.category_id == category_id,
+            DailyUserTotal.transaction_type == 'expense',
+            DailyUserTotal.date >= start_date.date(),
+            DailyUserTotal.date <= end_date.date()
+        )
+    ).scalar()
+
+
+def recompute_budget(budget):
+    """
+    Set a budget's spend from the daily rollup, for a new budget or a changed window or category.
+
+    :param budget: The budget, already flushed to the session.
+    :return: Any threshold events the new spend raised.
+    """
+    budget.spent = spend_in_window(budget.user_id, budget.category_id, budget.start_date, budget.end_date)
+    db.session.flush()
+    return check_thresholds([budget.id])
+
+
+def rebuild_budget_spend(user_id=None):
+    """
+    Recompute the spend of every budget from the daily rollup, without raising events.
+
+    :param user_id: Only rebuild this user's budgets, or every user's when None.
+    :return: The number of budgets updated.
+    """
+    query = Budget.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    budgets = query.all()
+    for budget in budgets:
+        budget.spent = spend_in_window(budget.user_id, budget.category_id, budget.start_date, budget.end_date)
+        budget.alert_level = budget_level(budget.spent, budget.amount, budget.alert_threshold)
+    db.session.commit()
+    return len(budgets)
@@ -0,0 +1,235 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import insert
+
+from config import db
+from models import Category, Transaction
+import daily_rollup
+import budget_tracker
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+TRANSACTION_TYPES = ('income', 'expense')
+COPY_COLUMNS = ('user_id', 'category_id', 'description', 'amount', 'transaction_type', 'transaction_date')
+
+
+class RowError(ValueError):
+    """Raised when an uploaded row cannot be turned into a transaction."""
+
+
+def iter_csv_rows(stream):
+    """
+    Yield dicts from a CSV upload one line at a time.
+
+    :param stream: A binary stream positioned at the header row.
+    """
+    lines = (line.decode('utf-8-sig') for line in stream)
+    yield from csv.DictReader(lines)
+
+
+def iter_jsonl_rows(stream):
+    """
+    Yield dicts from a JSON-lines upload one line at a time.
+
+    Lines that are not valid JSON objects are yielded as RowError so the caller can
+    report them against the right line number.
+
+    :param stream: A binary stream with one JSON object per line.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield RowError(f'Invalid JSON: {e}')
+            continue
+        yield row if isinstance(row, dict) else RowError('Each line must be a JSON object')
+
+
+def load_category_lookup(user_id):
+    """
+    Load all of the user's categories once for validating every uploaded row.
+
+    :param user_id: The user the transactions are imported for.
+    :return: A dict mapping both category ids and lower-cased names to categories.
+    """
+    lookup = {}
+    for category in Category.query.filter_by(user_id=user_id).all():
+        lookup[category.id] = category
+        lookup[category.name.lower()] = category
+    return lookup
+
+
+def _parse_date(value):
+    """Accept YYYY-MM-DD as used by /create_transaction, or a full ISO timestamp."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+def validate_row(row, user_id, categories):
+    """
+    Turn one uploaded row into the column values of a transaction.
+
+    :param row: The parsed row with amount, transaction_type, transaction_date,
+                description and either category_id or category (the name).
+    :param user_id: The user the transaction belongs to.
+    :param categories: The lookup built by load_category_lookup.
+    :return: A dict of transaction column values.
+    :raises: RowError if the row is incomplete or references an unknown category.
+    """
+    transaction_type = str(row.get('transaction_type') or '').strip().lower()
+    if transaction_type not in TRANSACTION_TYPES:
+        raise RowError('transaction_type must be "income" or "expense"')
+
+    try:
+        amount = Decimal(str(row.get('amount')).strip())
+    except InvalidOperation:
+        raise RowError(f'Invalid amount: {row.get("amount")!r}')
+    if not amount.is_finite() or amount <= 0:
+        raise RowError('amount must be a positive number')
+
+    transaction_date = row.get('transaction_date')
+    if not transaction_date:
+        raise RowError('Missing required field: transaction_date')
+    try:
+        parsed_date = _parse_date(str(transaction_date).strip())
+    except ValueError:
+        raise RowError(f'Invalid transaction_date: {transaction_date!r}')
+
+    category = None
+    category_id = row.get('category_id')
+    if category_id not in (None, ''):
+        try:
+            category = categories.get(int(category_id))
+        except (TypeError, ValueError):
+            raise RowError(f'Invalid category_id: {category_id!r}')
+    elif row.get('category'):
+        category = categories.get(str(row['category']).strip().lower())
+    if category is None:
+        raise RowError(f'Unknown category: {category_id or row.get("category")!r}')
+
+    return {
+        'user_id': user_id,
+        'category_id': category.id,
+        'description': str(row.get('description') or 'No description')[:200],
+        'amount': amount.quantize(Decimal('0.01')),
+        'transaction_type': transaction_type,
+        'transaction_date': parsed_date,
+    }
+
+
+def _copy_rows(rows):
+    """Insert a batch with PostgreSQL COPY on the session's own connection and transaction."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in COPY_COLUMNS])
+    buffer.seek(0)
+
+    dbapi_connection = db.session.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY transactions ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+
+def insert_batch(rows):
+    """
+    Insert a batch of validated rows and count them in the daily rollup and budgets, then commit.
+
+    :param rows: Dicts as returned by validate_row.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        _copy_rows(rows)
+    else:
+        db.session.execute(insert(Transaction), rows)
+
+    deltas = {}
+    for row in rows:
+        key = (row['user_id'], row['transaction_date'].date(), row['category_id'], row['transaction_type'])
+        delta = deltas.setdefault(key, [Decimal(0), 0])
+        delta[0] += row['amount']
+        delta[1] += 1
+    daily_rollup.apply_deltas(deltas)
+    budget_tracker.apply_deltas(deltas)
+    db.session.commit()
+
+
+def import_transactions(rows, user_id, batch_size=BATCH_SIZE):
+    """
+    Validate and insert uploaded rows in batches.
+
+    Invalid rows are reported and skipped without affecting the rest of the upload.
+    Each batch is committed on its own, so a database error only loses that batch.
+
+    :param rows: An iterable of parsed rows (or RowError for unparseable lines).
+    :param user_id: The user the transactions are imported for.
+    :param batch_size: The number of rows sent to the database at a time.
+    :return: A summary with imported and failed counts, per-row errors and throughput.
+    """
+    started = time.perf_counter()
+    categories = load_category_lookup(user_id)
+    imported = 0
+    failed = 0
+    errors = []
+    batch = []
+    batch_start_row = 1
+
+    def report(row_number, message):
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'row': row_number, 'error': message})
+
+    def flush():
+        nonlocal imported, failed
+        try:
+            insert_batch(batch)
+            imported += len(batch)
+        except Exception as e:
+            db.session.rollback()
+            failed += len(batch)
+            report(batch_start_row, f'Batch of {len(batch)} rows failed: {e}')
+        batch.clear()
+
+    row_number = 0
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            if isinstance(row, RowError):
+                raise row
+            if not batch:
+                batch_start_row = row_number
+            batch.append(validate_row(row, user_id, categories))
+        except RowError as e:
+            failed += 1
+            report(row_number, str(e))
+            continue
+        except Exception as e:
+            # Any other value a row can hold must not abort the upload after earlier batches committed
+            failed += 1
+            report(row_number, f'Invalid row: {e}')
+            continue
+
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows_received': row_number,
+        'imported': imported,
+        'failed': failed,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(imported / elapsed, 1) if elapsed > 0 else imported,
+    }
@@ -1,5 +1,6 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from flask_cors import CORS
 #cors = cross origin resource sharing. Allowing frontend and backend to communicate.
 import os
@@ -27,4 +28,7 @@ print(f"DATABASE_URL from env: {os.getenv('DATABASE_URL')}")
 print(f"Using database URL: {database_url}")
 
 # create SQLAlchemy db instance
-db = SQLAlchemy(app)
\ No newline at end of file
+db = SQLAlchemy(app)
+
+# schema changes are managed by Alembic migrations in backend/migrations (flask db upgrade)
+migrate = Migrate(app, db, directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
\ No newline at end of file
@@ -0,0 +1,158 @@
+from decimal import Decimal
+
+from sqlalchemy import func, insert, select
+
+from config import db
+from models import DailyUserTotal, Transaction
+
+
+def _upsert_statement():
+    """
+    Build an INSERT that adds to the existing totals when the rollup row already exists.
+
+    Both PostgreSQL and SQLite support ON CONFLICT, which keeps concurrent writers to the
+    same (user, day, category, type) row from racing each other. The rollup key plus the
+    total and count deltas are passed as parameters when executing it.
+
+    :return: The upsert statement.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    statement = dialect_insert(DailyUserTotal)
+    return statement.on_conflict_do_update(
+        index_elements=['user_id', 'date', 'category_id', 'transaction_type'],
+        set_={
+            'total': DailyUserTotal.total + statement.excluded.total,
+            'count': DailyUserTotal.count + statement.excluded.count,
+        }
+    )
+
+
+def apply_delta(user_id, day, category_id, transaction_type, amount, count):
+    """
+    Add amount and count to one rollup row inside the current session transaction.
+
+    Rows whose count drops to zero are removed so the rollup only holds days with activity.
+
+    :param user_id: The owner of the transactions.
+    :param day: The calendar date the transactions fall on.
+    :param category_id: The category of the transactions.
+    :param transaction_type: 'income' or 'expense'.
+    :param amount: The amount to add, negative to subtract.
+    :param count: The number of transactions to add, negative to subtract.
+    """
+    db.session.execute(_upsert_statement(), {
+        'user_id': user_id,
+        'date': day,
+        'category_id': category_id,
+        'transaction_type': transaction_type,
+        'total': Decimal(str(amount)),
+        'count': count,
+    })
+    if count < 0:
+        db.session.execute(
+            DailyUserTotal.__table__.delete().where(
+                DailyUserTotal.user_id == user_id,
+                DailyUserTotal.date == day,
+                DailyUserTotal.category_id == category_id,
+                DailyUserTotal.transaction_type == transaction_type,
+                DailyUserTotal.count <= 0
+            )
+        )
+
+
+def apply_deltas(deltas):
+    """
+    Add many (user, day, category, type) deltas to the rollup in one statement.
+
+    :param deltas: A dict of rollup key to a [amount, count] pair, all counts positive.
+    """
+    if not deltas:
+        return
+    rows = [
+        {
+            'user_id': user_id,
+            'date': day,
+            'category_id': category_id,
+            'transaction_type': transaction_type,
+            'total': amount,
+            'count': count,
+        }
+        for (user_id, day, category_id, transaction_type), (amount, count) in deltas.items()
+    ]
+    db.session.execute(_upsert_statement(), rows)
+
+
+def rollup_key(transaction):
+    """
+    Get the rollup row a transaction is counted in.
+
+    :param transaction: The transaction.
+    :return: A (user_id, date, category_id, transaction_type) tuple.
+    """
+    return (
+        transaction.user_id,
+        transaction.transaction_date.date(),
+        transaction.category_id,
+        transaction.transaction_type,
+    )
+
+
+def add_transaction(transaction):
+    """Count a newly written transaction in the rollup."""
+    apply_delta(*rollup_key(transaction), transaction.amount, 1)
+
+
+def remove_transaction(transaction):
+    """Remove a deleted transaction from the rollup."""
+    apply_delta(*rollup_key(transaction), -Decimal(str(transaction.amount)), -1)
+
+
+def move_transaction(old_key, old_amount, transaction):
+    """
+    Move a transaction from its previous rollup row and amount to its current ones.
+
+    :param old_key: The rollup_key of the transaction before it was changed.
+    :param old_amount: The amount of the transaction before it was changed.
+    :param transaction: The transaction with its new values.
+    """
+    apply_delta(*old_key, -Decimal(str(old_amount)), -1)
+    add_transaction(transaction)
+
+
+def rebuild_daily_totals(user_id=None):
+    """
+    Recompute the rollup from the transactions table.
+
+    :param user_id: Only rebuild this user's rows, or every user when None.
+    :return: The number of rollup rows written.
+    """
+    day = func.date(Transaction.transaction_date)
+    aggregate = select(
+        Transaction.user_id,
+        day,
+        Transaction.category_id,
+        Transaction.transaction_type,
+        func.sum(Transaction.amount),
+        func.count(Transaction.id)
+    ).group_by(
+        Transaction.user_id, day, Transaction.category_id, Transaction.transaction_type
+    )
+
+    delete = DailyUserTotal.__table__.delete()
+    if user_id is not None:
+        aggregate = aggregate.where(Transaction.user_id == user_id)
+        delete = delete.where(DailyUserTotal.user_id == user_id)
+
+    db.session.execute(delete)
+    result = db.session.execute(
+        insert(DailyUserTotal).from_select(
+            ['user_id', 'date', 'category_id', 'transaction_type', 'total', 'count'],
+            aggregate
+        )
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,116 @@
+"""
+Offline recall@k evaluation of the vector, keyword and hybrid search modes.
+
+Searches an embeddings file in process (LocalVectorIndex and BM25Index), so no Azure AI Search
+index is needed; question embeddings come from the Azure OpenAI embeddings deployment and are
+cached in EMBEDDING_CACHE_PATH, so repeated runs cost nothing.
+
+The evaluation set is a JSON lines file with one question per line:
+  {"question": "What is the ISA allowance?", "relevant": ["20,000", "ISA allowance"]}
+"relevant" lists phrases of the chunks that answer the question; a phrase is found when a
+retrieved chunk contains it (case-insensitive). recall@k is the share of phrases found in the
+top k chunks, averaged over questions, and MRR the mean reciprocal rank of the first hit.
+
+Usage: python evaluate_retrieval.py <embeddings file> <eval set.jsonl> [k ...]
+"""
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+from openai import AsyncAzureOpenAI
+
+from embedding_cache import EmbeddingCache
+from keyword_index import BM25Index
+from search_index_manager import HYBRID_MODE, KEYWORD_MODE, SEARCH_MODES, VECTOR_MODE, SearchIndexManager
+from vector_index import LocalVectorIndex
+
+DEFAULT_KS = [1, 3, 5, 10]
+
+
+def load_eval_set(path):
+    with open(path) as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+def score(chunks, relevant, k):
+    """Get the recall of the relevant phrases in the top k chunks and the reciprocal rank of the first hit."""
+    top = [chunk.lower() for chunk in chunks[:k]]
+    phrases = [phrase.lower() for phrase in relevant]
+    found = sum(1 for phrase in phrases if any(phrase in chunk for chunk in top))
+    first_hit = next((rank for rank, chunk in enumerate(top, start=1) if any(phrase in chunk for phrase in phrases)), None)
+    return found / len(phrases) if phrases else 0.0, 1 / first_hit if first_hit else 0.0
+
+
+async def evaluate(manager, items, ks=DEFAULT_KS, modes=SEARCH_MODES):
+    """
+    Compute recall@k for every mode and k, and MRR at the largest k.
+
+    :param manager: The SearchIndexManager to query, with a keyword index for the keyword and hybrid modes.
+    :param items: The evaluation questions.
+    :param ks: The cut-offs to report.
+    :param modes: The search modes to compare.
+    :return: A dict of mode to {'recall@k': ..., 'mrr': ...}.
+    """
+    results = {}
+    max_k = max(ks)
+    for mode in modes:
+        recalls = {k: 0.0 for k in ks}
+        mrr = 0.0
+        for item in items:
+            chunks = await manager.retrieve(item['question'], mode=mode, k=max_k)
+            for k in ks:
+                recalls[k] += score(chunks, item['relevant'], k)[0]
+            mrr += score(chunks, item['relevant'], max_k)[1]
+        results[mode] = {f"recall@{k}": round(recalls[k] / len(items), 3) for k in ks}
+        results[mode]['mrr'] = round(mrr / len(items), 3)
+    return results
+
+
+def print_results(results, ks):
+    print(f"{'mode':<10}" + ''.join(f"{'recall@' + str(k):>12}" for k in ks) + f"{'mrr':>8}")
+    for mode, metrics in results.items():
+        print(f"{mode:<10}" + ''.join(f"{metrics['recall@' + str(k)]:>12.3f}" for k in ks) + f"{metrics['mrr']:>8.3f}")
+
+
+async def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    embeddings_file, eval_file = sys.argv[1], sys.argv[2]
+    ks = [int(k) for k in sys.argv[3:]] or DEFAULT_KS
+
+    load_dotenv()
+    embeddings_client = AsyncAzureOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_AI_API_KEY"),
+        api_version="2024-02-01"
+    )
+    manager = SearchIndexManager(
+        endpoint=None,
+        credentials=None,
+        model=os.getenv("AZURE_SEARCH_MODEL"),
+        api_key=None,
+        index_name=None,
+        dimension=None,
+        embeddings_client=embeddings_client,
+        embedding_cache=EmbeddingCache(path=os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")),
+        vector_index=LocalVectorIndex(embeddings_file),
+        keyword_index=BM25Index(embeddings_file),
+        search_mode=HYBRID_MODE,
+        vector_weight=float(os.getenv("SEARCH_VECTOR_WEIGHT", "1.0")),
+        keyword_weight=float(os.getenv("SEARCH_KEYWORD_WEIGHT", "1.0")),
+    )
+    try:
+        await manager.ensure_index_created()
+        items = load_eval_set(eval_file)
+        print(f"🔎 {len(items)} questions over {embeddings_file}")
+        print_results(await evaluate(manager, items, ks, (VECTOR_MODE, KEYWORD_MODE, HYBRID_MODE)), ks)
+    finally:
+        await manager.close()
+        await embeddings_client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+import asyncio
+from typing import Callable, Optional
+
+from config import app
+from analytics_engine import compute_analytics, compute_budget_status, compute_category_stats, compute_goal_progress
+from result_cache import result_cache
+from agent_runner import current_user_id
+
+NO_USER = "No user is signed in, so their personal finances are not available."
+
+
+def _money(amount):
+    return f"£{amount:,.2f}" if amount >= 0 else f"-£{-amount:,.2f}"
+
+
+def spending_table(user_id, period_days: int, category: Optional[str] = None) -> str:
+    """
+    Summarize the user's spending per category as a compact markdown table.
+
+    Reads the same cached aggregates as /analytics and /categories/stats, so no
+    transaction rows are scanned or returned.
+
+    :param user_id: The user whose spending is summarized.
+    :param period_days: The number of days to look back from today.
+    :param category: Optional category name to report on its own.
+    :return: The table, preceded by the period's totals.
+    """
+    period = str(int(period_days))
+    summary = result_cache.get_or_compute(
+        'analytics', user_id, period, lambda: compute_analytics(user_id, period))['summary']
+    stats = result_cache.get_or_compute(
+        'categories_stats', user_id, period, lambda: compute_category_stats(user_id, period))
+    categories = [stat for stat in stats['categories'] if stat['type'] == 'expense']
+    if category:
+        named = [stat for stat in categories if stat['name'].lower() == category.strip().lower()]
+        if not named:
+            names = ", ".join(stat['name'] for stat in categories) or "none"
+            return f"No expense category named '{category}'. The user's expense categories: {names}."
+        categories = named
+    else:
+        categories = [stat for stat in categories if stat['transaction_count']]
+
+    lines = [f"Last {period} days: spent {_money(summary['total_expenses'])}, "
+             f"income {_money(summary['total_income'])}, {summary['transaction_count']} transactions.",
+             "| Category | Spent | Transactions | Average |",
+             "|---|---|---|---|"]
+    for stat in sorted(categories, key=lambda stat: stat['total_spent'], reverse=True):
+        lines.append(f"| {stat['name']} | {_money(stat['total_spent'])} | {stat['transaction_count']} | "
+                     f"{_money(stat['avg_transaction'])} |")
+    if len(lines) == 3:
+        return lines[0] + " No expenses in this period."
+    return "\n".join(lines)
+
+
+def budget_table(user_id) -> str:
+    """
+    Summarize the user's active budgets as a compact markdown table.
+
+    :param user_id: The user whose budgets are summarized.
+    :return: The table, or a note that the user has no active budgets.
+    """
+    budgets = compute_budget_status(user_id)['budgets']
+    if not budgets:
+        return "The user has no active budgets."
+    lines = ["| Category | Period | Budget | Spent | Remaining | Used | Status |",
+             "|---|---|---|---|---|---|---|"]
+    for budget in budgets:
+        lines.append(f"| {budget['category']} | {budget['period']} {budget['start_date']} to {budget['end_date']} | "
+                     f"{_money(budget['amount'])} | {_money(budget['spent'])} | {_money(budget['remaining'])} | "
+                     f"{budget['percent_used']:g}% | {budget['status']} |")
+    return "\n".join(lines)
+
+
+def goal_table(user_id) -> str:
+    """
+    Summarize the user's savings goals as a compact markdown table.
+
+    :param user_id: The user whose goals are summarized.
+    :return: The table, or a note that the user has no goals.
+    """
+    goals = compute_goal_progress(user_id)['goals']
+    if not goals:
+        return "The user has no savings goals."
+    lines = ["| Goal | Status | Saved | Target | Complete | Deadline | Needed per month | Projected completion |",
+             "|---|---|---|---|---|---|---|---|"]
+    for goal in goals:
+        lines.append(f"| {goal['name']} | {goal['status']} | {_money(goal['current_amount'])} | "
+                     f"{_money(goal['target_amount'])} | {goal['percent_complete']:g}% | {goal['deadline']} | "
+                     f"{_money(goal['required_monthly'])} | {goal['projected_completion'] or ('too far off to project' if goal['current_amount'] > 0 else 'no savings yet')} |")
+    return "\n".join(lines)
+
+
+async def for_current_user(build: Callable, *args) -> str:
+    """
+    Build a table for the user the agent is answering.
+
+    The query runs in a worker thread with an application context, so the agent's
+    event loop is not blocked by the database.
+
+    :param build: One of the table functions, called with the user id and args.
+    :return: The table, or a note that no user is signed in.
+    """
+    user_id = current_user_id.get()
+    if user_id is None:
+        return NO_USER
+
+    def run():
+        with app.app_context():
+            return build(user_id, *args)
+
+    return await asyncio.to_thread(run)
@@ -0,0 +1,28 @@
+# Fixed advice shared by the agent's get_financial_advice tool and the intent router's canned answers
+ADVICE = {
+    'budget': "For budgeting: 1) Track all income and expenses, 2) Use the 50/30/20 rule (50% needs, 30% wants, 20% savings), 3) Review monthly and adjust as needed.",
+    'saving': "Saving strategies: 1) Start with an emergency fund (3-6 months expenses), 2) Automate savings transfers, 3) Use high-yield savings accounts, 4) Set specific savings goals.",
+    'debt': "Debt management: 1) List all debts with balances and rates, 2) Consider debt avalanche (highest interest first) or snowball (smallest balance first), 3) Avoid new debt while paying off existing ones.",
+    'investment': "Investment basics: 1) Start with emergency fund first, 2) Consider low-cost index funds, 3) Diversify your portfolio, 4) Think long-term. Always consult a financial advisor for personalized advice.",
+}
+
+
+def financial_advice(topic: str) -> str:
+    """
+    Get general financial advice on a topic.
+
+    :param topic: The financial topic, e.g. budgeting, saving, debt or investment.
+    :return: The advice.
+    """
+    topic = topic.lower()
+
+    if 'budget' in topic:
+        return ADVICE['budget']
+    elif 'saving' in topic or 'save' in topic:
+        return ADVICE['saving']
+    elif 'debt' in topic:
+        return ADVICE['debt']
+    elif 'investment' in topic:
+        return ADVICE['investment']
+    else:
+        return f"For {topic}, consider consulting financial resources or speaking with a financial advisor for personalized guidance."
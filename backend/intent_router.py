@@ -0,0 +1,335 @@
+import os
+import re
+import threading
+from collections import deque, namedtuple
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from analytics_engine import compute_analytics, compute_category_stats
+from financial_advice import ADVICE
+from result_cache import result_cache
+
+load_dotenv() # Load environment variables from .env file
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+INTENT_CENTROID_THRESHOLD = float(os.getenv("INTENT_CENTROID_THRESHOLD", "0.88"))
+INTENT_CENTROID_MARGIN = float(os.getenv("INTENT_CENTROID_MARGIN", "0.03"))
+
+ROUTE_CANNED = "canned"
+ROUTE_DATA = "data"
+ROUTE_AGENT = "agent"
+LATENCY_SAMPLES = 1000
+
+HELP_TEXT = "I can help with budgeting, saving, expenses, and basic financial advice. What would you like to know?"
+
+# name: the intent; route: ROUTE_CANNED or ROUTE_DATA; patterns: regexes that match it outright;
+# examples: phrasings for the embedding classifier; max_words: longer messages are never
+# classified by embedding, since they are rarely the plain question; answer: (message, user_id, match) -> str or None
+Intent = namedtuple('Intent', ['name', 'route', 'patterns', 'examples', 'max_words', 'answer'])
+RoutedAnswer = namedtuple('RoutedAnswer', ['intent', 'route', 'text', 'method'])
+
+PERIOD_PATTERNS = [
+    (re.compile(r"\b(last|past)\s+(\d+)\s+days?\b"), lambda m: int(m.group(2))),
+    (re.compile(r"\b(last|past)\s+(\d+)\s+weeks?\b"), lambda m: int(m.group(2)) * 7),
+    (re.compile(r"\b(last|past)\s+(\d+)\s+months?\b"), lambda m: int(m.group(2)) * 30),
+    (re.compile(r"\btoday\b"), lambda m: 0),
+    (re.compile(r"\b(this|last|past)\s+week\b"), lambda m: 7),
+    (re.compile(r"\b(this|last|past)\s+month\b"), lambda m: 30),
+    (re.compile(r"\b(this|last|past)\s+year\b"), lambda m: 365),
+]
+DEFAULT_PERIOD = 30
+# An optional period at the end of a data question, e.g. " in the last 2 weeks" or " this month"
+PERIOD_SUFFIX = r"( ((in|over|during) )?(the )?((last|past|this) (\d+ )?\w+|today))?"
+
+
+def parse_period(message: str) -> int:
+    """
+    Get the number of days a question asks about.
+
+    :param message: The question, e.g. "how much did I spend in the last 2 weeks".
+    :return: The period in days, 0 for today only, DEFAULT_PERIOD if none is given.
+    """
+    message = message.lower()
+    for pattern, days in PERIOD_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return max(0, days(match))
+    return DEFAULT_PERIOD
+
+
+def describe_period(period: int) -> str:
+    return "today" if period == 0 else f"in the last {period} days"
+
+
+def canned(text: str) -> Callable:
+    return lambda message, user_id, match: text
+
+
+def answer_spending_total(message, user_id, match):
+    period = parse_period(message)
+    summary = result_cache.get_or_compute(
+        'analytics', user_id, str(period), lambda: compute_analytics(user_id, period))['summary']
+    return (f"You spent £{summary['total_expenses']:,.2f} {describe_period(period)} across "
+            f"{summary['expense_count']} transactions, with £{summary['total_income']:,.2f} of income.")
+
+
+def answer_income(message, user_id, match):
+    period = parse_period(message)
+    summary = result_cache.get_or_compute(
+        'analytics', user_id, str(period), lambda: compute_analytics(user_id, period))['summary']
+    net = summary['total_income'] - summary['total_expenses']
+    outcome = f"you saved £{net:,.2f}" if net >= 0 else f"you overspent by £{-net:,.2f}"
+    return (f"Your income {describe_period(period)} was £{summary['total_income']:,.2f} against "
+            f"£{summary['total_expenses']:,.2f} of expenses, so {outcome}.")
+
+
+def answer_top_categories(message, user_id, match):
+    period = parse_period(message)
+    analytics = result_cache.get_or_compute(
+        'analytics', user_id, str(period), lambda: compute_analytics(user_id, period))
+    if not analytics['top_categories']:
+        return f"You have no expenses recorded {describe_period(period)}."
+    lines = [f"Your top spending categories {describe_period(period)}:"]
+    lines += [f"- {category['category']}: £{category['amount']:,.2f}" for category in analytics['top_categories']]
+    return "\n".join(lines)
+
+
+def answer_category_spending(message, user_id, match):
+    period = parse_period(message)
+    stats = result_cache.get_or_compute(
+        'categories_stats', user_id, str(period), lambda: compute_category_stats(user_id, period))
+    if match is not None:
+        # The pattern captured exactly the name asked about
+        asked = match.group('category').lower()
+        named = [category for category in stats['categories'] if category['name'].lower() == asked]
+    else:
+        # Whole words only, preferring the longest name so "car insurance" is not also reported as "car"
+        lowered = message.lower()
+        named, taken = [], []
+        for category in sorted(stats['categories'], key=lambda category: len(category['name']), reverse=True):
+            found = re.search(r"(?<!\w)" + re.escape(category['name'].lower()) + r"(?!\w)", lowered)
+            if found and not any(start <= found.start() and found.end() <= end for start, end in taken):
+                named.append(category)
+                taken.append(found.span())
+    if not named:
+        # Not one of the user's categories, the agent can ask what they meant
+        return None
+    return "\n".join(
+        f"You spent £{category['total_spent']:,.2f} on {category['name']} {describe_period(period)} "
+        f"across {category['transaction_count']} transactions."
+        for category in named)
+
+
+INTENTS = [
+    Intent('greeting', ROUTE_CANNED,
+           [r"^(hi|hello|hey|good (morning|afternoon|evening))( there)?[\s!.]*$"],
+           [], 0, canned(f"Hi! {HELP_TEXT}")),
+    Intent('thanks', ROUTE_CANNED,
+           [r"^(thanks|thank you|cheers)( (so|very) much)?[\s!.]*$"],
+           [], 0, canned("You're welcome! Let me know if there's anything else I can help with.")),
+    Intent('help', ROUTE_CANNED,
+           [r"^(help|what can you do|what can you help (me )?with)\??$"],
+           [], 0, canned(HELP_TEXT)),
+    Intent('budgeting_basics', ROUTE_CANNED,
+           [r"^(what('s| is) the )?50\s*/\s*30\s*/\s*20( rule)?\??$", r"^how (do|should|can) i (make |create |start )?(a )?budget\??$"],
+           ["how do I budget", "how should I start budgeting", "what is the 50/30/20 rule",
+            "explain the 50 30 20 budgeting rule", "tips for making a budget", "how do I create a monthly budget"],
+           10, canned(ADVICE['budget'])),
+    Intent('saving_basics', ROUTE_CANNED,
+           [],
+           ["how do I save money", "how can I start saving", "how big should my emergency fund be",
+            "what is an emergency fund", "tips for saving more each month"],
+           10, canned(ADVICE['saving'])),
+    Intent('debt_basics', ROUTE_CANNED,
+           [],
+           ["how do I pay off debt", "what is the debt snowball method", "debt avalanche or snowball",
+            "how should I get out of debt"],
+           10, canned(ADVICE['debt'])),
+    Intent('investing_basics', ROUTE_CANNED,
+           [],
+           ["how do I start investing", "what should a beginner invest in", "are index funds a good investment",
+            "investing tips for beginners"],
+           10, canned(ADVICE['investment'])),
+    Intent('category_spending', ROUTE_DATA,
+           [r"^how much (have i|did i) spen[dt] on (?P<category>[\w&'-]+( [\w&'-]+){0,2}?)" + PERIOD_SUFFIX + r"\??$"],
+           [], 0, answer_category_spending),
+    Intent('spending_total', ROUTE_DATA,
+           [r"^how much (have i|did i) spen[dt]" + PERIOD_SUFFIX + r"\??$",
+            r"^what (are|were) my (total )?(expenses|spending)" + PERIOD_SUFFIX + r"\??$"],
+           [], 0, answer_spending_total),
+    Intent('income', ROUTE_DATA,
+           [r"^(what('s| is| was)|how much (is|was)) my (income|net savings)" + PERIOD_SUFFIX + r"\??$"],
+           [], 0, answer_income),
+    Intent('top_categories', ROUTE_DATA,
+           [r"^(what are )?my (top|biggest|largest) (spending |expense )?categories" + PERIOD_SUFFIX + r"\??$",
+            r"^where does my money go\??$"],
+           [], 0, answer_top_categories),
+]
+
+
+class NearestCentroidClassifier:
+    """
+    Classify a message embedding by its cosine similarity to per-intent centroids.
+
+    :param examples: Intent name to example phrasings.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]]) -> None:
+        """Initialize NearestCentroidClassifier class."""
+        self._examples = {name: phrases for name, phrases in examples.items() if phrases}
+        self._names = []
+        self._centroids = None
+
+    @property
+    def fitted(self) -> bool:
+        return self._centroids is not None
+
+    def fit(self, embed: Callable[[List[str]], Optional[List[list]]]) -> None:
+        """
+        Embed the examples and average them into one unit centroid per intent.
+
+        :param embed: Embeds a list of texts, returning None if no embedder is available.
+        """
+        names, centroids = [], []
+        for name, phrases in self._examples.items():
+            vectors = embed(phrases)
+            if vectors is None:
+                return
+            vectors = np.asarray(vectors, dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            centroid = vectors.mean(axis=0)
+            names.append(name)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        self._names = names
+        self._centroids = np.stack(centroids) if centroids else np.zeros((0, 0), dtype=np.float32)
+
+    def predict(self, vector) -> tuple:
+        """
+        Find the closest intent.
+
+        :param vector: The message embedding.
+        :return: The intent name, its similarity and its margin over the runner-up; (None, 0, 0) if there are no intents.
+        """
+        if not self._names:
+            return None, 0.0, 0.0
+        vector = np.asarray(vector, dtype=np.float32)
+        similarities = self._centroids @ (vector / np.linalg.norm(vector))
+        order = np.argsort(-similarities)
+        best = float(similarities[order[0]])
+        runner_up = float(similarities[order[1]]) if len(order) > 1 else -1.0
+        return self._names[order[0]], best, best - runner_up
+
+
+class IntentRouter:
+    """
+    Answers canned and data questions without an agent run, escalating everything else.
+
+    A message is first checked against each intent's regex patterns, then, when an embedder
+    is available, classified by its nearest intent centroid. Only a centroid match that is
+    both similar enough (threshold) and clearly ahead of the next intent (margin) is
+    answered; anything else, and any data question whose handler cannot answer it, goes to
+    the agent.
+
+    :param intents: The intents to recognise.
+    :param embed: Optional function embedding a list of texts (or returning None when it cannot);
+                  without it only patterns are used.
+    :param threshold: The minimum cosine similarity to an intent centroid.
+    :param margin: The minimum lead of the best centroid over the runner-up.
+    """
+
+    def __init__(self, intents: List[Intent] = INTENTS, embed: Optional[Callable[[List[str]], Optional[List[list]]]] = None,
+                 threshold: float = INTENT_CENTROID_THRESHOLD, margin: float = INTENT_CENTROID_MARGIN) -> None:
+        """Initialize IntentRouter class."""
+        self._intents = {intent.name: intent for intent in intents}
+        self._patterns = [(intent, re.compile(pattern, re.IGNORECASE)) for intent in intents for pattern in intent.patterns]
+        self._classifier = NearestCentroidClassifier({intent.name: intent.examples for intent in intents})
+        self._embed = embed
+        self._threshold = threshold
+        self._margin = margin
+        self._fit_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._route_counts = {}
+        self._intent_counts = {}
+
+    def _classify(self, message):
+        """Classify a message by embedding, fitting the centroids on first use."""
+        if self._embed is None:
+            return None
+        if not self._classifier.fitted:
+            with self._fit_lock:
+                if not self._classifier.fitted:
+                    self._classifier.fit(self._embed)
+        vectors = self._embed([message]) if self._classifier.fitted else None
+        if vectors is None:
+            return None
+        name, similarity, margin = self._classifier.predict(vectors[0])
+        if name is None or similarity < self._threshold or margin < self._margin:
+            return None
+        intent = self._intents[name]
+        return intent if len(message.split()) <= intent.max_words else None
+
+    def route(self, message: str, user_id) -> Optional[RoutedAnswer]:
+        """
+        Answer a message directly if it is a recognised intent.
+
+        Needs an application context for data intents.
+
+        :param message: The user's message.
+        :param user_id: The user data intents are answered for.
+        :return: The answer, or None to escalate to the agent.
+        """
+        text = " ".join(message.split())
+        for intent, pattern in self._patterns:
+            match = pattern.search(text)
+            if match:
+                answer = intent.answer(text, user_id, match)
+                if answer is not None:
+                    return RoutedAnswer(intent.name, intent.route, answer, 'pattern')
+        try:
+            intent = self._classify(text)
+        except Exception as e:
+            print(f"⚠️ Intent classification skipped: {e}")
+            intent = None
+        if intent is not None:
+            answer = intent.answer(text, user_id, None)
+            if answer is not None:
+                return RoutedAnswer(intent.name, intent.route, answer, 'embedding')
+        return None
+
+    def record(self, route: str, seconds: float, intent: Optional[str] = None) -> None:
+        """
+        Record how long a chat message took on its route.
+
+        :param route: ROUTE_CANNED, ROUTE_DATA or ROUTE_AGENT.
+        :param seconds: The time to answer, routing included.
+        :param intent: The intent answered, for canned and data routes.
+        """
+        with self._lock:
+            self._latencies.setdefault(route, deque(maxlen=LATENCY_SAMPLES)).append(seconds)
+            self._route_counts[route] = self._route_counts.get(route, 0) + 1
+            if intent is not None:
+                self._intent_counts[intent] = self._intent_counts.get(intent, 0) + 1
+
+    def stats(self) -> dict:
+        """Get per-route counts and latency percentiles, per-intent counts and the escalation rate."""
+        with self._lock:
+            latencies = {route: sorted(samples) for route, samples in self._latencies.items()}
+            route_counts = dict(self._route_counts)
+            intent_counts = dict(self._intent_counts)
+        routes = {}
+        for route, samples in latencies.items():
+            routes[route] = {
+                'count': route_counts[route],
+                'p50_ms': round(samples[len(samples) // 2] * 1000, 1),
+                'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+            }
+        total = sum(route['count'] for route in routes.values())
+        escalated = routes.get(ROUTE_AGENT, {}).get('count', 0)
+        return {
+            'routes': routes,
+            'intents': intent_counts,
+            'escalation_rate': round(escalated / total, 3) if total else 0.0,
+            'classifier_fitted': self._classifier.fitted,
+        }
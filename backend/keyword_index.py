@@ -0,0 +1,117 @@
+from typing import List, Tuple
+
+import asyncio
+import math
+import re
+
+import numpy as np
+
+from embeddings_file import iter_rows
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from how i if in is it my of on or should so than that
+the their them there these this to was what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase alphanumeric terms, dropping common stopwords.
+
+    Numbers and codes are kept whole, so terms like "1257l", "isa" or "aapl" match exactly.
+
+    :param text: The text to tokenize.
+    :return: The terms.
+    """
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    In-memory BM25 keyword index over the chunks of an embeddings file.
+
+    The BM25 weight of every (term, chunk) pair is computed at load time, so a query
+    only sums the posting arrays of its terms.
+
+    :param embeddings_file: The csv or .npy file written by build_embeddings_file.
+    :param k1: The BM25 term frequency saturation.
+    :param b: The BM25 document length normalization.
+    """
+
+    def __init__(self, embeddings_file: str, k1: float = 1.5, b: float = 0.75) -> None:
+        """Initialize BM25Index class."""
+        self._embeddings_file = embeddings_file
+        self._k1 = k1
+        self._b = b
+        self._tokens = None
+        self._postings = None
+
+    @property
+    def size(self) -> int:
+        """The number of chunks in the index."""
+        return 0 if self._tokens is None else len(self._tokens)
+
+    async def load(self) -> None:
+        """Read the chunks of the embeddings file and build the postings."""
+        if self._tokens is None:
+            await asyncio.to_thread(self.load_sync)
+
+    def load_sync(self) -> None:
+        """Blocking version of load, for scripts."""
+        tokens = [row['token'] for row in iter_rows(self._embeddings_file)]
+        frequencies = {}
+        lengths = np.zeros(len(tokens), dtype=np.float32)
+        for doc, token in enumerate(tokens):
+            terms = tokenize(token)
+            lengths[doc] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                frequencies.setdefault(term, ([], []))
+                frequencies[term][0].append(doc)
+                frequencies[term][1].append(count)
+
+        total = len(tokens)
+        average_length = float(lengths.mean()) if total else 0.0
+        postings = {}
+        for term, (docs, counts) in frequencies.items():
+            docs = np.asarray(docs, dtype=np.int32)
+            counts = np.asarray(counts, dtype=np.float32)
+            idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self._k1 * (1 - self._b + self._b * lengths[docs] / (average_length or 1))
+            postings[term] = (docs, (idf * counts * (self._k1 + 1) / (counts + norm)).astype(np.float32))
+        self._tokens = tokens
+        self._postings = postings
+
+    def search_ids(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Score the chunks against a query.
+
+        :param query: The question.
+        :param k: The number of chunks to return.
+        :return: Up to k (chunk index, score) pairs with a positive score, best first.
+        """
+        if self._tokens is None:
+            raise ValueError("The keyword index is not loaded, please call load first")
+        scores = np.zeros(len(self._tokens), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return []
+        best = matched[np.argsort(-scores[matched], kind='stable')[:k]]
+        return [(int(doc), float(scores[doc])) for doc in best]
+
+    async def search(self, query: str, k: int) -> List[str]:
+        """
+        Find the chunks best matching the terms of a query.
+
+        :param query: The question.
+        :param k: The number of chunks to return.
+        :return: The chunks, best first.
+        """
+        return [self._tokens[doc] for doc, _ in self.search_ids(query, k)]
@@ -0,0 +1,40 @@
+"""transaction access path indexes
+
+Composite indexes for the per-user date range scans run by /analytics, /categories/stats
+and /transactions, plus one category name per user. The unique constraint will fail to
+apply if a user already has two categories with the same name; merge those first.
+
+Revision ID: 15f7315049c5
+Revises: 69c8b99d7138
+Create Date: 2026-10-18 02:17:10.325004
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '15f7315049c5'
+down_revision = '69c8b99d7138'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.create_index('ix_transactions_user_date', ['user_id', 'transaction_date'], unique=False)
+        batch_op.create_index('ix_transactions_user_category_date', ['user_id', 'category_id', 'transaction_date'], unique=False)
+        batch_op.create_index('ix_transactions_user_type_date', ['user_id', 'transaction_type', 'transaction_date'], unique=False)
+
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_categories_user_name', ['user_id', 'name'])
+
+
+def downgrade():
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_categories_user_name', type_='unique')
+
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_user_type_date')
+        batch_op.drop_index('ix_transactions_user_category_date')
+        batch_op.drop_index('ix_transactions_user_date')
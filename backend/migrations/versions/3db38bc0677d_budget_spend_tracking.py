@@ -0,0 +1,70 @@
+"""budget spend tracking
+
+Spend-to-date and the last alert level on each budget, kept in step with transactions
+on write, plus the budget_events table recording threshold crossings. Existing budgets
+are backfilled from the daily rollup; `flask --app app rebuild-budgets` recomputes
+them at any time.
+
+Revision ID: 3db38bc0677d
+Revises: d84696c3079d
+Create Date: 2026-10-18 06:12:48.207316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3db38bc0677d'
+down_revision = 'd84696c3079d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('budgets', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('spent', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('alert_level', sa.String(length=10), server_default='ok', nullable=False))
+        batch_op.create_index('ix_budgets_user_category_end', ['user_id', 'category_id', 'end_date'], unique=False)
+
+    op.create_table(
+        'budget_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('budget_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('level', sa.String(length=10), nullable=False),
+        sa.Column('spent', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('percent_used', sa.Numeric(precision=7, scale=2), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['budget_id'], ['budgets.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('budget_events', schema=None) as batch_op:
+        batch_op.create_index('ix_budget_events_user_created', ['user_id', 'created_at'], unique=False)
+
+    op.execute(
+        "UPDATE budgets SET spent = COALESCE(("
+        "SELECT SUM(d.total) FROM daily_user_totals d "
+        "WHERE d.user_id = budgets.user_id AND d.category_id = budgets.category_id "
+        "AND d.transaction_type = 'expense' "
+        "AND d.date >= DATE(budgets.start_date) AND d.date <= DATE(budgets.end_date)), 0)"
+    )
+    op.execute(
+        "UPDATE budgets SET alert_level = CASE "
+        "WHEN amount > 0 AND spent >= amount THEN 'over' "
+        "WHEN amount > 0 AND spent * 100 >= amount * COALESCE(alert_threshold, 80) THEN 'warning' "
+        "ELSE 'ok' END"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('budget_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_budget_events_user_created')
+
+    op.drop_table('budget_events')
+    with op.batch_alter_table('budgets', schema=None) as batch_op:
+        batch_op.drop_index('ix_budgets_user_category_end')
+        batch_op.drop_column('alert_level')
+        batch_op.drop_column('spent')
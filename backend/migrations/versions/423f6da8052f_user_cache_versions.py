@@ -0,0 +1,34 @@
+"""user cache versions
+
+Per user version of the cached /analytics and /categories/stats results, bumped on
+every write so that all worker processes stop serving a user's stale results at
+once when no Redis is configured.
+
+Revision ID: 423f6da8052f
+Revises: 3db38bc0677d
+Create Date: 2026-10-18 07:03:51.618204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '423f6da8052f'
+down_revision = '3db38bc0677d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_cache_versions',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('user_cache_versions')
@@ -0,0 +1,45 @@
+"""daily user totals rollup
+
+Per user, day, category and transaction type sums and counts that /analytics and
+/categories/stats read instead of scanning transactions. Existing transactions are
+backfilled here; `flask --app app rebuild-rollup` recomputes the table at any time.
+
+Revision ID: b356e99969a4
+Revises: 15f7315049c5
+Create Date: 2026-10-18 02:19:14.820294
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b356e99969a4'
+down_revision = '15f7315049c5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'daily_user_totals',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=False),
+        sa.Column('transaction_type', sa.String(length=10), nullable=False),
+        sa.Column('total', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id', 'date', 'category_id', 'transaction_type')
+    )
+    op.execute(
+        "INSERT INTO daily_user_totals (user_id, date, category_id, transaction_type, total, count) "
+        "SELECT user_id, DATE(transaction_date), category_id, transaction_type, SUM(amount), COUNT(id) "
+        "FROM transactions "
+        "GROUP BY user_id, DATE(transaction_date), category_id, transaction_type"
+    )
+
+
+def downgrade():
+    op.drop_table('daily_user_totals')
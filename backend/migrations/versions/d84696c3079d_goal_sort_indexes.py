@@ -0,0 +1,31 @@
+"""goal sort indexes
+
+Composite indexes serving a user's goals in priority or deadline order, so each
+page of /goals is an index range scan.
+
+Revision ID: d84696c3079d
+Revises: b356e99969a4
+Create Date: 2026-10-18 05:41:27.512093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd84696c3079d'
+down_revision = 'b356e99969a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('goals', schema=None) as batch_op:
+        batch_op.create_index('ix_goals_user_priority_deadline', ['user_id', 'priority', 'deadline'], unique=False)
+        batch_op.create_index('ix_goals_user_deadline', ['user_id', 'deadline'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('goals', schema=None) as batch_op:
+        batch_op.drop_index('ix_goals_user_deadline')
+        batch_op.drop_index('ix_goals_user_priority_deadline')
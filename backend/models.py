@@ -32,6 +32,9 @@ class User(db.Model):
 # create a db model for category represented by python class
 class Category(db.Model):
     __tablename__ = 'categories'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'name', name='uq_categories_user_name'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -56,6 +59,12 @@ class Category(db.Model):
 # create a db model for     Transaction represented by python class
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    # composite indexes for the per-user date range scans behind analytics and stats
+    __table_args__ = (
+        db.Index('ix_transactions_user_date', 'user_id', 'transaction_date'),
+        db.Index('ix_transactions_user_category_date', 'user_id', 'category_id', 'transaction_date'),
+        db.Index('ix_transactions_user_type_date', 'user_id', 'transaction_type', 'transaction_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -84,6 +93,9 @@ class Transaction(db.Model):
 # create a db model for Budget represented by python class
 class Budget(db.Model):
     __tablename__ = 'budgets'
+    __table_args__ = (
+        db.Index('ix_budgets_user_category_end', 'user_id', 'category_id', 'end_date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -93,6 +105,9 @@ class Budget(db.Model):
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime, nullable=False)
     alert_threshold = db.Column(db.Numeric(5, 2), nullable=True, default=80.00)  # e.g., 80.00 for 80%
+    # expenses in the category within the budget window, kept in step with transactions on write
+    spent = db.Column(db.Numeric(14, 2), nullable=False, default=0, server_default='0')
+    alert_level = db.Column(db.String(10), nullable=False, default='ok', server_default='ok')  # 'ok', 'warning' or 'over'
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, server_default=db.func.now(), server_onupdate=db.func.now())
 
@@ -107,13 +122,48 @@ class Budget(db.Model):
             'start_date': self.start_date,
             'end_date': self.end_date,
             'alert_threshold': self.alert_threshold,
+            'spent': self.spent,
+            'alert_level': self.alert_level,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
 
+# create a db model for budget threshold crossings represented by python class
+class BudgetEvent(db.Model):
+    __tablename__ = 'budget_events'
+    __table_args__ = (
+        db.Index('ix_budget_events_user_created', 'user_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    budget_id = db.Column(db.Integer, db.ForeignKey('budgets.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    level = db.Column(db.String(10), nullable=False)  # the level crossed into, 'warning' or 'over'
+    spent = db.Column(db.Numeric(14, 2), nullable=False)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    percent_used = db.Column(db.Numeric(7, 2), nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    # convert budget event object to json
+    def to_json(self):
+        return {
+            'id': self.id,
+            'budget_id': self.budget_id,
+            'user_id': self.user_id,
+            'level': self.level,
+            'spent': float(self.spent),
+            'amount': float(self.amount),
+            'percent_used': float(self.percent_used),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 # create a db model for Goals represented by python class
 class Goal(db.Model):
     __tablename__ = 'goals'
+    __table_args__ = (
+        db.Index('ix_goals_user_priority_deadline', 'user_id', 'priority', 'deadline'),
+        db.Index('ix_goals_user_deadline', 'user_id', 'deadline'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -141,4 +191,35 @@ class Goal(db.Model):
             'status': self.status,
             'created_at': self.created_at,
             'updated_at': self.updated_at
-        }
\ No newline at end of file
+        }
+
+# create a db model for the daily rollup of transactions represented by python class
+class DailyUserTotal(db.Model):
+    __tablename__ = 'daily_user_totals'
+
+    # one row per user, day, category and transaction type, kept in step with transactions on write
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), primary_key=True)
+    transaction_type = db.Column(db.String(10), primary_key=True)
+    total = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    # convert daily total object to json
+    def to_json(self):
+        return {
+            'user_id': self.user_id,
+            'date': self.date.isoformat() if self.date else None,
+            'category_id': self.category_id,
+            'transaction_type': self.transaction_type,
+            'total': float(self.total) if self.total else 0,
+            'count': self.count
+        }
+
+# create a db model for the per user cache versions represented by python class
+class UserCacheVersion(db.Model):
+    __tablename__ = 'user_cache_versions'
+
+    # bumped on every write to the user's data, so cached results in every worker process go stale together
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
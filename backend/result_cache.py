@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from config import db
+from models import UserCacheVersion
+
+load_dotenv() # Load environment variables from .env file
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+# Only safe to turn off when a single process serves the app
+CACHE_SHARED_VERSIONS = os.getenv("CACHE_SHARED_VERSIONS", "true").lower() == "true"
+
+
+class ResultCache:
+    """
+    Per-user cache for computed endpoint results.
+
+    Entries are keyed by (endpoint, user_id, period) plus the user's current version.
+    Any write that changes a user's data bumps the version, so older entries are never
+    read again and simply age out. The first tier is an in-process LRU with a TTL; when
+    a Redis URL is configured, results and versions are also shared through Redis.
+    Without Redis the versions live in the user_cache_versions table, so an invalidation
+    reaches every worker process either way.
+
+    :param ttl: Seconds an entry stays valid.
+    :param max_entries: The maximum number of entries kept in process.
+    :param redis_url: Optional Redis connection URL for the shared tier.
+    :param shared_versions: Keep versions in the database when Redis is not configured;
+                            only a single-process deployment can turn this off.
+    """
+
+    def __init__(self, ttl: int = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES, redis_url: str = None,
+                 shared_versions: bool = True) -> None:
+        """Initialize ResultCache class."""
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._redis = self._connect_redis(redis_url) if redis_url else None
+        self._database_versions = shared_versions and self._redis is None
+        self._stats = {
+            'local_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'evictions': 0,
+            'redis_errors': 0,
+            'version_errors': 0,
+        }
+
+    @staticmethod
+    def _connect_redis(redis_url):
+        """Connect to Redis, or run with the in-process tier only if it is unavailable."""
+        try:
+            import redis
+            client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            client.ping()
+            print("✅ Result cache connected to Redis")
+            return client
+        except Exception as e:
+            print(f"⚠️ Redis unavailable for result cache, using in-process cache only: {e}")
+            return None
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def version(self, user_id):
+        """
+        Get the user's data version, shared through Redis or the database.
+
+        :param user_id: The user whose version is returned.
+        :return: A number that changes whenever the user's data does.
+        """
+        user_id = int(user_id)
+        if self._redis is not None:
+            try:
+                version = self._redis.get(f"cache:version:{user_id}")
+                return int(version) if version else 0
+            except Exception:
+                self._count('redis_errors')
+        elif self._database_versions:
+            try:
+                return db.session.execute(
+                    select(UserCacheVersion.version).where(UserCacheVersion.user_id == user_id)
+                ).scalar() or 0
+            except Exception:
+                self._count('version_errors')
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    @staticmethod
+    def _bump_database_version(user_id):
+        """Increment the user's row in user_cache_versions, creating it on the first write."""
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        statement = dialect_insert(UserCacheVersion).values(user_id=user_id, version=1)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={'version': UserCacheVersion.version + 1}
+        ))
+        db.session.commit()
+
+    def get_or_compute(self, endpoint, user_id, period, compute):
+        """
+        Return the cached result for the key, computing and storing it on a miss.
+
+        :param endpoint: The name of the cached endpoint.
+        :param user_id: The user the result belongs to.
+        :param period: The period parameter of the request.
+        :param compute: Called with no arguments to build the result on a miss.
+        :return: The JSON-serializable result.
+        """
+        user_id = int(user_id)
+        key = f"cache:{endpoint}:{user_id}:{period}:v{self.version(user_id)}"
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats['local_hits'] += 1
+                return entry[1]
+
+        if self._redis is not None:
+            try:
+                cached = self._redis.get(key)
+                if cached is not None:
+                    result = json.loads(cached)
+                    self._store_local(key, result, now)
+                    self._count('redis_hits')
+                    return result
+            except Exception:
+                self._count('redis_errors')
+
+        self._count('misses')
+        result = compute()
+        self._store_local(key, result, now)
+        if self._redis is not None:
+            try:
+                self._redis.set(key, json.dumps(result), ex=self._ttl)
+            except Exception:
+                self._count('redis_errors')
+        return result
+
+    def _store_local(self, key, result, now):
+        """Store an entry in the in-process LRU, evicting the least recently used ones."""
+        with self._lock:
+            self._entries[key] = (now + self._ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate_user(self, user_id):
+        """
+        Invalidate every cached result of a user by bumping their version.
+
+        Call it after the write is committed; without Redis it commits the version bump.
+
+        :param user_id: The user whose data changed.
+        """
+        user_id = int(user_id)
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._stats['invalidations'] += 1
+        if self._redis is not None:
+            try:
+                self._redis.incr(f"cache:version:{user_id}")
+            except Exception:
+                self._count('redis_errors')
+        elif self._database_versions:
+            try:
+                self._bump_database_version(user_id)
+            except Exception as e:
+                db.session.rollback()
+                self._count('version_errors')
+                print(f"⚠️ Could not bump cache version of user {user_id}: {e}")
+
+    def stats(self):
+        """
+        Get the hit and miss counters of the cache.
+
+        :return: A dict of counters, the hit rate and the current number of entries.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        hits = stats['local_hits'] + stats['redis_hits']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0
+        stats['redis_enabled'] = self._redis is not None
+        stats['version_store'] = 'redis' if self._redis is not None else 'database' if self._database_versions else 'process'
+        stats['ttl_seconds'] = self._ttl
+        stats['max_entries'] = self._max_entries
+        return stats
+
+
+result_cache = ResultCache(redis_url=REDIS_URL, shared_versions=CACHE_SHARED_VERSIONS)
@@ -1,5 +1,6 @@
 from config import app, db
 from models import User, Category, Goal, Transaction  # Add Transaction import
+from daily_rollup import rebuild_daily_totals
 from datetime import datetime, timedelta
 import random
 
@@ -319,6 +320,10 @@ with app.app_context():
         
         # Commit all changes
         db.session.commit()
+
+        # Transactions were added directly, so recompute the daily rollup the analytics read from
+        rollup_rows = rebuild_daily_totals()
+        print(f"✅ Rebuilt {rollup_rows} daily total rows")
         print(f"\n🎉 Successfully created {created_count} new categories, {transactions_created} new transactions, and {goals_created} new goals!")
         
         # Calculate and display financial summary
@@ -35,6 +35,8 @@ const GoalList = ({ goals, onEdit, onDelete }) => {
             <th>Target Amount</th>
             <th>Current Amount</th>
             <th>Deadline</th>
+            <th>Progress</th>
+            <th>Needed / Month</th>
             <th>Priority</th>
             <th>Status</th>
             <th>Actions</th>
@@ -50,6 +52,10 @@ const GoalList = ({ goals, onEdit, onDelete }) => {
                 <td>£{parseFloat(goal.target_amount).toFixed(2)}</td>
                 <td>£{parseFloat(goal.current_amount).toFixed(2)}</td>
                 <td>{new Date(goal.deadline).toLocaleDateString()}</td>
+                <td title={goal.projected_completion ? `On track to finish ${new Date(goal.projected_completion).toLocaleDateString()}` : goal.current_amount > 0 ? 'Too far off to project' : 'No savings yet'}>
+                  {goal.percent_complete}%
+                </td>
+                <td>£{parseFloat(goal.required_monthly || 0).toFixed(2)}</td>
                 <td className="priority">{formatPriority(goal.priority)}</td>
                 <td className={`status ${goal.status}`}>{formatStatus(goal.status)}</td>
                 <td>
@@ -72,7 +78,7 @@ const GoalList = ({ goals, onEdit, onDelete }) => {
             ))
           ) : (
             <tr>
-              <td colSpan="9" style={{ textAlign: 'center', padding: '20px' }}>
+              <td colSpan="11" style={{ textAlign: 'center', padding: '20px' }}>
                 No savings goals found. Add your first saving goal!
               </td>
             </tr>
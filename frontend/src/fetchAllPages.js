@@ -0,0 +1,16 @@
+// Fetch every page of a cursor-paginated list endpoint by following next_cursor
+export const fetchAllPages = async (url, key) => {
+  const items = []
+  let cursor = null
+  do {
+    const separator = url.includes('?') ? '&' : '?'
+    const response = await fetch(cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url)
+    if (!response.ok) {
+      throw new Error(`${url} error: ${response.status}`)
+    }
+    const data = await response.json()
+    items.push(...(data[key] || []))
+    cursor = data.has_more ? data.next_cursor : null
+  } while (cursor)
+  return items
+}
@@ -23,9 +23,66 @@ const ChatbotPage = () => {
     scrollToBottom();
   }, [messages]);
 
-  const generateBotResponse = async (userMessage) => {
+  // Read server-sent events from the streaming chat endpoint, calling onToken for every text delta
+  const streamBotResponse = async (userMessage, onToken) => {
+    const response = await fetch('/api/chat/stream', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ message: userMessage }),
+    });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`Streaming endpoint failed: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let source = 'rag_agent';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const rawEvent of events) {
+        const eventLine = rawEvent.split('\n').find(line => line.startsWith('event: '));
+        const dataLine = rawEvent.split('\n').find(line => line.startsWith('data: '));
+        if (!eventLine || !dataLine) continue;
+
+        const eventType = eventLine.slice('event: '.length);
+        const data = JSON.parse(dataLine.slice('data: '.length));
+        if (eventType === 'delta') {
+          text += data.text;
+          onToken(text);
+        } else if (eventType === 'done') {
+          source = data.source;
+        } else if (eventType === 'error') {
+          text += `\n\n${data.error}`;
+          onToken(text);
+        }
+      }
+    }
+
+    return { text, source };
+  };
+
+  const generateBotResponse = async (userMessage, onToken) => {
     try {
       if (isRagEnabled) {
+        // Render the answer token by token as the agent generates it
+        try {
+          return await streamBotResponse(userMessage, onToken);
+        } catch (streamError) {
+          console.warn('Streaming chat failed, trying the non-streaming endpoint:', streamError);
+        }
+
         // Try to use the RAG agent through the backend
         const response = await fetch('/api/chat', {
           method: 'POST',
@@ -113,19 +170,31 @@ const ChatbotPage = () => {
     setInputMessage('');
     setIsTyping(true);
 
+    const botMessageId = Date.now() + 1;
+
+    // Show streamed tokens in a single bot message, adding it on the first token
+    const showBotText = (text, source) => {
+      setIsTyping(false);
+      setMessages(prev => {
+        const botResponse = {
+          id: botMessageId,
+          text,
+          sender: 'bot',
+          timestamp: new Date(),
+          source
+        };
+        const exists = prev.some(message => message.id === botMessageId);
+        return exists
+          ? prev.map(message => message.id === botMessageId ? { ...message, text, source } : message)
+          : [...prev, botResponse];
+      });
+    };
+
     try {
       // Get bot response (either from RAG or fallback)
-      const botResponseData = await generateBotResponse(currentMessage);
-      
-      const botResponse = {
-        id: Date.now() + 1,
-        text: botResponseData.text,
-        sender: 'bot',
-        timestamp: new Date(),
-        source: botResponseData.source
-      };
+      const botResponseData = await generateBotResponse(currentMessage, (text) => showBotText(text));
       
-      setMessages(prev => [...prev, botResponse]);
+      showBotText(botResponseData.text, botResponseData.source);
     } catch (error) {
       console.error('Error generating bot response:', error);
       const errorResponse = {
@@ -196,7 +265,8 @@ const ChatbotPage = () => {
                   {message.source && (
                     <span className={`message-source ${message.source}`}>
                       {message.source === 'rag_agent' ? '🧠 AI' : 
-                       message.source === 'fallback' ? '💡 Simple' : ''}
+                       message.source === 'fallback' ? '💡 Simple' :
+                       message.source === 'router' ? '⚡ Quick' : ''}
                     </span>
                   )}
                 </div>
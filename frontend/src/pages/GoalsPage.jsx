@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react'
 import '../App.css'
 import GoalList from "../components/SavingsList.jsx";
 import GoalForm from '../components/SavingsForm.jsx';
+import { fetchAllPages } from '../fetchAllPages.js'
 
 function GoalsPage() {
   // state to store goals
@@ -17,13 +18,11 @@ function GoalsPage() {
    // Function to fetch goals from backend
   const fetchGoals = async () => {
     try {
-      const response = await fetch('/api/goals')
-      const data = await response.json()
-      setGoals(data.goals || [])
-      console.log(data.goals)
-      console.log('Full response:', data)
-      console.log('Goals array:', data.goals)
-      console.log('Array length:', data.goals ? data.goals.length : 'undefined')
+      // /goals is paginated, so follow the cursor to list every goal
+      const goals = await fetchAllPages('/api/goals?limit=200', 'goals')
+      setGoals(goals)
+      console.log('Goals array:', goals)
+      console.log('Array length:', goals.length)
     } catch (error) {
       console.error('Error fetching goals:', error)
       // Set some mock data for testing when backend is not available
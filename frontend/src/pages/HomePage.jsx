@@ -1,5 +1,9 @@
 import React, { useState, useEffect } from 'react'
 import '../styles/homepage.css'
+import { fetchAllPages } from '../fetchAllPages.js'
+
+// /analytics looks back a number of whole days from today; this reaches every transaction
+const ALL_TIME_DAYS = 36500
 
 const HomePage = () => {
   const [stats, setStats] = useState({
@@ -19,52 +23,36 @@ const HomePage = () => {
       setLoading(true);
       
       // Fetch all required data in parallel
-      const [transactionsRes, goalsRes, categoriesRes] = await Promise.all([
-        fetch('/api/transactions'),
-        fetch('/api/goals'),
+      // Balance and this month's count come from /analytics, which sums the daily rollup
+      // instead of downloading every transaction; /goals is paginated, so follow the cursor
+      const daysThisMonth = new Date().getDate() - 1;
+      const [allTimeRes, monthRes, goals, categoriesRes] = await Promise.all([
+        fetch(`/api/analytics?period=${ALL_TIME_DAYS}`),
+        fetch(`/api/analytics?period=${daysThisMonth}`),
+        fetchAllPages('/api/goals?limit=200', 'goals'),
         fetch('/api/categories')
       ]);
 
       // Check if responses are ok
-      if (!transactionsRes.ok) {
-        throw new Error(`Transactions API error: ${transactionsRes.status}`);
-      }
-      if (!goalsRes.ok) {
-        throw new Error(`Goals API error: ${goalsRes.status}`);
+      if (!allTimeRes.ok || !monthRes.ok) {
+        throw new Error(`Analytics API error: ${allTimeRes.ok ? monthRes.status : allTimeRes.status}`);
       }
 
-      const transactionsData = await transactionsRes.json();
-      const goalsData = await goalsRes.json();
+      const allTime = (await allTimeRes.json()).summary;
+      const month = (await monthRes.json()).summary;
       const categoriesData = await categoriesRes.json();
 
-      const transactions = transactionsData.transactions || [];
-      const goals = goalsData.goals || [];
       const categories = categoriesData.categories || [];
 
-      console.log('Fetched transactions:', transactions);
       console.log('Fetched goals:', goals);
 
       // Calculate total balance (income - expenses)
-      const totalBalance = transactions.reduce((balance, transaction) => {
-        const amount = parseFloat(transaction.amount) || 0;
-        if (transaction.transaction_type === 'income') {
-          return balance + amount;
-        } else if (transaction.transaction_type === 'expense') {
-          return balance - amount;
-        }
-        return balance;
-      }, 0);
+      const totalBalance = allTime.total_income - allTime.total_expenses;
       
       console.log('Calculated total balance:', totalBalance);
 
-      // Calculate this month's transactions
-      const currentMonth = new Date().getMonth();
-      const currentYear = new Date().getFullYear();
-      const monthlyTransactions = transactions.filter(transaction => {
-        const transactionDate = new Date(transaction.transaction_date);
-        return transactionDate.getMonth() === currentMonth && 
-               transactionDate.getFullYear() === currentYear;
-      }).length;
+      // This month's transactions, from midnight on the 1st
+      const monthlyTransactions = month.transaction_count;
 
       // Count active goals (not completed)
       const activeGoals = goals.filter(goal => goal.status !== 'completed').length;
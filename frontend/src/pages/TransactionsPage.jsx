@@ -6,6 +6,8 @@ import TransactionForm from '../components/TransactionForm.jsx';
 function TransactionsPage() {
   // state to store transactions
   const [transactions, setTransactions] = useState([])
+  // cursor of the next page, null once the last page is loaded
+  const [nextCursor, setNextCursor] = useState(null)
   //modal component
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [currentTransaction, setCurrentTransaction] = useState(null);
@@ -16,17 +18,26 @@ function TransactionsPage() {
   }, [])
 
   // Function to fetch transactions from backend
-  const fetchTransactions = async () => {
+  // /transactions is paginated: load the first page, or append the page after cursor
+  const fetchTransactions = async (cursor = null) => {
     try {
-      const response = await fetch('/api/transactions')
+      const url = cursor ? `/api/transactions?cursor=${encodeURIComponent(cursor)}` : '/api/transactions'
+      const response = await fetch(url)
+      if (!response.ok) {
+        throw new Error(`Transactions API error: ${response.status}`)
+      }
       const data = await response.json()
-      setTransactions(data.transactions || [])
-      console.log(data.transactions)
-      console.log('Full response:', data)
-      console.log('Transactions array:', data.transactions)
-      console.log('Array length:', data.transactions ? data.transactions.length : 'undefined')
+      const page = data.transactions || []
+      setTransactions(cursor ? previous => [...previous, ...page] : page)
+      setNextCursor(data.has_more ? data.next_cursor : null)
+      console.log('Transactions page:', page)
+      console.log('Page length:', page.length)
     } catch (error) {
       console.error('Error fetching transactions:', error)
+      if (cursor) {
+        // Keep the pages already loaded, the button stays to retry
+        return
+      }
       // Set some mock data for testing when backend is not available
       setTransactions([
         {
@@ -99,6 +110,12 @@ const onUpdateTransaction = () => {
 
       <TransactionList transactions={transactions} onEdit={openEditModal} onDelete={deleteTransaction} updateCallback={onUpdateTransaction} />
 
+      {nextCursor && (
+        <button onClick={() => fetchTransactions(nextCursor)}>
+          Load more
+        </button>
+      )}
+
       <button
         className="add-transaction-btn"
         onClick={openCreateModal}
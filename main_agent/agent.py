@@ -3,6 +3,7 @@ import logging
 import os
 import requests
 import asyncio
+import httpx
 from azure.identity import AzureCliCredential,DefaultAzureCredential
 from pydantic import Field, BaseModel
 from agent_framework.azure import AzureOpenAIChatClient
@@ -10,7 +11,12 @@ from typing import Annotated, cast, Optional
 from azure.core.credentials import AzureKeyCredential
 from openai import AsyncAzureOpenAI
 from search_index_manager import SearchIndexManager
+from embedding_cache import EmbeddingCache
+from vector_index import LocalVectorIndex
+from keyword_index import BM25Index
 from stock_data_manager import StockDataManager
+from stock_bar_store import StockBarStore
+from parallel_workflow import ParallelWorkflow, WORKFLOW_MAX_ROUNDS, WORKFLOW_MAX_TOKENS, WORKFLOW_TIMEOUT_SECONDS
 from agent_framework import (
     ai_function,
     AgentExecutor, 
@@ -45,14 +51,35 @@ SEARCH_ENDPOINT = os.getenv("AZURE_AI_SEARCH_ENDPOINT")
 SEARCH_API_KEY = os.getenv("AZURE_SEARCH_API_KEY")
 SEARCH_INDEX_NAME = os.getenv("AZURE_AI_SEARCH_INDEX_NAME")
 AZURE_SEARCH_MODEL = os.getenv("AZURE_SEARCH_MODEL")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+# Set to an embeddings file (.csv or .npy) from build_embeddings_file to search in process instead of Azure AI Search
+LOCAL_VECTOR_INDEX_FILE = os.getenv("LOCAL_VECTOR_INDEX_FILE")
+LOCAL_VECTOR_INDEX_MODE = os.getenv("LOCAL_VECTOR_INDEX_MODE", "exact")
+# vector, keyword or hybrid; keyword and hybrid search a BM25 index over the chunks of KEYWORD_INDEX_FILE
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+KEYWORD_INDEX_FILE = os.getenv("KEYWORD_INDEX_FILE", LOCAL_VECTOR_INDEX_FILE)
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", "5"))
+SEARCH_VECTOR_WEIGHT = float(os.getenv("SEARCH_VECTOR_WEIGHT", "1.0"))
+SEARCH_KEYWORD_WEIGHT = float(os.getenv("SEARCH_KEYWORD_WEIGHT", "1.0"))
+SEARCH_CONTEXT_TOKENS = int(os.getenv("SEARCH_CONTEXT_TOKENS")) if os.getenv("SEARCH_CONTEXT_TOKENS") else None
 
 ALPHA_VANTAGE_API_KEY = os.getenv("ALPHA_VANTAGE_API_KEY")
+# Fetched stock bars are kept here, so history questions need no extra API calls
+STOCK_BAR_STORE_PATH = os.getenv("STOCK_BAR_STORE_PATH", "stock_bars.sqlite3")
+# magentic routes through the manager one participant at a time; parallel dispatches independent subtasks at once
+WORKFLOW_MODE = os.getenv("WORKFLOW_MODE", "magentic")
+MAGENTIC_MAX_ROUNDS = int(os.getenv("MAGENTIC_MAX_ROUNDS", "10"))
+MAGENTIC_MAX_STALLS = int(os.getenv("MAGENTIC_MAX_STALLS", "3"))
+MAGENTIC_MAX_RESETS = int(os.getenv("MAGENTIC_MAX_RESETS", "2"))
+# The finance tracker backend serving the user's spending, budget and goal tables
+FINANCE_API_URL = os.getenv("FINANCE_API_URL", "http://localhost:5000")
+FINANCE_USER_ID = os.getenv("FINANCE_USER_ID", "1")
 
 # Define embedding dimensions
 embed_dimensions = 1536
 
 # Initialize everything at module level 
-azure_search_credential = AzureKeyCredential(SEARCH_API_KEY)
+azure_search_credential = AzureKeyCredential(SEARCH_API_KEY) if SEARCH_API_KEY else None
 
 # Create embeddings client that we can reference later
 embeddings_client = AsyncAzureOpenAI(
@@ -69,10 +96,18 @@ search_index_manager = SearchIndexManager(
     api_key=SEARCH_API_KEY,
     index_name=SEARCH_INDEX_NAME,
     dimension=embed_dimensions,  # Use the defined variable
-    embeddings_client=embeddings_client  # Use the defined variable
+    embeddings_client=embeddings_client,  # Use the defined variable
+    embedding_cache=EmbeddingCache(path=EMBEDDING_CACHE_PATH),
+    vector_index=LocalVectorIndex(LOCAL_VECTOR_INDEX_FILE, mode=LOCAL_VECTOR_INDEX_MODE) if LOCAL_VECTOR_INDEX_FILE else None,
+    keyword_index=BM25Index(KEYWORD_INDEX_FILE) if KEYWORD_INDEX_FILE else None,
+    search_mode=SEARCH_MODE,
+    top_k=SEARCH_TOP_K,
+    vector_weight=SEARCH_VECTOR_WEIGHT,
+    keyword_weight=SEARCH_KEYWORD_WEIGHT,
+    context_token_budget=SEARCH_CONTEXT_TOKENS
 )
 
-stock_data_manager = StockDataManager(api_key=ALPHA_VANTAGE_API_KEY)
+stock_data_manager = StockDataManager(api_key=ALPHA_VANTAGE_API_KEY, bar_store=StockBarStore(STOCK_BAR_STORE_PATH))
 
 # ============================================================================
 # TOOL FUNCTIONS
@@ -109,7 +144,7 @@ def get_financial_advice(
     else:
         return f"For {topic}, consider consulting financial resources or speaking with a financial advisor for personalized guidance."
 
-def get_stock_data(
+async def get_stock_data(
     symbol: Annotated[str, Field(description="The stock ticker symbol to retrieve data for (e.g., IBM, AAPL, TSLA)")],
     interval: Annotated[str, Field(description="Time interval: 1min, 5min, 15min, 30min, or 60min. Default is 5min")] = "5min",
     outputsize: Annotated[str, Field(description="Data size: 'compact' for latest 100 points or 'full' for 30 days. Default is compact")] = "compact"
@@ -118,7 +153,63 @@ def get_stock_data(
     Get real-time and historical stock price data from Alpha Vantage API.
     Returns intraday OHLCV (Open, High, Low, Close, Volume) time series data.
     """
-    return stock_data_manager.get_stock_data(symbol, interval, outputsize)
+    return await stock_data_manager.get_stock_data(symbol, interval, outputsize)
+
+async def get_stock_quotes(
+    symbols: Annotated[list[str], Field(description="The stock ticker symbols to quote (e.g., ['AAPL', 'MSFT', 'TSLA']), up to 10")],
+    interval: Annotated[str, Field(description="Time interval: 1min, 5min, 15min, 30min, or 60min. Default is 5min")] = "5min"
+) -> str:
+    """
+    Get the latest price, change since the session open, day high/low and volume for
+    several stocks at once, as one table. Use this instead of repeated get_stock_data
+    calls when comparing stocks or reviewing a portfolio.
+    """
+    return await stock_data_manager.get_stock_quotes(symbols, interval)
+
+async def get_stock_history(
+    symbol: Annotated[str, Field(description="The stock ticker symbol (e.g., IBM, AAPL, TSLA)")],
+    start: Annotated[Optional[str], Field(description="First date of the range, YYYY-MM-DD. Default is the oldest stored bar")] = None,
+    end: Annotated[Optional[str], Field(description="Last date of the range, YYYY-MM-DD. Default is the latest bar")] = None,
+    interval: Annotated[str, Field(description="Bar interval: 1min, 5min, 15min, 30min, or 60min. Default is 60min")] = "60min",
+    window: Annotated[int, Field(description="Number of bars in the moving averages. Default is 20")] = 20
+) -> str:
+    """
+    Summarize a stock's price history over a date range from locally stored bars:
+    open, close, change, high, low, average volume and moving averages.
+    Covers up to the last 30 days of intraday data.
+    """
+    return await stock_data_manager.get_stock_history(symbol, interval, start, end, window)
+
+# Read-only tools over the user's own finances; the backend aggregates, so only small tables come back
+finance_api_client = httpx.AsyncClient(base_url=FINANCE_API_URL, timeout=10)
+
+async def get_finance_table(tool: str, **params) -> str:
+    """Fetch one of the backend's personal finance tables for the configured user."""
+    try:
+        response = await finance_api_client.get(f"/chat/tools/{tool}", params={"user_id": FINANCE_USER_ID, **params})
+        response.raise_for_status()
+        return response.json()["table"]
+    except httpx.HTTPError as e:
+        logger.warning(f"Finance API request failed: {e}")
+        return "The user's finance data is not available right now."
+
+async def get_spending_by_category(
+    period_days: Annotated[int, Field(description="Number of days to look back from today, e.g. 30 for the last month")] = 30,
+    category: Annotated[Optional[str], Field(description="Optional category name, e.g. Dining, to report on its own")] = None
+) -> str:
+    """Get the user's spending per category over a recent period."""
+    params = {"period": period_days}
+    if category:
+        params["category"] = category
+    return await get_finance_table("spending", **params)
+
+async def get_budget_status() -> str:
+    """Get the user's active budgets with the amount spent, remaining and whether each is on track."""
+    return await get_finance_table("budgets")
+
+async def get_goal_progress() -> str:
+    """Get the user's savings goals with their progress and the monthly saving needed to hit each deadline."""
+    return await get_finance_table("goals")
 
 @ai_function(approval_mode="always_require")
 def ask_user(question: Annotated[str, "The question to ask the user for clarification"]) -> str:
@@ -190,11 +281,13 @@ advisor_agent = AzureOpenAIChatClient(
         
         
         Use the available tools to search for specific information or provide general financial advice.
+        For questions about the user's own spending, budgets or savings goals, use their finance tools
+        and base your answer on the figures they return.
         Keep your responses helpful, concise, and focused on practical financial advice. 
         Always remind users to consult with licensed financial advisors for personalized investment advice.
         Format your responses in a clear, easy-to-read way with bullet points when appropriate.""",
-        description="Provides personalized financial guidance on budgeting, savings, debt management, and investment strategies",
-        tools=[get_financial_advice] 
+        description="Provides personalized financial guidance on budgeting, savings, debt management, and investment strategies, using the user's own spending, budgets and goals",
+        tools=[get_financial_advice, get_spending_by_category, get_budget_status, get_goal_progress] 
 )
 
 # initialise a research agent with azure openai response and a toolset (like your working version)
@@ -233,12 +326,13 @@ investment_agent = AzureOpenAIChatClient(
         - Market trends and economic indicators
         
         Use available tools to research specific stocks, market data, or investment concepts.
+        When a question involves several stocks, quote them together with get_stock_quotes.
         Provide clear, educational responses that help users understand investment principles.
         ALWAYS emphasize that you provide educational information only, not personalized investment advice.
         Remind users to conduct thorough research and consult licensed financial advisors before making investment decisions.
         Present information in a structured format with clear explanations.""",
         description="Specialist in stock market analysis, investment strategies, and portfolio management guidance",
-        tools=[get_stock_data,ask_user]
+        tools=[get_stock_data,get_stock_quotes,get_stock_history,ask_user]
 )
 
 # ============================================================================
@@ -254,15 +348,38 @@ workflow = (
         research=research_agent
         )
     .with_standard_manager(
-        manager=manager_agent
-        #max_round_count=10,  # Maximum collaboration rounds
-        #max_stall_count=3,   # Maximum rounds without progress
-        #max_reset_count=2,   # Maximum plan resets allowed
+        manager=manager_agent,
+        max_round_count=MAGENTIC_MAX_ROUNDS,  # Maximum collaboration rounds
+        max_stall_count=MAGENTIC_MAX_STALLS,  # Maximum rounds without progress
+        max_reset_count=MAGENTIC_MAX_RESETS,  # Maximum plan resets allowed
     )
     #.with_plan_review()  # Enable plan review
     .build()
 )
 
+def print_progress(kind: str, text: str):
+    """Print the parallel workflow's progress like the Magentic orchestrator messages."""
+    print(f"\n[🎯 Planner:{kind}] {text}")
+
+# Plan-and-dispatch alternative to the Magentic workflow, with round, token and time budgets
+parallel_workflow = ParallelWorkflow(
+    planner=manager_agent,
+    participants={
+        "InvestmentAgent": investment_agent,
+        "AdvisorAgent": advisor_agent,
+        "ResearchAgent": research_agent
+    },
+    descriptions={
+        "InvestmentAgent": "Stock quotes, price history and investment analysis",
+        "AdvisorAgent": "Budgeting, saving and debt management advice, with the user's own spending, budgets and goals",
+        "ResearchAgent": "Searches the financial knowledge base"
+    },
+    max_rounds=WORKFLOW_MAX_ROUNDS,
+    max_tokens=WORKFLOW_MAX_TOKENS,
+    timeout=WORKFLOW_TIMEOUT_SECONDS,
+    on_progress=print_progress
+)
+
 # ============================================================================
 # MAIN INTERACTIVE LOOP
 # ============================================================================
@@ -307,40 +424,51 @@ async def main():
                 print("\n🔄 Processing your request...")
                 # Run the workflow with user's query
                 output: str | None = None
-                async for event in workflow.run_stream(user_query):
-                    if isinstance(event, AgentRunUpdateEvent):
-                        props = event.data.additional_properties if event.data else None
-                        event_type = props.get("magentic_event_type") if props else None
-
-                        if event_type == MAGENTIC_EVENT_TYPE_ORCHESTRATOR:
-                            kind = props.get("orchestrator_message_kind", "") if props else ""
-                            text = event.data.text if event.data else ""
-                            print(f"\n[🎯 Manager:{kind}]\n{text}\n{'-' * 50}")
+                if WORKFLOW_MODE == "parallel":
+                    # Independent subtasks run on the participants concurrently
+                    result = await parallel_workflow.run(user_query)
+                    output = result['answer']
+                    print(f"\n📊 {result['rounds']} rounds, {result['agent_runs']} agent runs, "
+                          f"{result['tokens']} tokens, {result['elapsed_seconds']:.1f}s")
+                else:
+                    try:
+                        async with asyncio.timeout(WORKFLOW_TIMEOUT_SECONDS):
+                            async for event in workflow.run_stream(user_query):
+                                if isinstance(event, AgentRunUpdateEvent):
+                                    props = event.data.additional_properties if event.data else None
+                                    event_type = props.get("magentic_event_type") if props else None
+
+                                    if event_type == MAGENTIC_EVENT_TYPE_ORCHESTRATOR:
+                                        kind = props.get("orchestrator_message_kind", "") if props else ""
+                                        text = event.data.text if event.data else ""
+                                        print(f"\n[🎯 Manager:{kind}]\n{text}\n{'-' * 50}")
                             
-                        elif event_type == MAGENTIC_EVENT_TYPE_AGENT_DELTA:
-                            agent_id = props.get("agent_id", event.executor_id) if props else event.executor_id
-                            if last_stream_agent_id != agent_id or not stream_line_open:
-                                if stream_line_open:
-                                    print()
-                                # Map agent IDs to emojis
-                                agent_emoji = {
-                                    "InvestmentAgent": "📊",
-                                    "AdvisorAgent": "💰",
-                                    "ResearchAgent": "📚"
-                                }.get(agent_id, "🤖")
-                                print(f"\n[{agent_emoji} {agent_id}]: ", end="", flush=True)
-                                last_stream_agent_id = agent_id
-                                stream_line_open = True
-                            if event.data and event.data.text:
-                                print(event.data.text, end="", flush=True)
+                                    elif event_type == MAGENTIC_EVENT_TYPE_AGENT_DELTA:
+                                        agent_id = props.get("agent_id", event.executor_id) if props else event.executor_id
+                                        if last_stream_agent_id != agent_id or not stream_line_open:
+                                            if stream_line_open:
+                                                print()
+                                            # Map agent IDs to emojis
+                                            agent_emoji = {
+                                                "InvestmentAgent": "📊",
+                                                "AdvisorAgent": "💰",
+                                                "ResearchAgent": "📚"
+                                            }.get(agent_id, "🤖")
+                                            print(f"\n[{agent_emoji} {agent_id}]: ", end="", flush=True)
+                                            last_stream_agent_id = agent_id
+                                            stream_line_open = True
+                                        if event.data and event.data.text:
+                                            print(event.data.text, end="", flush=True)
                                 
-                        elif event.data and event.data.text:
-                            print(event.data.text, end="", flush=True)
+                                    elif event.data and event.data.text:
+                                        print(event.data.text, end="", flush=True)
                             
-                    elif isinstance(event, WorkflowOutputEvent):
-                        output_messages = cast(list[ChatMessage], event.data)
-                        if output_messages:
-                            output = output_messages[-1].text
+                                elif isinstance(event, WorkflowOutputEvent):
+                                    output_messages = cast(list[ChatMessage], event.data)
+                                    if output_messages:
+                                        output = output_messages[-1].text
+                    except TimeoutError:
+                        print(f"\n⏱️ Stopped after {WORKFLOW_TIMEOUT_SECONDS:g}s, the workflow time budget")
 
                 if stream_line_open:
                     print()
@@ -368,6 +496,8 @@ async def main():
         try:
             await search_index_manager.close()
             await embeddings_client.close()
+            await stock_data_manager.close()
+            await finance_api_client.aclose()
         except Exception as e:
             logger.error(f"Error during cleanup: {e}")
 
@@ -0,0 +1,143 @@
+"""
+Benchmark the Magentic manager loop against the parallel plan-and-dispatch workflow.
+
+Runs a scripted question set against simulated agents, so it needs no Azure credentials:
+every LLM call takes LLM_SECONDS and a tool call TOOL_SECONDS. The Magentic baseline follows
+the standard manager's call pattern (facts and plan, then a progress ledger before every
+participant turn, then the final answer); the parallel workflow is ParallelWorkflow itself.
+Reports end-to-end latency and LLM calls per answer, then reruns the parallel workflow with a
+tight wall-clock budget to show the budget being enforced.
+
+Usage: python benchmark_workflow.py [llm_seconds]
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from parallel_workflow import ParallelWorkflow
+
+LLM_SECONDS = 0.5
+TOOL_SECONDS = 0.2
+TOKENS_PER_CALL = 800
+
+# question -> the participants it needs
+QUESTIONS = {
+    "What is the 50/30/20 budgeting rule?": ["ResearchAgent"],
+    "What's the price of AAPL?": ["InvestmentAgent"],
+    "How do I build an emergency fund?": ["AdvisorAgent"],
+    "Compare AAPL, MSFT and TSLA for a long-term portfolio.": ["InvestmentAgent", "ResearchAgent"],
+    "Should I pay off my credit card before buying index funds?": ["AdvisorAgent", "ResearchAgent"],
+    "I have £3k of debt and want to buy NVDA; what does the knowledge base say about emergency funds first?":
+        ["InvestmentAgent", "AdvisorAgent", "ResearchAgent"],
+    "Review my plan: 20% savings, MSFT shares, and an ISA. Anything I'm missing?":
+        ["InvestmentAgent", "AdvisorAgent", "ResearchAgent"],
+    "How has IBM moved this month and is it a good time to rebalance?": ["InvestmentAgent", "AdvisorAgent"],
+}
+
+
+class Usage:
+    def __init__(self, total_token_count):
+        self.total_token_count = total_token_count
+
+
+class Response:
+    def __init__(self, text, tokens):
+        self.text = text
+        self.usage_details = Usage(tokens)
+
+
+class Counter:
+    def __init__(self):
+        self.llm_calls = 0
+
+    async def llm_call(self):
+        self.llm_calls += 1
+        await asyncio.sleep(LLM_SECONDS)
+
+
+class SimulatedParticipant:
+    """A participant agent: one LLM call choosing a tool, the tool, and one LLM call answering."""
+
+    def __init__(self, name, counter):
+        self.name = name
+        self._counter = counter
+
+    async def run(self, task):
+        await self._counter.llm_call()
+        await asyncio.sleep(TOOL_SECONDS)
+        await self._counter.llm_call()
+        return Response(f"{self.name} result for: {task}", 2 * TOKENS_PER_CALL)
+
+
+class SimulatedPlanner:
+    """The manager agent answering the parallel workflow's plan and review prompts from the script."""
+
+    def __init__(self, counter):
+        self._counter = counter
+
+    async def run(self, prompt):
+        await self._counter.llm_call()
+        if prompt.startswith("Plan"):
+            question = prompt.rsplit("Question: ", 1)[1]
+            subtasks = [{"agent": agent, "task": question} for agent in QUESTIONS[question]]
+            return Response(json.dumps({"subtasks": subtasks}), TOKENS_PER_CALL)
+        return Response(json.dumps({"answer": "merged answer"}), TOKENS_PER_CALL)
+
+
+async def magentic_baseline(question, participants, counter):
+    """The standard Magentic manager's call pattern, one participant turn at a time."""
+    await counter.llm_call()  # task ledger: facts
+    await counter.llm_call()  # task ledger: plan
+    for agent in QUESTIONS[question]:
+        await counter.llm_call()  # progress ledger picks the next speaker
+        await participants[agent].run(question)
+    await counter.llm_call()  # progress ledger finds the request satisfied
+    await counter.llm_call()  # final answer
+
+
+def participants_for(counter):
+    return {name: SimulatedParticipant(name, counter) for name in ("InvestmentAgent", "AdvisorAgent", "ResearchAgent")}
+
+
+async def measure(label, answer):
+    """Answer every scripted question in turn and report latency and LLM calls per answer."""
+    latencies, calls = [], []
+    for question in QUESTIONS:
+        counter = Counter()
+        start = time.perf_counter()
+        await answer(question, counter)
+        latencies.append(time.perf_counter() - start)
+        calls.append(counter.llm_calls)
+    print(f"{label:<28} p50 {statistics.median(latencies):5.2f}s  max {max(latencies):5.2f}s  "
+          f"mean {statistics.mean(calls):4.1f} LLM calls per answer")
+
+
+async def main():
+    global LLM_SECONDS
+    if len(sys.argv) > 1:
+        LLM_SECONDS = float(sys.argv[1])
+    print(f"🧪 {len(QUESTIONS)} scripted questions, simulated {LLM_SECONDS * 1000:.0f}ms per LLM call, "
+          f"{TOOL_SECONDS * 1000:.0f}ms per tool call")
+
+    async def magentic(question, counter):
+        await magentic_baseline(question, participants_for(counter), counter)
+
+    async def parallel(question, counter):
+        await ParallelWorkflow(SimulatedPlanner(counter), participants_for(counter)).run(question)
+
+    await measure("magentic (sequential)", magentic)
+    await measure("parallel fan-out", parallel)
+
+    # A wall-clock budget shorter than one participant run: the round is cut off and the run stops early
+    budget = LLM_SECONDS * 2
+    counter = Counter()
+    question = next(iter(q for q, agents in QUESTIONS.items() if len(agents) == 3))
+    result = await ParallelWorkflow(SimulatedPlanner(counter), participants_for(counter), timeout=budget).run(question)
+    label = f"parallel, {budget:g}s budget"
+    print(f"{label:<28} {result['elapsed_seconds']:5.2f}s  stopped: {result['stopped']}  {result['agent_runs']} agent runs")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
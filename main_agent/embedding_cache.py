@@ -0,0 +1,181 @@
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+
+DEFAULT_MEMORY_ENTRIES = 2048
+
+
+class EmbeddingCache:
+    """Content-addressed cache of embedding vectors.
+
+    Vectors are keyed by a hash of the embedding model and the normalized text, kept as
+    compact float32 arrays in an in-memory LRU, and persisted to a local SQLite file so
+    they survive restarts. Concurrent requests for the same key share one in-flight
+    embeddings call.
+
+    :param path: The SQLite file to persist vectors to, or None for memory only.
+    :param max_memory_entries: The number of vectors kept in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_memory_entries: int = DEFAULT_MEMORY_ENTRIES) -> None:
+        """Initialize EmbeddingCache class."""
+        self._max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)")
+            self._db.commit()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalize text so trivially different questions share one vector.
+
+        :param text: The text to embed.
+        :return: The case-folded text with whitespace collapsed.
+        """
+        return " ".join(text.split()).casefold()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """
+        Get the cache key of a text for a model.
+
+        :param model: The embedding model.
+        :param text: The text to embed.
+        :return: A hex digest of the model and the normalized text.
+        """
+        return hashlib.sha256(f"{model}\0{EmbeddingCache.normalize(text)}".encode('utf-8')).hexdigest()
+
+    def _remember(self, key: str, vector: array) -> None:
+        """Put a vector in the in-memory LRU, evicting the least recently used one."""
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        Look up a cached vector without computing it.
+
+        :param model: The embedding model.
+        :param text: The text to embed.
+        :return: The vector or None if it is not cached.
+        """
+        vector = self._lookup(self.make_key(model, text))
+        return vector.tolist() if vector is not None else None
+
+    def _lookup(self, key: str) -> Optional[array]:
+        """Find a vector in memory, then on disk."""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return vector
+        if self._db is not None:
+            with self._lock:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                vector = array('f')
+                vector.frombytes(row[0])
+                self._remember(key, vector)
+                with self._lock:
+                    self._stats['disk_hits'] += 1
+                return vector
+        return None
+
+    def put(self, model: str, text: str, embedding: List[float]) -> None:
+        """
+        Store a vector for a text.
+
+        :param model: The embedding model.
+        :param text: The embedded text.
+        :param embedding: The embedding vector.
+        """
+        self._store(self.make_key(model, text), model, array('f', embedding))
+
+    def _store(self, key: str, model: str, vector: array) -> None:
+        """Store a vector in memory and on disk."""
+        self._remember(key, vector)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                    (key, model, vector.tobytes()))
+                self._db.commit()
+
+    async def get_or_create(self, model: str, text: str, create: Callable[[str], Awaitable[List[float]]]) -> List[float]:
+        """
+        Return the cached vector of a text, creating it with one call on a miss.
+
+        Concurrent callers missing on the same key wait for the first caller's request
+        instead of sending their own.
+
+        :param model: The embedding model.
+        :param text: The text to embed.
+        :param create: Coroutine function embedding a text, called on a miss.
+        :return: The embedding vector.
+        """
+        key = self.make_key(model, text)
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector.tolist()
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            with self._lock:
+                self._stats['coalesced'] += 1
+            return (await asyncio.shield(in_flight)).tolist()
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        with self._lock:
+            self._stats['misses'] += 1
+        try:
+            vector = array('f', await create(text))
+            self._store(key, model, vector)
+            future.set_result(vector)
+            return vector.tolist()
+        except BaseException as e:
+            future.set_exception(e)
+            # mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        """
+        Get the hit and miss counters of the cache.
+
+        :return: A dict of counters and the hit rate.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        hits = stats['memory_hits'] + stats['disk_hits'] + stats['coalesced']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0
+        return stats
+
+    def close(self) -> None:
+        """Close the on-disk store."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,226 @@
+from typing import Iterator, Sequence, Union
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+
+# Fixed-size .npy header, so the row count can be filled in after streaming the rows
+NPY_HEADER_SIZE = 128
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+CSV_FIELDNAMES = ['id', 'token', 'embedding']
+
+
+def chunk_id(chunk: str) -> str:
+    """
+    Get the content-addressed id of a chunk, so an unchanged chunk keeps its id wherever it moves.
+
+    :param chunk: The chunk text.
+    :return: The hex SHA-256 of the text.
+    """
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()
+
+
+def is_binary(embeddings_file: str) -> bool:
+    """
+    Check whether an embeddings file uses the binary format.
+
+    :param embeddings_file: The embeddings file.
+    :return: True for a .npy matrix with a tokens sidecar, False for JSON-in-csv.
+    """
+    return embeddings_file.endswith('.npy')
+
+
+def tokens_path(embeddings_file: str) -> str:
+    """
+    Get the tokens sidecar of a binary embeddings file.
+
+    :param embeddings_file: The .npy embeddings file.
+    :return: The path of the JSON lines file with the id and token of every row.
+    """
+    return embeddings_file[:-len('.npy')] + '.tokens.jsonl'
+
+
+def _npy_header(rows: int, dimensions: int) -> bytes:
+    """Build a float32 .npy header padded to NPY_HEADER_SIZE bytes."""
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d, %d), }" % (rows, dimensions)
+    header = header.ljust(NPY_HEADER_SIZE - len(NPY_MAGIC) - 2 - 1) + '\n'
+    return NPY_MAGIC + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+class EmbeddingsWriter:
+    """
+    Streams rows to an embeddings file of either format.
+
+    Rows go to partial files that replace the target when the writer is closed
+    without an error, so an interrupted build never leaves a truncated file behind.
+
+    :param embeddings_file: The file to write; a .npy name selects the binary format.
+    """
+
+    def __init__(self, embeddings_file: str) -> None:
+        """Initialize EmbeddingsWriter class."""
+        self._embeddings_file = embeddings_file
+        self._binary = is_binary(embeddings_file)
+        self._rows = 0
+        self._dimensions = None
+        if self._binary:
+            self._matrix_fp = open(embeddings_file + '.partial', 'wb')
+            self._matrix_fp.write(_npy_header(0, 0))
+            self._tokens_fp = open(tokens_path(embeddings_file) + '.partial', 'w', encoding='utf-8')
+        else:
+            self._csv_fp = open(embeddings_file + '.partial', 'w', newline='')
+            self._writer = csv.DictWriter(self._csv_fp, fieldnames=CSV_FIELDNAMES)
+            self._writer.writeheader()
+
+    @property
+    def rows(self) -> int:
+        """The number of rows written."""
+        return self._rows
+
+    def write(self, embed_id: str, token: str, embedding: Union[str, Sequence[float], np.ndarray]) -> None:
+        """
+        Write one row.
+
+        :param embed_id: The chunk id.
+        :param token: The chunk text.
+        :param embedding: The vector, or its JSON text as read from a csv.
+        """
+        if self._binary:
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            vector = np.asarray(embedding, dtype='<f4')
+            if self._dimensions is None:
+                self._dimensions = vector.shape[0]
+            elif vector.shape[0] != self._dimensions:
+                raise ValueError(f"Embedding of '{embed_id}' has {vector.shape[0]} dimensions, expected {self._dimensions}")
+            self._matrix_fp.write(vector.tobytes())
+            self._tokens_fp.write(json.dumps({'id': embed_id, 'token': token}) + '\n')
+        else:
+            if not isinstance(embedding, str):
+                embedding = json.dumps(np.asarray(embedding).tolist())
+            self._writer.writerow({'id': embed_id, 'token': token, 'embedding': embedding})
+        self._rows += 1
+
+    def flush(self) -> None:
+        """Flush the written rows to disk."""
+        for fp in self._files():
+            fp.flush()
+
+    def _files(self):
+        return [self._matrix_fp, self._tokens_fp] if self._binary else [self._csv_fp]
+
+    def close(self, commit: bool = True) -> None:
+        """
+        Close the partial files and, if commit is set, move them over the target.
+
+        :param commit: False to discard the partial files.
+        """
+        if self._binary and commit:
+            self._matrix_fp.seek(0)
+            self._matrix_fp.write(_npy_header(self._rows, self._dimensions or 0))
+        for fp in self._files():
+            fp.close()
+        partials = [(self._embeddings_file + '.partial', self._embeddings_file)]
+        if self._binary:
+            partials.append((tokens_path(self._embeddings_file) + '.partial', tokens_path(self._embeddings_file)))
+        for partial, target in partials:
+            if commit:
+                os.replace(partial, target)
+            else:
+                os.remove(partial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(commit=exc_type is None)
+
+
+def iter_rows(embeddings_file: str) -> Iterator[dict]:
+    """
+    Read the rows of an embeddings file of either format.
+
+    Embeddings are not decoded: csv rows carry the JSON text and binary rows a float32
+    row of the memory-mapped matrix, so copying rows between files of the same format
+    costs no parsing. Ids of csv files written without them are computed from the token.
+
+    :param embeddings_file: The embeddings file.
+    :return: A generator of dicts with 'id', 'token' and 'embedding', nothing if the file is absent.
+    """
+    if not os.path.exists(embeddings_file):
+        return
+    if is_binary(embeddings_file):
+        matrix = np.load(embeddings_file, mmap_mode='r')
+        with open(tokens_path(embeddings_file), encoding='utf-8') as fp:
+            for index, line in enumerate(fp):
+                row = json.loads(line)
+                row['embedding'] = matrix[index]
+                yield row
+        return
+    with open(embeddings_file, newline='') as fp:
+        for row in csv.DictReader(fp):
+            row['id'] = row.get('id') or chunk_id(row['token'])
+            yield row
+
+
+def to_vector(embedding: Union[str, Sequence[float], np.ndarray]) -> list:
+    """
+    Decode an embedding as read by iter_rows to a list of floats.
+
+    :param embedding: The JSON text or the vector.
+    :return: The embedding as a list.
+    """
+    if isinstance(embedding, str):
+        return json.loads(embedding)
+    return np.asarray(embedding).tolist()
+
+
+def load_matrix(embeddings_file: str) -> tuple:
+    """
+    Load the tokens and the embeddings matrix of a file.
+
+    :param embeddings_file: The embeddings file.
+    :return: The list of tokens and a float32 matrix, memory-mapped for the binary format.
+    """
+    if is_binary(embeddings_file):
+        with open(tokens_path(embeddings_file), encoding='utf-8') as fp:
+            tokens = [json.loads(line)['token'] for line in fp]
+        return tokens, np.load(embeddings_file, mmap_mode='r')
+    tokens = []
+    rows = []
+    for row in iter_rows(embeddings_file):
+        tokens.append(row['token'])
+        rows.append(np.asarray(json.loads(row['embedding']), dtype=np.float32))
+    matrix = np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+    return tokens, matrix
+
+
+def convert(source_file: str, target_file: str) -> int:
+    """
+    Convert an embeddings file between the csv and binary formats, streaming the rows.
+
+    :param source_file: The file to read.
+    :param target_file: The file to write; its extension selects the format.
+    :return: The number of rows converted.
+    """
+    with EmbeddingsWriter(target_file) as writer:
+        for row in iter_rows(source_file):
+            writer.write(row['id'], row['token'], row['embedding'])
+    # Chunk ids do not depend on the format, so an incremental build can continue from the copy
+    if os.path.exists(source_file + '.manifest.json'):
+        shutil.copyfile(source_file + '.manifest.json', target_file + '.manifest.json')
+    return writer.rows
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python embeddings_file.py <source.csv|.npy> <target.npy|.csv>")
+        sys.exit(1)
+    print(f"✅ Converted {convert(sys.argv[1], sys.argv[2])} rows to {sys.argv[2]}")
@@ -0,0 +1,260 @@
+# main_agent/parallel_workflow.py
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+WORKFLOW_MAX_ROUNDS = int(os.getenv("WORKFLOW_MAX_ROUNDS", "3"))
+WORKFLOW_MAX_TOKENS = int(os.getenv("WORKFLOW_MAX_TOKENS", "30000"))
+WORKFLOW_TIMEOUT_SECONDS = float(os.getenv("WORKFLOW_TIMEOUT_SECONDS", "90"))
+
+# Why a run stopped before the planner was done
+STOPPED_ROUNDS = "rounds"
+STOPPED_TOKENS = "tokens"
+STOPPED_TIME = "time"
+
+PLAN_PROMPT = """Plan how your team answers the user's question.
+
+Team:
+{team}
+
+Split the question into independent subtasks that can run at the same time, at most one per
+team member, and only the ones that are needed. Reply with JSON only, either
+{{"subtasks": [{{"agent": "<team member>", "task": "<self-contained instruction>"}}]}}
+or, if no team member is needed, {{"answer": "<your answer>"}}.
+
+Question: {question}"""
+
+REVIEW_PROMPT = """Your team worked on the user's question. Their results so far:
+
+{results}
+
+Question: {question}
+
+If the results are enough, reply with JSON {{"answer": "<the final answer, merging the results>"}}.
+Otherwise reply with JSON {{"subtasks": [...]}} listing only the independent follow-up subtasks
+still needed, in the same format as before.{final}"""
+
+FINAL_ROUND = "\nThis is the last round: you must reply with an answer."
+
+
+def response_text(response) -> str:
+    """Get the text of an agent response."""
+    return getattr(response, 'text', None) or str(response)
+
+
+def response_tokens(response) -> int:
+    """Get the total tokens an agent response used, or 0 if it does not report usage."""
+    usage = getattr(response, 'usage_details', None)
+    return getattr(usage, 'total_token_count', None) or 0
+
+
+def parse_plan(text: str) -> dict:
+    """
+    Parse the planner's JSON reply.
+
+    :param text: The reply, possibly wrapped in a code fence or prose.
+    :return: A dict with either 'subtasks' or 'answer'; a reply that is not JSON is taken as the answer.
+    """
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if match:
+        try:
+            plan = json.loads(match.group(0))
+            if isinstance(plan, dict) and ('subtasks' in plan or 'answer' in plan):
+                return plan
+        except json.JSONDecodeError:
+            pass
+    return {'answer': text}
+
+
+def valid_subtasks(plan: dict, participants) -> List[dict]:
+    """
+    Get the well-formed subtasks of a plan.
+
+    :param plan: The parsed plan.
+    :param participants: The names of the team members.
+    :return: The subtasks that name a team member and give a non-empty task, at most one
+             per team member, in the planned order; anything else the planner sent is skipped.
+    """
+    subtasks = plan.get('subtasks')
+    if not isinstance(subtasks, list):
+        return []
+    valid, agents = [], set()
+    for subtask in subtasks:
+        if not isinstance(subtask, dict):
+            continue
+        agent, task = subtask.get('agent'), subtask.get('task')
+        if not isinstance(agent, str) or agent not in participants or agent in agents:
+            continue
+        if not isinstance(task, str) or not task.strip():
+            continue
+        agents.add(agent)
+        valid.append({'agent': agent, 'task': task})
+    return valid
+
+
+class ParallelWorkflow:
+    """
+    Plan-and-dispatch workflow running independent subtasks on several agents at once.
+
+    The planner splits the question into subtasks for the participants, all subtasks of
+    a round run concurrently, and the planner then either merges the results into the
+    answer or plans a follow-up round. Compared to the Magentic manager, which consults
+    the manager before every single participant turn, a question needing research, a
+    stock quote and advice takes one round instead of three.
+
+    A run stops early, answering from the results gathered so far, once it has used
+    max_rounds dispatch rounds, max_tokens tokens (as reported by the agents) or
+    timeout seconds. Before each round the subtasks are trimmed to what the remaining
+    tokens can pay for, at the average tokens per agent run so far, keeping enough for
+    the planner to review the results.
+
+    :param planner: The agent that plans and merges, with a run(message) coroutine.
+    :param participants: Team member name to agent.
+    :param descriptions: Team member name to a description shown to the planner.
+    :param max_rounds: The maximum number of dispatch rounds.
+    :param max_tokens: The token budget of one run.
+    :param timeout: The wall-clock budget of one run, in seconds.
+    :param on_progress: Optional callback receiving (kind, text) progress messages.
+    """
+
+    def __init__(
+        self,
+        planner,
+        participants: Dict[str, object],
+        descriptions: Optional[Dict[str, str]] = None,
+        max_rounds: int = WORKFLOW_MAX_ROUNDS,
+        max_tokens: int = WORKFLOW_MAX_TOKENS,
+        timeout: float = WORKFLOW_TIMEOUT_SECONDS,
+        on_progress: Optional[Callable[[str, str], None]] = None
+    ):
+        """Initialize ParallelWorkflow class."""
+        self._planner = planner
+        self._participants = participants
+        self._descriptions = descriptions or {}
+        self._max_rounds = max_rounds
+        self._max_tokens = max_tokens
+        self._timeout = timeout
+        self._on_progress = on_progress
+
+    def _progress(self, kind: str, text: str):
+        if self._on_progress is not None:
+            self._on_progress(kind, text)
+
+    def _team(self) -> str:
+        return "\n".join(f"- {name}: {self._descriptions.get(name, '')}" for name in self._participants)
+
+    async def run(self, question: str) -> dict:
+        """
+        Answer a question with the team.
+
+        :param question: The user's question.
+        :return: A dict with the answer, the rounds, agent_runs and tokens used, the
+                 elapsed_seconds and why the run stopped early (None if it did not).
+        """
+        start = time.perf_counter()
+        deadline = start + self._timeout
+        stats = {'rounds': 0, 'agent_runs': 0, 'tokens': 0}
+        results = []
+
+        async def ask_planner(prompt):
+            response = await asyncio.wait_for(self._planner.run(prompt), timeout=max(deadline - time.perf_counter(), 0.001))
+            stats['agent_runs'] += 1
+            stats['tokens'] += response_tokens(response)
+            return parse_plan(response_text(response))
+
+        def finish(answer, stopped=None):
+            return dict(stats, answer=answer, stopped=stopped, elapsed_seconds=round(time.perf_counter() - start, 3))
+
+        try:
+            plan = await ask_planner(PLAN_PROMPT.format(team=self._team(), question=question))
+        except asyncio.TimeoutError:
+            return finish("I could not answer in time, please try again.", STOPPED_TIME)
+
+        stopped = None
+        while plan.get('subtasks'):
+            subtasks = valid_subtasks(plan, self._participants)
+            if not subtasks:
+                break
+            affordable = self._affordable_runs(stats)
+            if affordable is not None and affordable < len(subtasks):
+                if affordable < 1:
+                    stopped = STOPPED_TOKENS
+                    break
+                dropped, subtasks = subtasks[affordable:], subtasks[:affordable]
+                self._progress('budget', "not enough tokens left for " + ", ".join(subtask['agent'] for subtask in dropped))
+            stats['rounds'] += 1
+            self._progress('plan', ", ".join(f"{subtask['agent']}: {subtask['task']}" for subtask in subtasks))
+            results.extend(await self._dispatch(subtasks, deadline, stats))
+
+            if time.perf_counter() >= deadline:
+                stopped = STOPPED_TIME
+            elif stats['tokens'] >= self._max_tokens:
+                stopped = STOPPED_TOKENS
+            if stopped:
+                break
+            last_round = stats['rounds'] >= self._max_rounds
+            try:
+                plan = await ask_planner(REVIEW_PROMPT.format(
+                    results=self._format_results(results), question=question, final=FINAL_ROUND if last_round else ""))
+            except asyncio.TimeoutError:
+                stopped = STOPPED_TIME
+                break
+            if last_round and plan.get('subtasks'):
+                stopped = STOPPED_ROUNDS
+                break
+
+        if stopped or 'answer' not in plan:
+            self._progress('budget', f"stopped early ({stopped or 'no valid subtasks'}), answering from the results so far")
+            return finish(self._format_results(results) or "I could not answer this question, please rephrase it.", stopped)
+        return finish(plan['answer'])
+
+    def _affordable_runs(self, stats: dict) -> Optional[int]:
+        """
+        Estimate how many participant runs the remaining token budget pays for.
+
+        One run is kept back for the planner's review of the round.
+
+        :return: The number of runs, or None when the agents do not report usage.
+        """
+        if not stats['tokens'] or not stats['agent_runs']:
+            return None
+        tokens_per_run = stats['tokens'] / stats['agent_runs']
+        return int((self._max_tokens - stats['tokens']) // tokens_per_run) - 1
+
+    async def _dispatch(self, subtasks: List[dict], deadline: float, stats: dict) -> List[dict]:
+        """
+        Run one round of subtasks concurrently.
+
+        Subtasks still running at the deadline are cancelled and left out of the results.
+
+        :return: The completed subtasks with their 'result'.
+        """
+        tasks = {asyncio.ensure_future(self._participants[subtask['agent']].run(subtask['task'])): subtask
+                 for subtask in subtasks}
+        done, pending = await asyncio.wait(tasks, timeout=max(deadline - time.perf_counter(), 0))
+        for task in pending:
+            task.cancel()
+            self._progress('budget', f"{tasks[task]['agent']} did not finish in time")
+        completed = []
+        # In the planned order, whatever order the agents finished in
+        for task, subtask in tasks.items():
+            if task not in done:
+                continue
+            stats['agent_runs'] += 1
+            if task.exception() is not None:
+                self._progress('error', f"{subtask['agent']} failed: {task.exception()}")
+                continue
+            stats['tokens'] += response_tokens(task.result())
+            completed.append(dict(subtask, result=response_text(task.result())))
+            self._progress('result', subtask['agent'])
+        return completed
+
+    @staticmethod
+    def _format_results(results: List[dict]) -> str:
+        return "\n\n".join(f"[{result['agent']}] {result['task']}\n{result['result']}" for result in results)
@@ -1,9 +1,12 @@
-from typing import Optional
+from collections import deque
+from typing import Iterable, Iterator, List, Optional
 
+import asyncio
 import glob
-import csv
 import json
 import os
+import random
+import time
 
 from azure.core.credentials_async import AsyncTokenCredential
 from azure.search.documents.aio import SearchClient
@@ -18,8 +21,12 @@ from azure.search.documents.indexes.models import (
     VectorSearchProfile,
     HnswAlgorithmConfiguration)
 from dotenv import load_dotenv
-from openai import AsyncAzureOpenAI
-from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
+from openai import APIConnectionError, AsyncAzureOpenAI, RateLimitError
+from embedding_cache import EmbeddingCache
+from embeddings_file import EmbeddingsWriter, chunk_id, iter_rows, to_vector
+from vector_index import VectorIndex
+from keyword_index import BM25Index
+from azure.core.exceptions import ResourceNotFoundError, HttpResponseError, ServiceRequestError
 
 load_dotenv() # Load environment variables from .env file
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -30,6 +37,104 @@ SEARCH_ENDPOINT = os.getenv("AZURE_AI_SEARCH_ENDPOINT")
 SEARCH_API_KEY = os.getenv("AZURE_SEARCH_API_KEY")
 SEARCH_INDEX_NAME = os.getenv("AZURE_AI_SEARCH_INDEX_NAME")
 
+# Rough token estimate for batching, so a batch of long chunks stays under the request limit
+CHARS_PER_TOKEN = 4
+MANIFEST_VERSION = 1
+# Rough size of an embedding value in the JSON upload request
+BYTES_PER_EMBEDDING_VALUE = 20
+# Indexing statuses Azure AI Search documents as worth retrying
+RETRYABLE_STATUS_CODES = {409, 422, 429, 503}
+VECTOR_MODE = 'vector'
+KEYWORD_MODE = 'keyword'
+HYBRID_MODE = 'hybrid'
+SEARCH_MODES = (VECTOR_MODE, KEYWORD_MODE, HYBRID_MODE)
+CONTEXT_SEPARATOR = "\n------\n"
+
+
+def reciprocal_rank_fusion(rankings: List[tuple], rrf_k: int = 60) -> List[str]:
+    """
+    Merge ranked chunk lists with weighted reciprocal rank fusion.
+
+    Every chunk scores the sum of weight / (rrf_k + rank) over the lists it appears in,
+    so chunks ranked high by several retrievers come first without comparing their raw scores.
+
+    :param rankings: (chunks, weight) pairs, each list ordered best first.
+    :param rrf_k: The rank offset; larger values flatten the difference between top ranks.
+    :return: The fused chunks, best first.
+    """
+    scores = {}
+    for chunks, weight in rankings:
+        for rank, chunk in enumerate(chunks, start=1):
+            scores[chunk] = scores.get(chunk, 0.0) + weight / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def assemble_context(chunks: Iterable[str], token_budget: Optional[int] = None) -> str:
+    """
+    Join ranked chunks into the context for the agent, within a token budget.
+
+    Chunks are taken best first and skipped when they would overflow the budget, so a
+    long chunk does not crowd out shorter relevant ones. Duplicates are dropped.
+
+    :param chunks: The chunks, best first.
+    :param token_budget: The maximum estimated number of tokens, or None for no limit.
+    :return: The context.
+    """
+    selected = []
+    seen = set()
+    used = 0
+    for chunk in chunks:
+        if chunk in seen:
+            continue
+        tokens = len(chunk) // CHARS_PER_TOKEN + 1
+        if token_budget is not None and used + tokens > token_budget:
+            continue
+        seen.add(chunk)
+        selected.append(chunk)
+        used += tokens
+    return CONTEXT_SEPARATOR.join(selected)
+
+
+def manifest_path(embeddings_file: str) -> str:
+    """
+    Get the manifest of an embeddings file.
+
+    :param embeddings_file: The embeddings file.
+    :return: The path of the JSON manifest next to it.
+    """
+    return f"{embeddings_file}.manifest.json"
+
+
+def read_manifest(embeddings_file: str) -> Optional[dict]:
+    """
+    Read the manifest of an embeddings file.
+
+    The manifest records the model, the chunking, and per source file its mtime and chunk
+    ids, plus the ids waiting to be uploaded to or deleted from the search index.
+
+    :param embeddings_file: The embeddings file.
+    :return: The manifest or None if there is no usable one.
+    """
+    try:
+        with open(manifest_path(embeddings_file)) as fp:
+            manifest = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def write_manifest(embeddings_file: str, manifest: dict) -> None:
+    """
+    Replace the manifest of an embeddings file.
+
+    :param embeddings_file: The embeddings file.
+    :param manifest: The manifest to write.
+    """
+    path = manifest_path(embeddings_file)
+    with open(path + '.tmp', 'w') as fp:
+        json.dump(manifest, fp)
+    os.replace(path + '.tmp', path)
+
 class SearchIndexManager:
     """Manages Azure Cognitive Search index creation and data ingestion.
     The class for searching of context for user queries.
@@ -42,14 +147,41 @@ class SearchIndexManager:
     :param model: The embedding model to be used,
                   must be the same as one use to build the file with embeddings.
     :param embeddings_client: The embedding client.
+    :param embedding_cache: Optional cache of query embeddings, so repeated questions
+                            do not call the embeddings endpoint again.
+    :param vector_index: Optional in-process vector index, such as LocalVectorIndex, searched
+                         instead of Azure AI Search.
+    :param keyword_index: Optional BM25Index over the same chunks, needed by the keyword and hybrid modes.
+    :param search_mode: 'vector', 'keyword' or 'hybrid', which fuses both with reciprocal rank fusion.
+    :param top_k: The number of chunks to retrieve.
+    :param vector_weight: The weight of the vector ranking in hybrid mode.
+    :param keyword_weight: The weight of the keyword ranking in hybrid mode.
+    :param rrf_k: The rank offset of reciprocal rank fusion.
+    :param context_token_budget: The maximum estimated tokens of the returned context, or None for no limit.
     """
 
     
     MIN_DIFF_CHARACTERS_IN_LINE=5
     MIN_LINE_LENGTH=20
+    SEARCH_TOP_K=5
+    # Each retriever returns this many times top_k candidates for fusion in hybrid mode
+    HYBRID_CANDIDATES_FACTOR=4
+    RRF_K=60
+    EMBEDDING_BATCH_SIZE=2000
+    EMBEDDING_BATCH_TOKENS=100000
+    EMBEDDING_MAX_RETRIES=6
+    EMBEDDING_BACKOFF_SECONDS=1.0
+    EMBEDDING_MAX_BACKOFF_SECONDS=60.0
+    UPLOAD_BATCH_SIZE=250
+    UPLOAD_BATCH_BYTES=8*1024*1024
+    UPLOAD_MAX_RETRIES=5
 
-    def __init__(self, endpoint: str, credentials: AsyncTokenCredential, model: str, api_key: str, index_name: str, dimension: Optional[int], embeddings_client: AsyncAzureOpenAI) -> None:
+    def __init__(self, endpoint: str, credentials: AsyncTokenCredential, model: str, api_key: str, index_name: str, dimension: Optional[int], embeddings_client: AsyncAzureOpenAI, embedding_cache: Optional[EmbeddingCache] = None, vector_index: Optional[VectorIndex] = None, keyword_index: Optional[BM25Index] = None, search_mode: str = VECTOR_MODE, top_k: int = SEARCH_TOP_K, vector_weight: float = 1.0, keyword_weight: float = 1.0, rrf_k: int = RRF_K, context_token_budget: Optional[int] = None) -> None:
         """Initialize SearchIndexManager class."""
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{search_mode}', expected one of {', '.join(SEARCH_MODES)}")
+        if search_mode != VECTOR_MODE and keyword_index is None:
+            raise ValueError(f"The {search_mode} search mode needs a keyword index")
         self._dimensions = dimension
         self._index_name = index_name
         self._embeddings_client = embeddings_client
@@ -58,6 +190,15 @@ class SearchIndexManager:
         self._index = None
         self._model = model
         self._client = None
+        self._embedding_cache = embedding_cache
+        self._vector_index = vector_index
+        self._keyword_index = keyword_index
+        self._search_mode = search_mode
+        self._top_k = top_k
+        self._vector_weight = vector_weight
+        self._keyword_weight = keyword_weight
+        self._rrf_k = rrf_k
+        self._context_token_budget = context_token_budget
 
     def _get_client(self):
         """ Get search client if it is not initialized """
@@ -68,49 +209,283 @@ class SearchIndexManager:
                 credential=self._credential
             )
         return self._client
-    async def search(self, message: str) -> str:
+
+    async def _embed(self, text: str) -> list:
         """
-        Search the message in the vector store.
+        Embed a text with the embeddings client.
 
-        :param message: The customer question.
-        :return: The context for the question.
+        :param text: The text to embed.
+        :return: The embedding vector.
         """
-        self._raise_if_no_index()
         response = await self._embeddings_client.embeddings.create(
-            input=message,
+            input=text,
             model=self._model
         )
-        embedded_question = response.data[0].embedding
-        vector_query = VectorizedQuery(vector=embedded_question, k_nearest_neighbors=5, fields="text_vector")
+        return response.data[0].embedding
+
+    async def embed_query(self, text: str) -> list:
+        """
+        Embed a question, through the embedding cache when there is one.
+
+        :param text: The question.
+        :return: The embedding vector.
+        """
+        if self._embedding_cache is not None:
+            return await self._embedding_cache.get_or_create(self._model, text, self._embed)
+        return await self._embed(text)
+
+    async def _vector_search(self, message: str, k: int) -> List[str]:
+        """
+        Find the chunks closest to the message embedding.
+
+        :param message: The customer question.
+        :param k: The number of chunks to return.
+        :return: The chunks, closest first.
+        """
+        self._raise_if_no_index()
+        embedded_question = await self.embed_query(message)
+        if self._vector_index is not None:
+            return await self._vector_index.search(embedded_question, k)
+        vector_query = VectorizedQuery(vector=embedded_question, k_nearest_neighbors=k, fields="text_vector")
         response = await self._get_client().search(
             vector_queries=[vector_query],
             select=['chunk'],
+            top=k,
         )
-        results = [result['chunk'] async for result in response]
+        return [result['chunk'] async for result in response]
+
+    async def retrieve(self, message: str, mode: Optional[str] = None, k: Optional[int] = None) -> List[str]:
+        """
+        Retrieve the chunks relevant to the message.
+
+        :param message: The customer question.
+        :param mode: 'vector', 'keyword' or 'hybrid'; the configured search mode by default.
+        :param k: The number of chunks; the configured top_k by default.
+        :return: The chunks, most relevant first.
+        """
+        mode = mode or self._search_mode
+        k = k or self._top_k
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}")
+        if mode == VECTOR_MODE:
+            return await self._vector_search(message, k)
+        if self._keyword_index is None:
+            raise ValueError(f"The {mode} search mode needs a keyword index")
+        if mode == KEYWORD_MODE:
+            return await self._keyword_index.search(message, k)
 
-        return "\n------\n".join(results)
+        candidates = k * SearchIndexManager.HYBRID_CANDIDATES_FACTOR
+        vector_results, keyword_results = await asyncio.gather(
+            self._vector_search(message, candidates),
+            self._keyword_index.search(message, candidates))
+        fused = reciprocal_rank_fusion(
+            [(vector_results, self._vector_weight), (keyword_results, self._keyword_weight)], self._rrf_k)
+        return fused[:k]
+
+    async def search(self, message: str) -> str:
+        """
+        Search the message in the vector store.
+
+        :param message: The customer question.
+        :return: The context for the question.
+        """
+        return assemble_context(await self.retrieve(message), self._context_token_budget)
     
-    async def upload_documents(self, embeddings_file: str) -> None:
+    @staticmethod
+    def _iter_document_batches(documents: Iterable[dict], max_batch_size: int, max_batch_bytes: int) -> Iterator[List[dict]]:
+        """
+        Group documents into index requests bounded by count and estimated request size.
+
+        :param documents: The documents to send.
+        :param max_batch_size: The maximum number of documents in a request.
+        :param max_batch_bytes: The maximum estimated size of a request.
+        :return: A generator of batches.
+        """
+        batch = []
+        batch_bytes = 0
+        for document in documents:
+            size = len(document.get('token', '')) + len(document.get('embedding', ())) * BYTES_PER_EMBEDDING_VALUE
+            if batch and (len(batch) >= max_batch_size or batch_bytes + size > max_batch_bytes):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(document)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    async def _send_documents(self, action: str, documents: List[dict]) -> tuple:
+        """
+        Send a batch to the index, retrying the documents that failed with a retryable status.
+
+        A request rejected as too large is split in half.
+
+        :param action: 'upload_documents' or 'delete_documents'.
+        :param documents: The documents of the batch.
+        :return: The keys that succeeded and the keys that failed for good.
+        """
+        send = getattr(self._get_client(), action)
+        succeeded = []
+        failed = []
+        remaining = documents
+        for attempt in range(SearchIndexManager.UPLOAD_MAX_RETRIES + 1):
+            try:
+                results = await send(remaining)
+            except (HttpResponseError, ServiceRequestError) as e:
+                status_code = getattr(e, 'status_code', None)
+                if status_code == 413 and len(remaining) > 1:
+                    half = len(remaining) // 2
+                    first = await self._send_documents(action, remaining[:half])
+                    second = await self._send_documents(action, remaining[half:])
+                    return succeeded + first[0] + second[0], failed + first[1] + second[1]
+                if (status_code is not None and status_code not in RETRYABLE_STATUS_CODES) or attempt == SearchIndexManager.UPLOAD_MAX_RETRIES:
+                    print(f"❌ Index request of {len(remaining)} documents failed: {e}")
+                    return succeeded, failed + [document['embedId'] for document in remaining]
+                await asyncio.sleep(SearchIndexManager._retry_delay(e, attempt))
+                continue
+
+            by_key = {document['embedId']: document for document in remaining}
+            retry = []
+            for result in results:
+                if result.succeeded:
+                    succeeded.append(result.key)
+                elif result.status_code in RETRYABLE_STATUS_CODES:
+                    retry.append(by_key[result.key])
+                else:
+                    failed.append(result.key)
+            if not retry:
+                return succeeded, failed
+            remaining = retry
+            if attempt < SearchIndexManager.UPLOAD_MAX_RETRIES:
+                await asyncio.sleep(SearchIndexManager._retry_delay(None, attempt))
+        return succeeded, failed + [document['embedId'] for document in remaining]
+
+    async def _send_all(self, action: str, batches: Iterable[List[dict]], max_concurrency: int, on_batch_done) -> tuple:
+        """
+        Send batches with up to max_concurrency requests in flight.
+
+        :param action: 'upload_documents' or 'delete_documents'.
+        :param batches: The batches to send.
+        :param max_concurrency: The number of requests in flight at once.
+        :param on_batch_done: Called with the succeeded keys of every finished batch.
+        :return: The number of documents sent and the keys that failed.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def send(batch):
+            async with semaphore:
+                return await self._send_documents(action, batch)
+
+        # Only a bounded number of batches is read ahead, so memory does not grow with the file
+        pending = deque()
+        sent = 0
+        failed = []
+
+        async def finish_oldest():
+            succeeded, failed_keys = await pending.popleft()
+            on_batch_done(succeeded)
+            failed.extend(failed_keys)
+            return len(succeeded)
+
+        try:
+            for batch in batches:
+                pending.append(asyncio.create_task(send(batch)))
+                if len(pending) >= 2 * max_concurrency:
+                    sent += await finish_oldest()
+            while pending:
+                sent += await finish_oldest()
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        return sent, failed
+
+    async def upload_documents(
+            self,
+            embeddings_file: str,
+            max_concurrency: int=4,
+            max_batch_size: int=UPLOAD_BATCH_SIZE,
+            max_batch_bytes: int=UPLOAD_BATCH_BYTES
+            ) -> dict:
         """
         Upload the embeggings file to index search.
 
+        The file may be a csv or a binary .npy file. When it has a manifest from build_embeddings_file,
+        only the chunks added since the last upload are uploaded and the removed ones are deleted
+        from the index. Otherwise every row is uploaded.
+
+        Rows are streamed in batches bounded by count and size, with up to max_concurrency
+        requests in flight. Documents failing with a retryable status are retried per batch.
+        The keys of every finished batch are appended to a checkpoint file, so an interrupted
+        upload resumes where it stopped; the checkpoint is removed once everything succeeded.
+        Keys that still failed stay pending in the manifest for the next upload.
+
         :param embeddings_file: The embeddings file to upload.
+        :param max_concurrency: The number of index requests in flight at once.
+        :param max_batch_size: The maximum number of documents in a request.
+        :param max_batch_bytes: The maximum estimated size of a request.
+        :return: The counts of uploaded, deleted, resumed and failed documents and the docs per second.
         """
+        if self._vector_index is not None:
+            # The local index reads the embeddings file itself when it is loaded
+            return {}
         self._raise_if_no_index()
-        documents = []
-        index = 0
-        with open(embeddings_file, newline='') as fp:
-            reader = csv.DictReader(fp)
-            for row in reader:
-                documents.append(
-                    {
-                        'embedId': str(index),
-                        'token': row['token'],
-                        'embedding': json.loads(row['embedding'])
-                    }
-                )
-                index += 1
-        await self._get_client().upload_documents(documents)
+        start = time.perf_counter()
+        manifest = read_manifest(embeddings_file)
+        pending_upload = set(manifest['pending_upload']) if manifest is not None else None
+        pending_delete = manifest['pending_delete'] if manifest is not None else []
+
+        checkpoint_file = f"{embeddings_file}.{self._index_name}.checkpoint"
+        done = set()
+        if os.path.exists(checkpoint_file):
+            with open(checkpoint_file) as fp:
+                for line in fp:
+                    done.update(json.loads(line))
+            print(f"🔁 Resuming upload, {len(done)} documents already in the index")
+
+        def documents():
+            for row in iter_rows(embeddings_file):
+                if pending_upload is not None and row['id'] not in pending_upload:
+                    continue
+                if row['id'] in done:
+                    continue
+                yield {
+                    'embedId': row['id'],
+                    'token': row['token'],
+                    'embedding': to_vector(row['embedding'])
+                }
+
+        with open(checkpoint_file, 'a') as checkpoint:
+            def save_checkpoint(keys):
+                if keys:
+                    checkpoint.write(json.dumps(keys) + '\n')
+                    checkpoint.flush()
+
+            batches = SearchIndexManager._iter_document_batches(documents(), max_batch_size, max_batch_bytes)
+            uploaded, failed_uploads = await self._send_all('upload_documents', batches, max_concurrency, save_checkpoint)
+            deletes = ({'embedId': embed_id} for embed_id in pending_delete)
+            batches = SearchIndexManager._iter_document_batches(deletes, max_batch_size * 4, max_batch_bytes)
+            deleted, failed_deletes = await self._send_all('delete_documents', batches, max_concurrency, lambda keys: None)
+
+        if manifest is not None:
+            manifest['pending_upload'] = sorted(failed_uploads)
+            manifest['pending_delete'] = sorted(failed_deletes)
+            write_manifest(embeddings_file, manifest)
+        if not failed_uploads and not failed_deletes:
+            os.remove(checkpoint_file)
+
+        elapsed = time.perf_counter() - start
+        docs_per_second = uploaded / elapsed if elapsed > 0 else 0
+        print(f"✅ Uploaded {uploaded} and deleted {deleted} documents in {elapsed:.1f}s ({docs_per_second:.0f} docs/s)"
+              + (f", {len(failed_uploads) + len(failed_deletes)} failed" if failed_uploads or failed_deletes else ""))
+        return {
+            'uploaded': uploaded,
+            'deleted': deleted,
+            'resumed': len(done),
+            'failed': len(failed_uploads) + len(failed_deletes),
+            'elapsed_seconds': round(elapsed, 3),
+            'docs_per_second': round(docs_per_second, 1),
+        }
 
     async def is_index_empty(self) -> bool:
         """
@@ -175,6 +550,12 @@ class SearchIndexManager:
         :raises: Value error if both dimensions of embedding model and vector_index_dimensions are not set
                  or both of them set and they do not equal each other.
         """
+        if self._keyword_index is not None:
+            await self._keyword_index.load()
+        if self._vector_index is not None:
+            await self._vector_index.load()
+            self._index = self._vector_index
+            return
         vector_index_dimensions = self._check_dimensions(vector_index_dimensions)
         if self._index is None:
             self._index = await SearchIndexManager.get_or_create_index(
@@ -296,65 +677,242 @@ class SearchIndexManager:
         return new_index
         
 
+    @staticmethod
+    def _iter_lines(path: str) -> Iterator[str]:
+        """
+        Read the informative lines of a markdown file one at a time.
+
+        :param path: The markdown file.
+        :return: A generator of stripped lines.
+        """
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                # Skip non informative lines.
+                if len(line) < SearchIndexManager.MIN_LINE_LENGTH or len(set(line)) < SearchIndexManager.MIN_DIFF_CHARACTERS_IN_LINE:
+                    continue
+                yield line
+
+    @staticmethod
+    def _iter_chunks(lines: Iterable[str], sentences_per_embedding: int) -> Iterator[str]:
+        """
+        Group the sentences of the lines into chunks to embed.
+
+        :param lines: The lines to split to sentences.
+        :param sentences_per_embedding: The number of sentences used to build embedding.
+        :return: A generator of chunks.
+        """
+        from nltk.tokenize import sent_tokenize
+        sentences = []
+        for line in lines:
+            for sentence in sent_tokenize(line):
+                sentences.append(sentence)
+                if len(sentences) == sentences_per_embedding:
+                    yield ' '.join(sentences)
+                    sentences = []
+        if sentences:
+            yield ' '.join(sentences)
+
+    @staticmethod
+    def _iter_batches(chunks: Iterable[str], max_batch_size: int, max_batch_tokens: int) -> Iterator[List[str]]:
+        """
+        Group chunks into embeddings requests bounded by size and estimated tokens.
+
+        :param chunks: The chunks to embed.
+        :param max_batch_size: The maximum number of chunks in a request.
+        :param max_batch_tokens: The maximum estimated number of tokens in a request.
+        :return: A generator of batches.
+        """
+        batch = []
+        batch_tokens = 0
+        for chunk in chunks:
+            tokens = max(1, len(chunk) // CHARS_PER_TOKEN)
+            if batch and (len(batch) >= max_batch_size or batch_tokens + tokens > max_batch_tokens):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(chunk)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    async def _embed_batch(self, batch: List[str], semaphore: asyncio.Semaphore) -> List[List[float]]:
+        """
+        Embed a batch, retrying with exponential backoff when rate limited.
+
+        The semaphore is held while backing off, so a throttled pipeline slows down
+        instead of sending more requests.
+
+        :param batch: The chunks to embed.
+        :param semaphore: Limits the number of requests in flight.
+        :return: The embeddings in the order of the batch.
+        """
+        async with semaphore:
+            for attempt in range(SearchIndexManager.EMBEDDING_MAX_RETRIES + 1):
+                try:
+                    response = await self._embeddings_client.embeddings.create(
+                        input=batch,
+                        model=self._model
+                    )
+                    return [embed_data.embedding for embed_data in response.data]
+                except (RateLimitError, APIConnectionError) as e:
+                    if attempt == SearchIndexManager.EMBEDDING_MAX_RETRIES:
+                        raise
+                    delay = SearchIndexManager._retry_delay(e, attempt)
+                    print(f"⚠️ Embeddings request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> float:
+        """
+        Get the delay before retrying a failed embeddings request.
+
+        :param error: The error of the request.
+        :param attempt: The number of the failed attempt, starting at 0.
+        :return: The Retry-After delay if the service sent one, otherwise jittered exponential backoff.
+        """
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return min(float(retry_after), SearchIndexManager.EMBEDDING_MAX_BACKOFF_SECONDS)
+        except (TypeError, ValueError):
+            delay = min(SearchIndexManager.EMBEDDING_BACKOFF_SECONDS * 2 ** attempt, SearchIndexManager.EMBEDDING_MAX_BACKOFF_SECONDS)
+            return delay * random.uniform(0.5, 1)
+
     async def build_embeddings_file(
             self,
             input_directory: str,
             output_file: str,
-            sentences_per_embedding: int=4
-            ) -> None:
+            sentences_per_embedding: int=4,
+            max_concurrency: int=4,
+            max_batch_size: int=EMBEDDING_BATCH_SIZE,
+            max_batch_tokens: int=EMBEDDING_BATCH_TOKENS
+            ) -> dict:
         """
         In this method we do lazy loading of nltk and download the needed data set to split
 
         document into tokens. This operation takes time that is why we hide import nltk under this
         method. We also do not include nltk into requirements because this method is only used
         during rag generation.
-        :param dimensions: The number of dimensions in the embeddings. Must be the same as
-               the one used for SearchIndexManager creation.
+
+        The build is incremental. Every chunk gets an id from the hash of its text, and a manifest
+        next to output_file records the chunk ids of every source file and its mtime. Files whose
+        mtime did not change are not read again, and only chunks missing from the previous
+        output_file are sent to the embeddings API; all other rows are copied over. The ids added
+        and removed since the last upload are kept in the manifest for upload_documents.
+        Changing the model or sentences_per_embedding rebuilds everything.
+
+        New chunks are streamed through reader, sentence chunker and token-budgeted batcher
+        generators. Up to max_concurrency embeddings requests run at once, and batches are
+        written to the csv in order as they complete, so memory stays bounded by the batches
+        in flight rather than the size of the corpus. The rows are written to a partial file
+        that replaces output_file once the build succeeds.
+
+        A .npy output_file is written in the binary format: a float32 matrix plus a tokens
+        sidecar, about a fifth of the csv size and loaded without parsing JSON.
         :param input_directory: The directory with the embedding files.
-        :param output_file: The file csv file to store embeddings.
-        :param embeddings_client: The embedding client, used to create embeddings. 
-                Must be the same as the one used for SearchIndexManager creation.
+        :param output_file: The file to store embeddings, a .csv or a .npy file.
         :param sentences_per_embedding: The number of sentences used to build embedding.
-        :param model: The embedding model to be used.
+        :param max_concurrency: The number of embeddings requests in flight at once.
+        :param max_batch_size: The maximum number of chunks in an embeddings request.
+        :param max_batch_tokens: The maximum estimated number of tokens in an embeddings request.
+        :return: The counts of rows, embedded chunks, reused chunks, and added and removed ids.
         """
         import nltk
         nltk.download('punkt')
-        
-        from nltk.tokenize import sent_tokenize
-        # Split the data to sentence tokens.
-        sentence_tokens = []
-        globs = glob.glob(input_directory + '/*.md', recursive=True)
-        index = 0
-        for fle in globs:
-            with open(fle) as f:
-                for line in f:
-                    line = line.strip()
-                    # Skip non informative lines.
-                    if len(line) < SearchIndexManager.MIN_LINE_LENGTH or len(set(line)) < SearchIndexManager.MIN_DIFF_CHARACTERS_IN_LINE:
-                        continue
-                    for sentence in sent_tokenize(line):
-                        if index % sentences_per_embedding == 0:
-                            sentence_tokens.append(sentence)
-                        else:
-                            sentence_tokens[-1] += ' '
-                            sentence_tokens[-1] += sentence
-                        index += 1
-        
-        
-        # For each token build the embedding, which will be used in the search.
-        batch_size = 2000
-        with open(output_file, 'w') as fp:
-            writer = csv.DictWriter(fp, fieldnames=['token', 'embedding'])
-            writer.writeheader()
-            for i in range(0, len(sentence_tokens), batch_size):
-                response = await self._embeddings_client.embeddings.create(
-                    input=sentence_tokens[i:i+min(batch_size, len(sentence_tokens))],
-                    model=self._model
-                )
-                for token, embed_data in zip(sentence_tokens[i:i+min(batch_size, len(sentence_tokens))], response.data):
-                    writer.writerow({'token': token, 'embedding': json.dumps(embed_data.embedding)})
+
+        previous = read_manifest(output_file)
+        if previous is not None and (previous.get('model') != self._model
+                                     or previous.get('sentences_per_embedding') != sentences_per_embedding):
+            print("⚠️ Embedding model or chunking changed, re-embedding every chunk")
+            previous = None
+        previous_files = previous['files'] if previous is not None else {}
+        # Without a manifest nothing is known to be embedded, so every chunk is new
+        embedded_ids = {row['id'] for row in iter_rows(output_file)} if previous is not None else set()
+
+        files = {}
+        written_ids = set()
+
+        def new_chunks():
+            """Chunk the changed files, recording their ids, and yield the chunks not embedded yet."""
+            for path in sorted(glob.glob(input_directory + '/*.md', recursive=True)):
+                name = os.path.relpath(path, input_directory)
+                mtime = os.path.getmtime(path)
+                known = previous_files.get(name)
+                if known is not None and known['mtime'] == mtime:
+                    files[name] = known
+                    continue
+                ids = []
+                for chunk in SearchIndexManager._iter_chunks(SearchIndexManager._iter_lines(path), sentences_per_embedding):
+                    embed_id = chunk_id(chunk)
+                    ids.append(embed_id)
+                    if embed_id not in embedded_ids and embed_id not in written_ids:
+                        written_ids.add(embed_id)
+                        yield chunk
+                files[name] = {'mtime': mtime, 'chunks': ids}
+
+        batches = SearchIndexManager._iter_batches(new_chunks(), max_batch_size, max_batch_tokens)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        # Keep the next batches requested while the oldest one is written, but no more
+        pending = deque()
+        embedded = 0
+        reused = 0
+        try:
+            with EmbeddingsWriter(output_file) as writer:
+
+                async def write_oldest():
+                    batch, task = pending.popleft()
+                    for token, embedding in zip(batch, await task):
+                        writer.write(chunk_id(token), token, embedding)
+                    writer.flush()
+                    return len(batch)
+
+                for batch in batches:
+                    pending.append((batch, asyncio.create_task(self._embed_batch(batch, semaphore))))
+                    if len(pending) >= 2 * max_concurrency:
+                        embedded += await write_oldest()
+                while pending:
+                    embedded += await write_oldest()
+
+                # Copy the embeddings of chunks that are still in the corpus
+                current_ids = {embed_id for entry in files.values() for embed_id in entry['chunks']}
+                for row in iter_rows(output_file):
+                    if row['id'] in current_ids and row['id'] not in written_ids:
+                        written_ids.add(row['id'])
+                        writer.write(row['id'], row['token'], row['embedding'])
+                        reused += 1
+        except BaseException:
+            for _, task in pending:
+                task.cancel()
+            raise
+
+        previous_ids = {embed_id for entry in previous_files.values() for embed_id in entry['chunks']}
+        added = current_ids - previous_ids
+        removed = previous_ids - current_ids
+        pending_upload = set(previous.get('pending_upload', [])) if previous is not None else set()
+        pending_delete = set(previous.get('pending_delete', [])) if previous is not None else set()
+        # Chunks removed before they were ever uploaded need no delete
+        pending_delete = (pending_delete | (removed - pending_upload)) - added
+        pending_upload = (pending_upload | added) - removed
+        write_manifest(output_file, {
+            'version': MANIFEST_VERSION,
+            'model': self._model,
+            'sentences_per_embedding': sentences_per_embedding,
+            'files': files,
+            'pending_upload': sorted(pending_upload),
+            'pending_delete': sorted(pending_delete),
+        })
+        return {
+            'rows': embedded + reused,
+            'embedded': embedded,
+            'reused': reused,
+            'added': len(added),
+            'removed': len(removed),
+        }
 
     async def close(self):
         """Close the closeable resources, associated with SearchIndexManager."""
+        if self._vector_index is not None:
+            await self._vector_index.close()
         if self._client:
             await self._client.close()
\ No newline at end of file
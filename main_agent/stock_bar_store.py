@@ -0,0 +1,142 @@
+# main_agent/stock_bar_store.py
+
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+# Bar values as Alpha Vantage names them in a time series
+BAR_FIELDS = ["1. open", "2. high", "3. low", "4. close", "5. volume"]
+
+
+class StockBarStore:
+    """
+    Local SQLite store of fetched OHLCV bars.
+
+    Bars are kept in a WITHOUT ROWID table clustered on (symbol, interval, timestamp),
+    so the bars of one series are stored together in time order and a date range is a
+    single index range scan. Timestamps are Alpha Vantage's "YYYY-MM-DD HH:MM:SS"
+    strings, which sort chronologically.
+
+    :param path: The SQLite database file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Initialize StockBarStore class."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS bars ("
+            "symbol TEXT NOT NULL, interval TEXT NOT NULL, timestamp TEXT NOT NULL, "
+            "open REAL, high REAL, low REAL, close REAL, volume INTEGER, "
+            "PRIMARY KEY (symbol, interval, timestamp)) WITHOUT ROWID")
+        # When each series was last fetched, so a restart does not refetch a current series
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS series ("
+            "symbol TEXT NOT NULL, interval TEXT NOT NULL, fetched_at REAL NOT NULL, "
+            "PRIMARY KEY (symbol, interval))")
+        self._db.commit()
+
+    def last_timestamp(self, symbol: str, interval: str) -> Optional[str]:
+        """
+        Get the timestamp of the newest stored bar.
+
+        :param symbol: Stock ticker symbol
+        :param interval: Time interval
+        :return: The timestamp, or None if no bars are stored.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT MAX(timestamp) FROM bars WHERE symbol = ? AND interval = ?",
+                                   (symbol, interval)).fetchone()
+        return row[0]
+
+    def fetched_at(self, symbol: str, interval: str) -> Optional[float]:
+        """
+        Get when a series was last fetched from the API.
+
+        :param symbol: Stock ticker symbol
+        :param interval: Time interval
+        :return: The epoch seconds, or None if it never was.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT fetched_at FROM series WHERE symbol = ? AND interval = ?",
+                                   (symbol, interval)).fetchone()
+        return row[0] if row else None
+
+    def add_bars(self, symbol: str, interval: str, time_series: dict, fetched_at: float) -> int:
+        """
+        Store the bars of a fetched time series.
+
+        Bars from the newest stored one on replace what is stored, since the newest bar
+        may have been fetched before it closed; older bars only fill gaps.
+
+        :param symbol: Stock ticker symbol
+        :param interval: Time interval
+        :param time_series: The API time series, timestamp to bar values.
+        :param fetched_at: When the series was fetched, in epoch seconds.
+        :return: The number of bars newer than the newest stored one.
+        """
+        last = self.last_timestamp(symbol, interval)
+        rows = [(symbol, interval, timestamp, *(float(values.get(field, 0)) for field in BAR_FIELDS[:4]),
+                 int(float(values.get("5. volume", 0))))
+                for timestamp, values in time_series.items()]
+        recent = [row for row in rows if last is None or row[2] >= last]
+        older = [row for row in rows if last is not None and row[2] < last]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)", recent)
+            self._db.executemany("INSERT OR IGNORE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)", older)
+            self._db.execute("INSERT OR REPLACE INTO series VALUES (?, ?, ?)", (symbol, interval, fetched_at))
+            self._db.commit()
+        return sum(1 for row in recent if row[2] != last)
+
+    def bars(
+        self,
+        symbol: str,
+        interval: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, float, float, float, float, int]]:
+        """
+        Read stored bars, newest first.
+
+        :param symbol: Stock ticker symbol
+        :param interval: Time interval
+        :param start: Optional first date or timestamp to include.
+        :param end: Optional last date or timestamp to include; a date includes the whole day.
+        :param limit: Optional maximum number of bars, the newest ones.
+        :return: (timestamp, open, high, low, close, volume) tuples.
+        """
+        query = "SELECT timestamp, open, high, low, close, volume FROM bars WHERE symbol = ? AND interval = ?"
+        params = [symbol, interval]
+        if start:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end:
+            query += " AND timestamp <= ?"
+            params.append(end + " 23:59:59" if len(end) == 10 else end)
+        query += " ORDER BY timestamp DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    @staticmethod
+    def as_time_series(bars: List[tuple]) -> dict:
+        """
+        Turn stored bars into the API's time series shape.
+
+        :param bars: Bars as returned by bars().
+        :return: A dict of timestamp to bar values, in the order of the bars.
+        """
+        return {bar[0]: {field: str(value) for field, value in zip(BAR_FIELDS, bar[1:])} for bar in bars}
+
+    def close(self) -> None:
+        """Close the database."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,33 +1,157 @@
 # main_agent/stock_data_manager.py
 
-import requests
+import asyncio
+import httpx
 import os
-from typing import Optional
+import time
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
 
+from stock_bar_store import StockBarStore
+
 load_dotenv()
+# Alpha Vantage free tier quota
+ALPHA_VANTAGE_REQUESTS_PER_MINUTE = int(os.getenv("ALPHA_VANTAGE_REQUESTS_PER_MINUTE", "5"))
+ALPHA_VANTAGE_REQUESTS_PER_DAY = int(os.getenv("ALPHA_VANTAGE_REQUESTS_PER_DAY", "25"))
+
+VALID_INTERVALS = ["1min", "5min", "15min", "30min", "60min"]
+INTERVAL_SECONDS = {"1min": 60, "5min": 300, "15min": 900, "30min": 1800, "60min": 3600}
+# Bars returned by an outputsize=compact request
+COMPACT_BARS = 100
+# Symbols quoted per get_stock_quotes call, to keep one call within a few minutes of quota
+MAX_QUOTE_SYMBOLS = 10
+
+
+class StockDataError(Exception):
+    """An Alpha Vantage request that did not return a time series; the message is shown to the agent."""
+
+
+class RateLimitExceeded(StockDataError):
+    """The request quota is used up for longer than a caller is willing to wait."""
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for an async client.
+
+    Holds up to capacity tokens and refills at rate tokens per second; every request
+    takes one token, waiting for the refill when the bucket is empty.
+
+    :param rate: Tokens added per second.
+    :param capacity: The maximum number of tokens, i.e. the allowed burst.
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        """Initialize TokenBucket class."""
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self, max_wait: Optional[float] = None) -> float:
+        """
+        Take a token, waiting for one if the bucket is empty.
+
+        Waiters are served in arrival order.
+
+        :param max_wait: Seconds the caller is willing to wait, or None to wait as long as needed.
+        :return: The seconds spent waiting.
+        :raises: RateLimitExceeded if the next token is further away than max_wait.
+        """
+        async with self._lock:
+            self._refill()
+            wait = max(0.0, (1 - self._tokens) / self._rate)
+            if max_wait is not None and wait > max_wait:
+                raise RateLimitExceeded(f"request quota used up, next request possible in {wait:.0f}s")
+            if wait:
+                await asyncio.sleep(wait)
+                self._refill()
+            self._tokens -= 1
+            return wait
+
 
 class StockDataManager:
-    """Manages stock data retrieval from Alpha Vantage API."""
-    
-    def __init__(self, api_key: str):
+    """
+    Manages stock data retrieval from Alpha Vantage API.
+
+    Requests go through one pooled async HTTP client and a token bucket per quota
+    (per minute and per day). Fetched series are cached per (symbol, interval,
+    outputsize) until the next bar of the interval closes, and concurrent requests
+    for the same series share a single API call.
+
+    With a bar store, fetched bars are also persisted: once a series is stored only
+    the compact (latest) bars are requested to bring it up to date, history questions
+    are answered from the store, and stored bars are served when the quota is used up.
+
+    :param api_key: Alpha Vantage API key
+    :param requests_per_minute: The per-minute request quota.
+    :param requests_per_day: The per-day request quota.
+    :param max_wait: Seconds a request may wait for the per-minute quota before giving up.
+    :param http_client: Optional httpx.AsyncClient to use instead of creating one.
+    :param bar_store: Optional StockBarStore to persist fetched bars in.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        requests_per_minute: int = ALPHA_VANTAGE_REQUESTS_PER_MINUTE,
+        requests_per_day: int = ALPHA_VANTAGE_REQUESTS_PER_DAY,
+        max_wait: float = 30.0,
+        http_client: Optional[httpx.AsyncClient] = None,
+        bar_store: Optional[StockBarStore] = None
+    ):
         """
         Initialize StockDataManager.
-        
+
         :param api_key: Alpha Vantage API key
         """
         self._api_key = api_key
         self._base_url = "https://www.alphavantage.co/query"
-    
-    def get_stock_data(
-        self, 
-        symbol: str, 
-        interval: str = "5min", 
+        self._max_wait = max_wait
+        self._client = http_client
+        self._bar_store = bar_store
+        self._minute_bucket = TokenBucket(requests_per_minute / 60, requests_per_minute)
+        self._day_bucket = TokenBucket(requests_per_day / 86400, requests_per_day)
+        # (symbol, interval, outputsize) -> (meta_data, time_series, expires_at)
+        self._cache = {}
+        self._in_flight = {}
+        self._stats = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'rate_limited': 0, 'throttled_seconds': 0.0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the pooled HTTP client, created on first use so it belongs to the running loop."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=10)
+        return self._client
+
+    @staticmethod
+    def _next_bar(interval: str, now: float) -> float:
+        """Get the time the current bar of the interval closes, when a newer series becomes available."""
+        seconds = INTERVAL_SECONDS[interval]
+        return (now // seconds + 1) * seconds
+
+    @staticmethod
+    def _stored_meta(symbol: str, bars: list, stale: bool = False) -> dict:
+        """Build API style metadata for a series read from the bar store."""
+        meta_data = {"2. Symbol": symbol, "3. Last Refreshed": bars[0][0] if bars else "N/A"}
+        if stale:
+            meta_data["stale"] = True
+        return meta_data
+
+    async def get_stock_data(
+        self,
+        symbol: str,
+        interval: str = "5min",
         outputsize: str = "compact"
     ) -> str:
         """
         Get real-time and historical stock price data from Alpha Vantage API.
-        
+
         :param symbol: Stock ticker symbol (e.g., IBM, AAPL, TSLA)
         :param interval: Time interval (1min, 5min, 15min, 30min, 60min)
         :param outputsize: Data size ('compact' or 'full')
@@ -35,57 +159,289 @@ class StockDataManager:
         """
         try:
             # Validate interval
-            valid_intervals = ["1min", "5min", "15min", "30min", "60min"]
-            if interval not in valid_intervals:
-                return f"Invalid interval '{interval}'. Must be one of: {', '.join(valid_intervals)}"
-            
-            # Build API request parameters
-            params = {
-                "function": "TIME_SERIES_INTRADAY",
-                "symbol": symbol.upper(),
-                "interval": interval,
-                "apikey": self._api_key,
-                "outputsize": outputsize,
-                "adjusted": "true",
-                "extended_hours": "false"  # Regular trading hours only
-            }
-            
-            print(f"📈 Fetching stock data for {symbol.upper()}...")
-            
-            # Make API request
-            response = requests.get(self._base_url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Check for API errors
-            if "Error Message" in data:
-                return f"Error: {data['Error Message']}. Please check the stock symbol."
-            
-            if "Note" in data:
-                return f"API rate limit reached: {data['Note']}. Please try again in a moment."
-            
-            if "Information" in data:
-                return f"API Info: {data['Information']}"
-            
-            # Extract metadata and time series
-            meta_data = data.get("Meta Data", {})
-            time_series_key = f"Time Series ({interval})"
-            time_series = data.get(time_series_key, {})
-            
-            if not time_series:
-                return f"No data found for {symbol}. The symbol may be invalid or data may not be available."
-            
+            if interval not in VALID_INTERVALS:
+                return f"Invalid interval '{interval}'. Must be one of: {', '.join(VALID_INTERVALS)}"
+
+            meta_data, time_series = await self.get_time_series(symbol, interval, outputsize)
+
             # Format the response
             return self._format_stock_data(symbol, interval, meta_data, time_series)
-            
-        except requests.exceptions.Timeout:
+
+        except StockDataError as e:
+            return str(e)
+        except httpx.TimeoutException:
             return f"Request timeout while fetching data for {symbol}. Please try again."
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return f"Error fetching stock data: {str(e)}"
         except Exception as e:
             return f"Unexpected error retrieving stock data for {symbol}: {str(e)}"
-    
+
+    async def get_time_series(self, symbol: str, interval: str = "5min", outputsize: str = "compact") -> Tuple[dict, dict]:
+        """
+        Get an intraday series, from the cache while its latest bar is current.
+
+        :param symbol: Stock ticker symbol
+        :param interval: Time interval
+        :param outputsize: Data size ('compact' or 'full')
+        :return: The API metadata and the time series, newest bar first.
+        :raises: StockDataError if the API returned no series.
+        """
+        key = (symbol.upper(), interval, outputsize)
+        cached = self._cache.get(key)
+        if cached is not None and cached[2] > time.time():
+            self._stats['cache_hits'] += 1
+            return cached[0], cached[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._stats['coalesced'] += 1
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            meta_data, time_series = await self._load(*key)
+            now = time.time()
+            for expired in [k for k, v in self._cache.items() if v[2] <= now]:
+                del self._cache[expired]
+            self._cache[key] = (meta_data, time_series, self._next_bar(interval, now))
+            future.set_result((meta_data, time_series))
+            return meta_data, time_series
+        except Exception as e:
+            future.set_exception(e)
+            # mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _load(self, symbol: str, interval: str, outputsize: str) -> Tuple[dict, dict]:
+        """
+        Get a series from the API, through the bar store when there is one.
+
+        :return: The metadata and the time series, newest bar first.
+        """
+        store = self._bar_store
+        if store is None:
+            return await self._fetch(symbol, interval, outputsize)
+
+        limit = COMPACT_BARS if outputsize == "compact" else None
+        last = store.last_timestamp(symbol, interval)
+        fetched_at = store.fetched_at(symbol, interval)
+        now = time.time()
+        if last is not None and fetched_at is not None and self._next_bar(interval, fetched_at) > now:
+            # Fetched during the current bar (before a restart, or for the other outputsize)
+            bars = store.bars(symbol, interval, limit=limit)
+            return self._stored_meta(symbol, bars), store.as_time_series(bars)
+
+        try:
+            # Once a series is stored, the latest bars are enough to bring it up to date
+            meta_data, time_series = await self._fetch(symbol, interval, "compact" if last else outputsize)
+            if last is not None and min(time_series) > last:
+                # More bars than a compact request returns were missed, refetch the whole series
+                meta_data, time_series = await self._fetch(symbol, interval, "full")
+            added = store.add_bars(symbol, interval, time_series, fetched_at=now)
+            print(f"💾 Stored {added} new {interval} bars for {symbol}")
+        except (StockDataError, httpx.HTTPError) as e:
+            if last is None or (isinstance(e, StockDataError) and not isinstance(e, RateLimitExceeded)):
+                raise
+            print(f"⚠️ Serving stored {interval} bars for {symbol}: {e}")
+            bars = store.bars(symbol, interval, limit=limit)
+            return self._stored_meta(symbol, bars, stale=True), store.as_time_series(bars)
+
+        bars = store.bars(symbol, interval, limit=limit)
+        return dict(meta_data, **{"3. Last Refreshed": bars[0][0]}), store.as_time_series(bars)
+
+    async def get_stock_quotes(self, symbols: List[str], interval: str = "5min") -> str:
+        """
+        Get the latest quote of several stocks as one table.
+
+        The symbols are fetched concurrently; the rate limiter and single-flight
+        deduplication still apply per request, so a batch never exceeds the quota.
+
+        :param symbols: Stock ticker symbols (e.g., AAPL, MSFT, TSLA)
+        :param interval: Time interval of the bars the quotes are read from
+        :return: A table with one row per symbol
+        """
+        if interval not in VALID_INTERVALS:
+            return f"Invalid interval '{interval}'. Must be one of: {', '.join(VALID_INTERVALS)}"
+        symbols = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol.strip()))
+        if not symbols:
+            return "No stock symbols given."
+        skipped = symbols[MAX_QUOTE_SYMBOLS:]
+        symbols = symbols[:MAX_QUOTE_SYMBOLS]
+
+        print(f"📈 Fetching quotes for {', '.join(symbols)}...")
+        results = await asyncio.gather(*(self.get_time_series(symbol, interval) for symbol in symbols),
+                                       return_exceptions=True)
+
+        result = "| Symbol | Price | Change | Day High | Day Low | Volume | As Of |\n"
+        result += "|---|---|---|---|---|---|---|\n"
+        for symbol, series in zip(symbols, results):
+            if isinstance(series, Exception):
+                if isinstance(series, StockDataError):
+                    error = str(series)
+                elif isinstance(series, httpx.HTTPError):
+                    error = f"Error fetching stock data: {str(series)}"
+                else:
+                    error = f"Unexpected error: {str(series)}"
+                result += f"| {symbol} | {error} | | | | | |\n"
+                continue
+            meta_data, time_series = series
+            result += self._format_quote_row(symbol, meta_data, time_series)
+        if skipped:
+            result += f"\nNot quoted (max {MAX_QUOTE_SYMBOLS} symbols per call): {', '.join(skipped)}"
+        return result
+
+    @staticmethod
+    def _format_quote_row(symbol: str, meta_data: dict, time_series: dict) -> str:
+        """
+        Format the latest session of a series as a quote table row.
+
+        :param symbol: Stock symbol
+        :param meta_data: API metadata
+        :param time_series: Time series data, newest bar first
+        :return: The table row
+        """
+        latest_time = next(iter(time_series))
+        # The bars of the latest trading day, newest first
+        session = [values for timestamp, values in time_series.items() if timestamp[:10] == latest_time[:10]]
+        price = float(session[0]["4. close"])
+        session_open = float(session[-1]["1. open"])
+        change = (price - session_open) / session_open * 100 if session_open else 0.0
+        high = max(float(values["2. high"]) for values in session)
+        low = min(float(values["3. low"]) for values in session)
+        volume = sum(int(float(values["5. volume"])) for values in session)
+        as_of = latest_time + (" (stored)" if meta_data.get("stale") else "")
+        return f"| {symbol} | ${price:.2f} | {change:+.2f}% | ${high:.2f} | ${low:.2f} | {volume:,} | {as_of} |\n"
+
+    async def get_stock_history(
+        self,
+        symbol: str,
+        interval: str = "60min",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        window: int = 20
+    ) -> str:
+        """
+        Summarize the stored price history of a stock over a date range.
+
+        Brings the stored series up to date first (one compact request at most, or none
+        when it is current or the quota is used up), then reads the range from the store.
+
+        :param symbol: Stock ticker symbol
+        :param interval: Time interval of the bars
+        :param start: Optional first date (YYYY-MM-DD) of the range.
+        :param end: Optional last date (YYYY-MM-DD) of the range.
+        :param window: The number of bars in the moving averages.
+        :return: Formatted summary string
+        """
+        if self._bar_store is None:
+            return "Price history is not available: no bar store is configured."
+        if interval not in VALID_INTERVALS:
+            return f"Invalid interval '{interval}'. Must be one of: {', '.join(VALID_INTERVALS)}"
+        symbol = symbol.upper()
+        try:
+            meta_data, _ = await self.get_time_series(symbol, interval, "full")
+        except StockDataError as e:
+            return str(e)
+        except httpx.HTTPError as e:
+            return f"Error fetching stock data: {str(e)}"
+
+        bars = self._bar_store.bars(symbol, interval, start=start, end=end)
+        if not bars:
+            return f"No stored {interval} bars for {symbol} between {start or 'the first bar'} and {end or 'now'}."
+        # Oldest first from here on
+        bars.reverse()
+        closes = [bar[4] for bar in bars]
+        high = max(bars, key=lambda bar: bar[2])
+        low = min(bars, key=lambda bar: bar[3])
+        first_open, last_close = bars[0][1], closes[-1]
+        change = (last_close - first_open) / first_open * 100 if first_open else 0.0
+
+        result = f"Price History for {symbol} ({interval} bars)\n"
+        if meta_data.get("stale"):
+            result += "⚠️ Live data unavailable, showing stored bars only\n"
+        result += f"Range: {bars[0][0]} to {bars[-1][0]} ({len(bars)} bars)\n\n"
+        result += f"  Open: ${first_open:.2f}\n"
+        result += f"  Close: ${last_close:.2f} ({change:+.2f}%)\n"
+        result += f"  High: ${high[2]:.2f} at {high[0]}\n"
+        result += f"  Low: ${low[3]:.2f} at {low[0]}\n"
+        result += f"  Average Volume: {sum(bar[5] for bar in bars) / len(bars):,.0f}\n"
+        for size in (window, window * 2.5):
+            size = int(size)
+            if len(closes) >= size:
+                result += f"  {size}-bar Moving Average: ${sum(closes[-size:]) / size:.2f}\n"
+        return result
+
+    async def _fetch(self, symbol: str, interval: str, outputsize: str) -> Tuple[dict, dict]:
+        """Request a series from the API under the rate limits."""
+        try:
+            self._stats['throttled_seconds'] += await self._minute_bucket.acquire(max_wait=self._max_wait)
+            await self._day_bucket.acquire(max_wait=0)
+        except RateLimitExceeded as e:
+            self._stats['rate_limited'] += 1
+            raise RateLimitExceeded(f"API rate limit reached: {e}. Please try again later.")
+
+        # Build API request parameters
+        params = {
+            "function": "TIME_SERIES_INTRADAY",
+            "symbol": symbol,
+            "interval": interval,
+            "apikey": self._api_key,
+            "outputsize": outputsize,
+            "adjusted": "true",
+            "extended_hours": "false"  # Regular trading hours only
+        }
+
+        print(f"📈 Fetching stock data for {symbol}...")
+        self._stats['requests'] += 1
+
+        # Make API request
+        response = await self._get_client().get(self._base_url, params=params)
+        response.raise_for_status()
+
+        data = response.json()
+
+        # Check for API errors
+        if "Error Message" in data:
+            raise StockDataError(f"Error: {data['Error Message']}. Please check the stock symbol.")
+
+        if "Note" in data:
+            self._stats['rate_limited'] += 1
+            raise RateLimitExceeded(f"API rate limit reached: {data['Note']}. Please try again in a moment.")
+
+        if "Information" in data:
+            raise StockDataError(f"API Info: {data['Information']}")
+
+        # Extract metadata and time series
+        meta_data = data.get("Meta Data", {})
+        time_series = data.get(f"Time Series ({interval})", {})
+
+        if not time_series:
+            raise StockDataError(f"No data found for {symbol}. The symbol may be invalid or data may not be available.")
+
+        return meta_data, time_series
+
+    def stats(self) -> dict:
+        """
+        Get the request, cache and rate limit counters.
+
+        :return: A dict of counters.
+        """
+        return dict(self._stats, cached_series=len(self._cache))
+
+    async def close(self) -> None:
+        """Close the HTTP client and the bar store."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._bar_store is not None:
+            self._bar_store.close()
+
     def _format_stock_data(
         self, 
         symbol: str, 
@@ -107,7 +463,10 @@ class StockDataManager:
         
         result = f"Stock Data for {symbol_name}\n"
         result += f"Last Updated: {last_refreshed}\n"
-        result += f"Interval: {interval}\n\n"
+        result += f"Interval: {interval}\n"
+        if meta_data.get("stale"):
+            result += "⚠️ Live data unavailable, showing stored bars\n"
+        result += "\n"
         
         # Get the most recent 5 data points
         recent_data = list(time_series.items())[:5]
@@ -0,0 +1,230 @@
+from typing import List, Optional, Sequence
+
+import asyncio
+import json
+import os
+
+import numpy as np
+
+from embeddings_file import load_matrix
+
+EXACT_MODE = 'exact'
+IVF_MODE = 'ivf'
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 20000
+QUERY_BATCH_SIZE = 256
+
+
+class VectorIndex:
+    """Interface of a vector store SearchIndexManager can query instead of Azure AI Search."""
+
+    async def load(self) -> None:
+        """Prepare the index for searching."""
+        raise NotImplementedError
+
+    async def search(self, vector: Sequence[float], k: int) -> List[str]:
+        """
+        Find the chunks closest to a query vector.
+
+        :param vector: The query embedding.
+        :param k: The number of chunks to return.
+        :return: The chunks, closest first.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release the resources of the index."""
+
+
+def sidecar_paths(embeddings_file: str) -> tuple:
+    """
+    Get the binary sidecar files of an embeddings file.
+
+    :param embeddings_file: The file written by build_embeddings_file.
+    :return: The paths of the float32 matrix (.npy) and the tokens (one JSON string per line).
+    """
+    return f"{embeddings_file}.npy", f"{embeddings_file}.tokens.jsonl"
+
+
+def write_sidecar(embeddings_file: str, tokens: Sequence[str], matrix: np.ndarray) -> None:
+    """
+    Write the binary sidecar of an embeddings file.
+
+    Rows are normalized to unit length, so the dot product of a row and a normalized
+    query is their cosine similarity, the metric the Azure index uses.
+
+    :param embeddings_file: The embeddings file the sidecar belongs to.
+    :param tokens: The text chunk of every row.
+    :param matrix: The embeddings, one row per chunk.
+    """
+    matrix_path, tokens_path = sidecar_paths(embeddings_file)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    out = np.lib.format.open_memmap(matrix_path + '.tmp', mode='w+', dtype=np.float32, shape=matrix.shape)
+    np.divide(matrix, norms, out=out)
+    out.flush()
+    del out
+    with open(tokens_path + '.tmp', 'w', encoding='utf-8') as fp:
+        for token in tokens:
+            fp.write(json.dumps(token) + '\n')
+    os.replace(matrix_path + '.tmp', matrix_path)
+    os.replace(tokens_path + '.tmp', tokens_path)
+
+
+def build_sidecar(embeddings_file: str) -> None:
+    """
+    Convert an embeddings file to its normalized binary sidecar, parsing csv vectors once.
+
+    :param embeddings_file: The csv or .npy file written by build_embeddings_file.
+    """
+    tokens, matrix = load_matrix(embeddings_file)
+    if not tokens:
+        raise ValueError(f"No embeddings found in {embeddings_file}")
+    write_sidecar(embeddings_file, tokens, matrix)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Get the indices of the k highest scores of every row, best first."""
+    k = min(k, scores.shape[-1])
+    part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class LocalVectorIndex(VectorIndex):
+    """
+    In-process vector index over the embeddings file built by build_embeddings_file.
+
+    The csv or .npy file is converted once to a normalized float32 .npy sidecar that is
+    memory-mapped, so the vectors are a single contiguous matrix shared between worker
+    processes through the page cache. Exact mode scores every row with one matrix multiply; ivf mode clusters
+    the rows with k-means at load time and only scores the nprobe closest clusters.
+
+    :param embeddings_file: The csv or .npy file written by build_embeddings_file.
+    :param mode: 'exact' or 'ivf'.
+    :param nlist: The number of ivf clusters, by default about the square root of the row count.
+    :param nprobe: The number of ivf clusters scored per query.
+    """
+
+    def __init__(self, embeddings_file: str, mode: str = EXACT_MODE, nlist: Optional[int] = None, nprobe: int = DEFAULT_NPROBE) -> None:
+        """Initialize LocalVectorIndex class."""
+        if mode not in (EXACT_MODE, IVF_MODE):
+            raise ValueError(f"Unknown vector index mode '{mode}', expected '{EXACT_MODE}' or '{IVF_MODE}'")
+        self._embeddings_file = embeddings_file
+        self._mode = mode
+        self._nlist = nlist
+        self._nprobe = nprobe
+        self._matrix = None
+        self._tokens = None
+        self._centroids = None
+        self._list_offsets = None
+        self._list_rows = None
+
+    @property
+    def size(self) -> int:
+        """The number of vectors in the index."""
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    async def load(self) -> None:
+        """Build the sidecar if it is missing or stale, then map it."""
+        if self._matrix is None:
+            await asyncio.to_thread(self.load_sync)
+
+    def load_sync(self) -> None:
+        """Blocking version of load, for scripts."""
+        matrix_path, tokens_path = sidecar_paths(self._embeddings_file)
+        stale = not (os.path.exists(matrix_path) and os.path.exists(tokens_path))
+        if not stale and os.path.exists(self._embeddings_file):
+            stale = os.path.getmtime(matrix_path) < os.path.getmtime(self._embeddings_file)
+        if stale:
+            build_sidecar(self._embeddings_file)
+        self._matrix = np.load(matrix_path, mmap_mode='r')
+        with open(tokens_path, encoding='utf-8') as fp:
+            self._tokens = [json.loads(line) for line in fp]
+        if self._mode == IVF_MODE:
+            self._build_ivf()
+
+    def _build_ivf(self) -> None:
+        """Cluster the rows with spherical k-means and group row ids by cluster."""
+        n = self._matrix.shape[0]
+        nlist = self._nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(0)
+        sample = self._matrix[np.sort(rng.choice(n, size=min(n, KMEANS_SAMPLE_SIZE), replace=False))]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = self._assign(sample, centroids)
+            order = np.argsort(assignment, kind='stable')
+            counts = np.bincount(assignment, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            filled = counts > 0
+            sums[filled] = np.add.reduceat(sample[order], np.concatenate(([0], np.cumsum(counts)[:-1]))[filled])
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            centroids = np.where(empty[:, None], centroids, sums / np.where(norms == 0, 1, norms))
+
+        assignment = self._assign(self._matrix, centroids)
+        self._list_rows = np.argsort(assignment, kind='stable')
+        self._list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=nlist))))
+        self._centroids = centroids
+
+    @staticmethod
+    def _assign(rows: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Get the closest centroid of every row, in batches to bound memory."""
+        assignment = np.empty(rows.shape[0], dtype=np.int64)
+        for start in range(0, rows.shape[0], 4096):
+            assignment[start:start + 4096] = np.argmax(rows[start:start + 4096] @ centroids.T, axis=1)
+        return assignment
+
+    def _raise_if_not_loaded(self) -> None:
+        if self._matrix is None:
+            raise ValueError("The local vector index is not loaded, please call load first")
+
+    def search_ids(self, queries: np.ndarray, k: int) -> np.ndarray:
+        """
+        Find the rows closest to a batch of query vectors.
+
+        :param queries: The query embeddings, one per row.
+        :param k: The number of rows to return per query.
+        :return: An array of row ids of shape (queries, k), closest first.
+        """
+        self._raise_if_not_loaded()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        if self._mode == IVF_MODE:
+            return np.vstack([self._search_ivf(query, k) for query in queries])
+        results = []
+        for start in range(0, queries.shape[0], QUERY_BATCH_SIZE):
+            results.append(_top_k(queries[start:start + QUERY_BATCH_SIZE] @ self._matrix.T, k))
+        return np.vstack(results)
+
+    def _search_ivf(self, query: np.ndarray, k: int) -> np.ndarray:
+        """Score only the rows of the nprobe clusters closest to the query."""
+        probes = _top_k(self._centroids @ query, self._nprobe)
+        candidates = np.concatenate([
+            self._list_rows[self._list_offsets[probe]:self._list_offsets[probe + 1]] for probe in probes])
+        candidates.sort()
+        best = _top_k(self._matrix[candidates] @ query, k)
+        ids = np.full(k, -1, dtype=np.int64)
+        ids[:best.shape[0]] = candidates[best]
+        return ids
+
+    async def search(self, vector: Sequence[float], k: int) -> List[str]:
+        """
+        Find the chunks closest to a query vector.
+
+        :param vector: The query embedding.
+        :param k: The number of chunks to return.
+        :return: The chunks, closest first.
+        """
+        # numpy releases the GIL, so scoring off the loop keeps other chats responsive
+        ids = (await asyncio.to_thread(self.search_ids, np.asarray(vector, dtype=np.float32), k))[0]
+        return [self._tokens[i] for i in ids if i >= 0]
+
+    async def close(self) -> None:
+        """Unmap the matrix."""
+        self._matrix = None
+        self._tokens = None